@@ -0,0 +1,192 @@
+"""
+Load test of the async dashboard and list endpoints served by uvicorn (asgi.py)
+against gunicorn with threaded workers (wsgi.py), at increasing concurrency.
+
+    python benchmarks/asgi_load.py [--concurrency 16 64 256] [--duration 10] [--workers 1]
+
+Needs uvicorn and gunicorn installed. The servers run the project settings with
+the SQLite production profile on a seeded database file; the load comes from keep-alive connections opened by this
+script, each requesting the URLs below in turn with a JWT.
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import BASE_DIR, seed, setup_django
+
+URLS = [
+    "/api/dashboard/summary/",
+    "/api/dashboard/monthly-revenue/",
+    "/api/invoices/?page_size=50&fields=id,invoice_number,customer_name,status,balance_due",
+    "/api/invoices/?page_size=20",
+    "/api/customers/?page_size=50",
+    "/api/invoices/?status=paid&page_size=50",
+]
+
+SETTINGS = """\
+from django_project.settings import *  # noqa
+
+DEBUG = False
+ALLOWED_HOSTS = ["127.0.0.1"]
+DATABASES["default"]["NAME"] = {database!r}
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def servers(port, workers):
+    # name -> command. gunicorn keeps connections for the profile's CONN_MAX_AGE; asgi.py
+    # turns persistent connections off, as Django doesn't support them under ASGI.
+    return {
+        "gunicorn (WSGI, gthread x8)": [
+            "gunicorn", "django_project.wsgi:application", "--bind", f"127.0.0.1:{port}",
+            "--workers", str(workers), "--worker-class", "gthread", "--threads", "8", "--backlog", "2048",
+        ],
+        "uvicorn (ASGI)": [
+            "uvicorn", "django_project.asgi:application", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--backlog", "2048", "--no-access-log", "--log-level", "warning",
+        ],
+    }
+
+
+def prepare_database(path):
+    # Seeded once in this process, then shared read-mostly by every server
+    setup_django(database=path)
+    seed(customers=500, invoices=20000, payments_per_invoice=2)
+
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connections
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    call_command("rebuild_rollups", stdout=io.StringIO())
+    user = User.objects.create(username="bench")
+    token = str(AccessToken.for_user(user))
+    connections.close_all()
+    return token
+
+
+async def client(port, token, deadline, timings, errors):
+    request_lines = [
+        (f"GET {url} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token}\r\n\r\n").encode()
+        for url in URLS
+    ]
+    reader = writer = None
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request_lines[i % len(request_lines)])
+            i += 1
+            status = int((await reader.readline()).split()[1])
+            length, close = 0, False
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+                elif name.lower() == "connection" and value.strip().lower() == "close":
+                    close = True
+            await reader.readexactly(length)
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            errors.append(1)
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+            continue
+        if status == 200:
+            timings.append((time.perf_counter() - start) * 1000)
+        else:
+            errors.append(status)
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, token, concurrency, duration):
+    timings, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client(port, token, deadline, timings, errors) for _ in range(concurrency)))
+    return timings, errors
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} didn't start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    for program in ("gunicorn", "uvicorn"):
+        if shutil.which(program) is None:
+            sys.exit(f"{program} is not installed")
+
+    workdir = Path(tempfile.mkdtemp())
+    database = workdir / "bench.sqlite3"
+    token = prepare_database(database)
+
+    module = f"bench_settings_{os.getpid()}"
+    (workdir / f"{module}.py").write_text(SETTINGS.format(database=str(database)))
+
+    print(f"{'server':<28} {'clients':>7} {'req/s':>7} {'median ms':>10} {'p95 ms':>8} {'errors':>7}")
+    for name in servers(0, args.workers):
+        port = free_port()
+        command = servers(port, args.workers)[name]
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=module,
+            SQLITE_PRODUCTION="1",
+            PYTHONPATH=os.pathsep.join([str(workdir), str(BASE_DIR)]),
+        )
+        server = subprocess.Popen(
+            command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for(port)
+            asyncio.run(load(port, token, 8, 2))  # warm up
+            for concurrency in args.concurrency:
+                timings, errors = asyncio.run(load(port, token, concurrency, args.duration))
+                timings.sort()
+                print(
+                    f"{name:<28} {concurrency:>7} {len(timings) / args.duration:>7.0f} "
+                    f"{statistics.median(timings):>10.1f} {timings[int(0.95 * (len(timings) - 1))]:>8.1f} "
+                    f"{len(errors):>7}"
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Shared setup for the scripts in this directory.
+
+Each script boots Django with the project settings against a throwaway test
+database (nothing touches db.sqlite3), seeds it, and measures through the
+DRF test client so the numbers include routing, serialization and rendering.
+"""
+
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(database=None):
+    # `database`: path for an on-disk test database (the default is SQLite in memory),
+    # for scripts that need real file locking between connections
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_project.settings")
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+
+    if database is not None:
+        settings.DATABASES["default"].setdefault("TEST", {})["NAME"] = str(database)
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def seed(customers=50, invoices=2000, payments_per_invoice=3):
+    # Plain bulk inserts with amount_paid/status filled in, like real data would have
+    from invoices.models import Customer, Invoice, Payment
+    from invoices.services import set_invoice_status
+
+    Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"customer{i}@example.test") for i in range(customers)
+    )
+    customer_ids = list(Customer.objects.values_list("id", flat=True))
+
+    rows = []
+    for i in range(invoices):
+        invoice = Invoice(
+            customer_id=customer_ids[i % len(customer_ids)],
+            invoice_number=f"BENCH-{i:07d}",
+            issue_date=date.today() - timedelta(days=i % 365),
+            due_date=date.today() - timedelta(days=i % 365) + timedelta(days=30),
+            total_amount=Decimal("300.00"),
+            amount_paid=Decimal("25.00") * payments_per_invoice,
+        )
+        set_invoice_status(invoice)
+        rows.append(invoice)
+    Invoice.objects.bulk_create(rows, batch_size=1000)
+
+    Payment.objects.bulk_create(
+        (
+            Payment(invoice_id=invoice_id, amount=Decimal("25.00"), note="Paid via card")
+            for invoice_id in Invoice.objects.values_list("id", flat=True)
+            for _ in range(payments_per_invoice)
+        ),
+        batch_size=1000,
+    )
+
+
+def api_client():
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+
+    user, _ = User.objects.get_or_create(username="bench")
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def measure(client, url, repeat=10):
+    # Returns (median ms, p95 ms, response bytes)
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - start) * 1000)
+        size = len(response.content)
+        assert response.status_code == 200, (url, response.status_code)
+    timings.sort()
+    return statistics.median(timings), timings[int(0.95 * (len(timings) - 1))], size
@@ -0,0 +1,272 @@
+"""
+Per-endpoint benchmark: every route in invoices/urls.py, at several data sizes
+generated by invoices.seeding (the seed_billing command).
+
+    python benchmarks/endpoints.py [--sizes 1000 10000 50000] [--repeat 10] [--output endpoints.json]
+    python benchmarks/endpoints.py --compare old.json new.json [--tolerance 0.25]
+
+For every endpoint and size the report records latency percentiles, the number of
+SQL queries and the response size. The JSON is written with sorted keys so two
+reports diff cleanly; --compare lists latency, query-count and size regressions
+between two reports and exits with status 1 if there are any.
+
+Each size runs in its own process on a fresh in-memory database. Reads are timed
+with the dashboard cache cleared before every request, so they measure the
+uncached path; writes create fresh rows on every repeat.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from itertools import count
+
+from common import BASE_DIR, api_client, setup_django
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def endpoints(ids):
+    """
+    (name, method, path, request kwargs) for every route, built fresh for each
+    repeat: `ids` holds the rows the detail endpoints read, `next(ids["n"])`
+    a counter for unique values in writes.
+    """
+    n = next(ids["n"])
+    png = BytesIO()
+    from PIL import Image
+
+    Image.new("RGB", (64, 64), (n % 255, 80, 160)).save(png, "PNG")
+    png.seek(0)
+    png.name = f"avatar{n}.png"
+    old = ids["password"]
+    new = "secret-b" if old == "secret-a" else "secret-a"
+    import_lines = "\n".join(
+        ["invoice_number,amount,reference,note"]
+        + [f"{ids['invoice_number']},1.00,BENCH-{n}-{i},Settlement" for i in range(10)]
+    )
+    batch = [
+        {"customer": ids["customer"], "invoice_number": f"BATCH-{n}-{i}", "due_date": "2030-01-01", "total_amount": "120.00"}
+        for i in range(20)
+    ]
+
+    return [
+        ("customers: list", "get", "/api/customers/", {}),
+        ("customers: list page", "get", "/api/customers/?page_size=50", {}),
+        ("customers: search", "get", "/api/customers/?q=acme&page_size=50", {}),
+        ("customers: create", "post", "/api/customers/", {"data": {"name": f"New {n}", "email": f"new{n}@example.test"}}),
+        ("customer: detail", "get", f"/api/customers/{ids['customer']}/", {}),
+        ("customer: update", "patch", f"/api/customers/{ids['customer']}/", {"data": {"phone": f"555-{n:04d}"}}),
+        ("customer: invoices", "get", f"/api/customers/{ids['customer']}/invoices/", {}),
+        ("customer: invoices page", "get", f"/api/customers/{ids['customer']}/invoices/?page_size=50", {}),
+        ("invoices: list", "get", "/api/invoices/", {}),
+        ("invoices: list page", "get", "/api/invoices/?page_size=50", {}),
+        ("invoices: sparse page", "get", "/api/invoices/?page_size=50&fields=id,invoice_number,customer_name,status,balance_due", {}),
+        ("invoices: filtered page", "get", "/api/invoices/?status=paid&min_amount=100&page_size=50", {}),
+        ("invoices: search", "get", "/api/invoices/?q=acme&page_size=50", {}),
+        ("invoices: create", "post", "/api/invoices/", {"data": {
+            "customer": ids["customer"], "invoice_number": f"NEW-{n}", "issue_date": "2026-01-01",
+            "due_date": "2026-02-01", "total_amount": "250.00",
+        }}),
+        ("invoice: detail", "get", f"/api/invoices/{ids['invoice']}/", {}),
+        ("invoice: update", "patch", f"/api/invoices/{ids['invoice']}/", {"data": {"due_date": "2031-01-01"}}),
+        ("invoices: export csv", "get", "/api/invoices/export/?file_format=csv", {}),
+        ("invoices: batch (20)", "post", "/api/invoices/batch/", {"data": batch, "format": "json"}),
+        ("payments: list", "get", "/api/payments/", {}),
+        ("payments: list page", "get", "/api/payments/?page_size=50", {}),
+        ("payments: create", "post", "/api/payments/", {"data": {"invoice": ids["invoice"], "amount": "1.00"}}),
+        ("payment: update", "patch", f"/api/payments/{ids['payment']}/", {"data": {"amount": f"{1 + n % 5}.00"}}),
+        ("payment: delete", "delete", "/api/payments/{new_payment}/", {}),
+        ("payments: export ndjson", "get", "/api/payments/export/?file_format=ndjson", {}),
+        ("payments: import (10)", "post", "/api/payments/import/", {"data": import_lines, "content_type": "text/csv"}),
+        ("profile: get", "get", "/api/user/profile/", {}),
+        ("profile: update", "patch", "/api/user/profile/", {"data": {"first_name": f"Bench {n}"}}),
+        ("avatar: upload", "patch", "/api/user/avatar/", {"data": {"avatar": png}, "format": "multipart"}),
+        ("avatar: delete", "delete", "/api/user/avatar/delete/", {}),
+        ("password: change", "post", "/api/user/change-password/", {"data": {"old_password": old, "new_password": new}}),
+        ("sync: snapshot", "get", "/api/sync/", {}),
+        ("dashboard: summary", "get", "/api/dashboard/summary/", {}),
+        ("dashboard: monthly revenue", "get", "/api/dashboard/monthly-revenue/", {}),
+        ("dashboard: monthly payments", "get", "/api/dashboard/monthly-payments/?granularity=week", {}),
+        ("dashboard: overdue", "get", "/api/dashboard/overdue/", {}),
+        ("reports: aging", "get", "/api/reports/aging/", {}),
+        ("reports: aging as of", "get", "/api/reports/aging/?as_of=2026-01-31", {}),
+    ]
+
+
+def percentile(timings, p):
+    return timings[round(p / 100 * (len(timings) - 1))]
+
+
+def run_size(invoices, repeat):
+    setup_django()
+
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.db import connection
+    from django.db.models import Count
+    from django.test.utils import CaptureQueriesContext, override_settings
+
+    from invoices.models import Invoice, Payment
+    from invoices.seeding import seed_billing
+
+    override_settings(MEDIA_ROOT=tempfile.mkdtemp()).enable()
+    customers = max(10, invoices // 50)
+    start = time.perf_counter()
+    seed_billing(customers=customers, invoices=invoices, payments_per_invoice=3, seed=1)
+    seeded_in = time.perf_counter() - start
+
+    User.objects.create_user("bench", password="secret-a")
+    client = api_client()
+
+    # The busiest customer, one of their invoices and a payment on it
+    customer = (
+        Invoice.objects.values("customer_id").annotate(invoices=Count("id"))
+        .order_by("-invoices").values_list("customer_id", flat=True).first()
+    )
+    invoice = Invoice.objects.filter(customer_id=customer, payments__isnull=False).order_by("id").first()
+    ids = {
+        "n": count(),
+        "password": "secret-a",
+        "customer": customer,
+        "invoice": invoice.id,
+        "invoice_number": invoice.invoice_number,
+        "payment": Payment.objects.filter(invoice=invoice).values_list("id", flat=True).first(),
+    }
+
+    names = [name for name, *_ in endpoints(ids)]
+    results = {}
+    for index, name in enumerate(names):
+        timings, queries, size, status = [], 0, 0, None
+        for attempt in range(repeat + 1):
+            _, method, path, kwargs = endpoints(ids)[index]
+            url = path
+            if "{new_payment}" in path:
+                payment = Payment.objects.create(invoice_id=ids["invoice"], amount="1.00")
+                url = path.format(new_payment=payment.id)
+            cache.clear()
+
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, **kwargs)
+                if response.streaming:
+                    size = sum(len(chunk) for chunk in response.streaming_content)
+                else:
+                    size = len(response.content)
+                elapsed = (time.perf_counter() - started) * 1000
+            if attempt:  # the first request warms up code paths and caches
+                timings.append(elapsed)
+            queries, status = len(captured.captured_queries), response.status_code
+            assert status < 400, (name, status, getattr(response, "content", b"")[:200])
+            if name == "password: change":
+                ids["password"] = kwargs["data"]["new_password"]
+
+        timings.sort()
+        results[name] = {
+            "method": method.upper(),
+            "path": path,
+            "status": status,
+            "queries": queries,
+            "bytes": size,
+            **{f"p{p}_ms": round(percentile(timings, p), 2) for p in PERCENTILES},
+            "mean_ms": round(statistics.mean(timings), 2),
+        }
+
+    return {
+        "customers": customers,
+        "invoices": invoices,
+        "payments": Payment.objects.count(),
+        "seed_seconds": round(seeded_in, 1),
+        "endpoints": results,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path, tolerance):
+    # Regressions from old to new: p50/p95 slower by more than `tolerance`, more queries, bigger responses
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+
+    regressions = []
+    for size, report in new["sizes"].items():
+        before_size = old["sizes"].get(size)
+        if before_size is None:
+            continue
+        for name, after in report["endpoints"].items():
+            before = before_size["endpoints"].get(name)
+            if before is None:
+                continue
+            for key in ("p50_ms", "p95_ms"):
+                # Ignore sub-millisecond noise
+                if after[key] > before[key] * (1 + tolerance) and after[key] - before[key] > 1:
+                    regressions.append(f"{size:>8} {name:<30} {key} {before[key]} -> {after[key]}")
+            if after["queries"] > before["queries"]:
+                regressions.append(f"{size:>8} {name:<30} queries {before['queries']} -> {after['queries']}")
+            if after["bytes"] > before["bytes"] * (1 + tolerance):
+                regressions.append(f"{size:>8} {name:<30} bytes {before['bytes']} -> {after['bytes']}")
+
+    print(f"{old.get('commit')} -> {new.get('commit')}: {len(regressions)} regression(s)")
+    for line in regressions:
+        print(line)
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="Invoice counts.")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", default="endpoints.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown, as a fraction.")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.tolerance))
+
+    if args.size:
+        print(json.dumps(run_size(args.size, args.repeat)))
+        return
+
+    import django
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "repeat": args.repeat,
+        "sizes": {},
+    }
+    for size in args.sizes:
+        output = subprocess.run(
+            [sys.executable, __file__, "--size", str(size), "--repeat", str(args.repeat)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        report["sizes"][str(size)] = result
+        print(f"\n{size} invoices, {result['payments']} payments (seeded in {result['seed_seconds']} s)")
+        print(f"{'endpoint':<30} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'bytes':>10}")
+        for name, row in result["endpoints"].items():
+            print(f"{name:<30} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['queries']:>8} {row['bytes']:>10}")
+
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2, sort_keys=True)
+        output.write("\n")
+    print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Payload size and latency of the invoice list with and without sparse fieldsets.
+
+    python benchmarks/fieldsets.py [--invoices 2000] [--payments 3]
+"""
+
+import argparse
+
+from common import api_client, measure, seed, setup_django
+
+VARIANTS = [
+    ("full representation", "/api/invoices/"),
+    ("table view (?fields=)", "/api/invoices/?fields=id,invoice_number,customer_name,status,balance_due"),
+    ("table view + ?expand=payments", "/api/invoices/?fields=id,invoice_number,customer_name,status,balance_due&expand=payments"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--invoices", type=int, default=2000)
+    parser.add_argument("--payments", type=int, default=3, help="payments per invoice")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    seed(invoices=args.invoices, payments_per_invoice=args.payments)
+    client = api_client()
+
+    print(f"{args.invoices} invoices x {args.payments} payments, median of {args.repeat} runs\n")
+    print(f"{'variant':34} {'median ms':>10} {'p95 ms':>8} {'bytes':>10}")
+    baseline = None
+    for name, url in VARIANTS:
+        median, p95, size = measure(client, url, args.repeat)
+        baseline = baseline or (median, size)
+        print(
+            f"{name:34} {median:10.1f} {p95:8.1f} {size:10d}"
+            f"   ({size / baseline[1]:.0%} size, {median / baseline[0]:.0%} time)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Latency of invoice search and filters on a large table (first page of 50).
+
+    python benchmarks/search.py [--invoices 1000000] [--customers 10000]
+"""
+
+import argparse
+import time
+
+from common import api_client, measure, seed, setup_django
+
+QUERIES = [
+    ("invoice number", "q=BENCH-0765432"),
+    ("number prefix", "q=07654"),
+    ("customer name (~11k hits)", "q=customer 417"),
+    ("customer email", "q=customer4170@example"),
+    ("every invoice matches", "q=customer"),
+    ("text + status", "q=customer 417&status=paid"),
+    ("status", "status=paid"),
+    ("issue date range", "from=2026-01-01&to=2026-01-31"),
+    ("amount range", "min_amount=500&max_amount=510"),
+    ("customer", "customer=4170"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--invoices", type=int, default=1_000_000)
+    parser.add_argument("--customers", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    start = time.perf_counter()
+    seed(customers=args.customers, invoices=args.invoices, payments_per_invoice=0)
+
+    from django.db.models import F, Value
+
+    from invoices.models import Invoice
+
+    # Spread totals (100-999) and mark every 7th invoice paid so the filters have something to select
+    Invoice.objects.update(total_amount=F("id") % 900 + Value(100))
+    Invoice.objects.alias(bucket=F("id") % 7).filter(bucket=0).update(status="paid")
+    print(f"seeded {args.invoices} invoices / {args.customers} customers in {time.perf_counter() - start:.0f}s\n")
+
+    client = api_client()
+    print(f"{'query':28} {'median ms':>10} {'p95 ms':>8} {'rows':>5}")
+    for name, query in QUERIES:
+        url = f"/api/invoices/?page_size=50&fields=id,invoice_number,customer_name,status,total_amount&{query}"
+        median, p95, _ = measure(client, url, args.repeat)
+        rows = len(client.get(url).json()["results"])
+        print(f"{name:28} {median:10.1f} {p95:8.1f} {rows:5d}")
+
+    median, p95, _ = measure(client, "/api/customers/?page_size=50&q=customer 417", args.repeat)
+    print(f"{'customers: q=customer 417':28} {median:10.1f} {p95:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
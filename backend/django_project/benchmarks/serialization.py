@@ -0,0 +1,79 @@
+"""
+Throughput of list serialization: ModelSerializer + JSONRenderer (the old path)
+against .values() rows + ORJSONRenderer, including the queries.
+
+    python benchmarks/serialization.py [--invoices 5000] [--payments 3]
+"""
+
+import argparse
+import statistics
+import time
+
+from common import seed, setup_django
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--invoices", type=int, default=5000)
+    parser.add_argument("--payments", type=int, default=3, help="payments per invoice")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    seed(invoices=args.invoices, payments_per_invoice=args.payments)
+
+    from rest_framework.renderers import JSONRenderer
+
+    from django.db.models import Prefetch
+
+    from invoices.models import Customer, Invoice, Payment
+    from invoices.renderers import ORJSONRenderer
+    from invoices.serializers import CustomerSerializer, InvoiceSerializer, PaymentSerializer
+    from invoices.values_serializers import (
+        CustomerValuesSerializer, InvoiceValuesSerializer, PaymentValuesSerializer,
+    )
+
+    def model_invoices():
+        # What InvoiceSerializer reads, in a constant number of queries
+        return Invoice.objects.select_related("customer").prefetch_related(
+            Prefetch("payments", queryset=Payment.objects.order_by("id"))
+        ).order_by("-id")
+
+    lists = [
+        ("invoices (with payments)", InvoiceSerializer, InvoiceValuesSerializer,
+         model_invoices, lambda: Invoice.objects.order_by("-id")),
+        ("payments", PaymentSerializer, PaymentValuesSerializer,
+         lambda: Payment.objects.order_by("-created_at", "-id"), lambda: Payment.objects.order_by("-created_at", "-id")),
+        ("customers", CustomerSerializer, CustomerValuesSerializer,
+         lambda: Customer.objects.order_by("-id"), lambda: Customer.objects.order_by("-id")),
+    ]
+
+    print(f"{args.invoices} invoices x {args.payments} payments, median of {args.repeat} runs\n")
+    print(f"{'list':26} {'rows':>7} {'old ms':>8} {'new ms':>8} {'old rows/s':>11} {'new rows/s':>11} {'speedup':>8}")
+    for name, serializer_class, values_class, old_queryset, new_queryset in lists:
+        old_time, old_bytes = best_of(
+            args.repeat, lambda: JSONRenderer().render(serializer_class(old_queryset(), many=True).data)
+        )
+        new_time, new_bytes = best_of(
+            args.repeat, lambda: ORJSONRenderer().render(values_class().serialize_queryset(new_queryset()))
+        )
+        assert old_bytes == new_bytes, f"{name}: output differs"
+
+        rows = new_queryset().count()
+        print(
+            f"{name:26} {rows:7d} {old_time * 1000:8.1f} {new_time * 1000:8.1f}"
+            f" {rows / old_time:11.0f} {rows / new_time:11.0f} {old_time / new_time:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Concurrent payment writes against an on-disk SQLite database, with SQLite's
+defaults and with the production profile from settings.py (SQLITE_PRODUCTION=1:
+WAL and the other SQLITE_PRAGMAS, BEGIN IMMEDIATE, persistent connections).
+
+    python benchmarks/write_concurrency.py [--threads 8] [--cycles 50]
+
+Each writer thread loops create -> change -> delete of a payment through
+POST /api/payments/, PATCH and DELETE /api/payments/<id>/, so every request
+updates the invoice's running total in the same transaction. Each profile runs
+in its own process on a fresh database file.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import seed, setup_django
+
+PROFILES = ["sqlite-defaults", "production"]
+
+
+def writer(client, invoice_ids, cycles, results):
+    from django.db import OperationalError, close_old_connections
+
+    rng = random.Random()
+    for _ in range(cycles):
+        steps = [
+            lambda: client.post("/api/payments/", {"invoice": rng.choice(invoice_ids), "amount": "10.00"}, format="json"),
+            lambda: client.patch(f"/api/payments/{payment_id}/", {"amount": "12.50"}, format="json"),
+            lambda: client.delete(f"/api/payments/{payment_id}/"),
+        ]
+        payment_id = None
+        for step in steps:
+            start = time.perf_counter()
+            try:
+                response = step()
+                outcome = "ok" if response.status_code < 400 else "error"
+            except OperationalError as exc:
+                outcome = "locked" if "locked" in str(exc) else "error"
+            except Exception:
+                outcome = "error"
+            finally:
+                # What the WSGI handler does after every response (the test client skips it)
+                close_old_connections()
+            results.append((outcome, (time.perf_counter() - start) * 1000))
+            if outcome != "ok":
+                break  # the rest of the cycle needs this step's payment
+            if payment_id is None:
+                payment_id = response.data["id"]
+    close_old_connections()
+
+
+def run_profile(name, threads, cycles):
+    database = Path(tempfile.mkdtemp()) / "bench.sqlite3"
+    # Read by settings.py, so it has to be set before Django is
+    os.environ["SQLITE_PRODUCTION"] = "1" if name == "production" else "0"
+    setup_django(database=database)
+    seed(customers=20, invoices=500, payments_per_invoice=1)
+
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+
+    from invoices.models import Invoice
+
+    user = User.objects.create(username="bench")
+    invoice_ids = list(Invoice.objects.values_list("id", flat=True))
+
+    results = []
+    workers = []
+    for _ in range(threads):
+        client = APIClient()
+        client.force_authenticate(user)
+        workers.append(threading.Thread(target=writer, args=(client, invoice_ids, cycles, results)))
+
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    ok = [ms for outcome, ms in results if outcome == "ok"]
+    ok.sort()
+    return {
+        "profile": name,
+        "requests": len(results),
+        "ok": len(ok),
+        "locked": sum(1 for outcome, _ in results if outcome == "locked"),
+        "errors": sum(1 for outcome, _ in results if outcome == "error"),
+        "writes_per_s": len(ok) / elapsed,
+        "median_ms": statistics.median(ok) if ok else None,
+        "p95_ms": ok[int(0.95 * (len(ok) - 1))] if ok else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--cycles", type=int, default=50, help="create/change/delete cycles per thread")
+    parser.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args.profile, args.threads, args.cycles)))
+        return
+
+    print(f"{args.threads} writer threads x {args.cycles} cycles (3 requests each)\n")
+    print(f"{'profile':<16} {'writes/s':>9} {'median ms':>10} {'p95 ms':>8} {'locked':>12} {'other errors':>13}")
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, __file__, "--profile", profile, "--threads", str(args.threads), "--cycles", str(args.cycles)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        locked = f"{result['locked']} ({result['locked'] / result['requests']:.1%})"
+        print(
+            f"{profile:<16} {result['writes_per_s']:>9.0f} {result['median_ms']:>10.1f} "
+            f"{result['p95_ms']:>8.1f} {locked:>12} {result['errors']:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
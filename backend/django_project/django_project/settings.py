@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Server-Timing headers and per-request SQL logging; inert unless REQUEST_METRICS_ENABLED
+    'invoices.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +55,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Staff-only ?profile= / X-Profile request profiling; inert unless REQUEST_PROFILING_ENABLED
+    'invoices.middleware.RequestProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'django_project.urls'
@@ -93,6 +98,11 @@ WSGI_APPLICATION = 'django_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Opt-in production profile for SQLite (SQLITE_PRODUCTION=1 in the environment):
+# persistent connections, BEGIN IMMEDIATE and the SQLITE_PRAGMAS below. Without it the
+# database runs on SQLite's defaults, which is all the dev server needs.
+SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION') == '1'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -100,6 +110,86 @@ DATABASES = {
     }
 }
 
+# Seconds a connection is kept for the next request, from DJANGO_CONN_MAX_AGE. asgi.py
+# sets it to 0: Django doesn't support persistent connections under ASGI.
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DJANGO_CONN_MAX_AGE', 600 if SQLITE_PRODUCTION else 0))
+
+if SQLITE_PRODUCTION:
+    DATABASES['default'].update({
+        # Under WSGI connections are reused across requests instead of reconnecting (and
+        # re-running the pragmas below) every time; health checks drop ones that went bad.
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Transactions start with BEGIN IMMEDIATE, so concurrent writers queue on
+            # busy_timeout up front instead of failing with "database is locked" when a
+            # read inside the transaction can't be upgraded to a write.
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+
+# Applied to every new SQLite connection (invoices.signals.configure_sqlite), under the
+# production profile only. WAL lets readers carry on while a payment is being written;
+# synchronous=NORMAL is safe with WAL (a power cut can lose the last commits, never
+# corrupt the file).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 10000,          # ms to wait for the write lock
+    'cache_size': -32000,           # KiB of page cache per connection
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+} if SQLITE_PRODUCTION else {}
+
+
+# Cache
+# Used for the dashboard summary; swap for Redis/Memcached when running several processes
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'invoices',
+    }
+}
+
+
+# Seconds between in-process overdue sweeps (invoices.scheduler). None disables it;
+# schedule `manage.py sweep_overdue` daily with cron instead when running several workers.
+# The overdue count and list read the flag the sweep sets, so with neither they go stale:
+# the invoices.W001 check warns until this is set or the check is silenced for cron.
+OVERDUE_SWEEP_INTERVAL = None
+
+
+# How long the change log behind /api/sync/ is kept (see `manage.py prune_changes`).
+# Clients holding an older sync token get 410 and must reload.
+SYNC_CHANGE_RETENTION_DAYS = 30
+
+
+# Per-request SQL and timing instrumentation (invoices.middleware.RequestMetricsMiddleware).
+# When enabled, responses carry a Server-Timing header and every request is logged to
+# "invoices.metrics"; requests over either threshold are logged as warnings with their
+# slowest and most repeated SQL. Set a threshold to None to disable it.
+REQUEST_METRICS_ENABLED = False
+REQUEST_METRICS_SLOW_MS = 500
+REQUEST_METRICS_MAX_QUERIES = 20
+
+# On-demand profiling of one request by a staff user (invoices.middleware.RequestProfilingMiddleware):
+# add ?profile=txt|prof|collapsed or an "X-Profile: <format>" header. The profile comes back as a
+# download, or is written to REQUEST_PROFILE_DIR (if set) while the normal response is returned.
+REQUEST_PROFILING_ENABLED = False
+REQUEST_PROFILE_DIR = None
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'invoices.metrics': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -140,11 +230,36 @@ STATIC_URL = 'static/'
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Deleting a customer with more invoices than this is queued as a background job
+# (202 Accepted + job id) instead of cascading inside the request; see `manage.py run_workers`.
+CUSTOMER_DELETE_JOB_THRESHOLD = 500
+
+# Files written by background jobs (exports). Kept out of MEDIA_ROOT, which is served
+# without authentication; the job's creator downloads them from /api/jobs/<id>/download/.
+JOB_FILES_ROOT = BASE_DIR / "job_files"
+
+# Threads generating resized avatar variants (invoices.avatars) after an upload returns.
+# 0 generates them inline, before the upload's response.
+AVATAR_VARIANT_WORKERS = 2
 
 
+SIMPLE_JWT = {
+    # Tokens carry a hash of the user's password and stop working once it changes;
+    # CachedJWTAuthentication also keys its user cache by it. Tokens from before this
+    # was on have no hash and are accepted until they expire (see CachedJWTAuthentication),
+    # which relies on ROTATE_REFRESH_TOKENS staying off.
+    "CHECK_REVOKE_TOKEN": True,
+}
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # simplejwt's JWTAuthentication, with the user and profile cached between requests
+        "invoices.authentication.CachedJWTAuthentication",
+    ),
+    # Same bytes as DRF's JSONRenderer, encoded with orjson when it is installed
+    "DEFAULT_RENDERER_CLASSES": (
+        "invoices.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
     ),
 }
 
@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Invoice, Payment
+from .models import Invoice, Job, Payment
 
 # Register your models here.
 
 admin.site.register(Invoice)
-admin.site.register(Payment)
\ No newline at end of file
+admin.site.register(Payment)
+admin.site.register(Job)
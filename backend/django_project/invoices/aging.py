@@ -0,0 +1,113 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Customer, Invoice, Payment
+
+# (bucket, fewest days past due, most days past due); None is open-ended
+BUCKETS = [
+    ("current", None, 0),
+    ("1_30", 1, 30),
+    ("31_60", 31, 60),
+    ("61_90", 61, 90),
+    ("90_plus", 91, None),
+]
+
+CENT = Decimal("0.01")
+
+
+def bucket_bounds(as_of):
+    # bucket -> (earliest due date, latest due date) as of `as_of`
+    return {
+        name: (
+            as_of - timedelta(days=most) if most is not None else None,
+            as_of - timedelta(days=fewest) if fewest is not None else None,
+        )
+        for name, fewest, most in BUCKETS
+    }
+
+
+def aging_sql(as_of, customer=None):
+    """
+    One statement: every invoice issued by `as_of` with its balance as of that day,
+    summed per customer into the buckets by conditional aggregation. For today the
+    stored balance_due already nets out every payment, so only open invoices are
+    read; for an earlier date the invoices are joined to their payments received
+    by the end of that day, summed per invoice.
+    """
+    invoice, payment, customer_table = Invoice._meta.db_table, Payment._meta.db_table, Customer._meta.db_table
+    params = []
+
+    columns = []
+    for name, (earliest, latest) in bucket_bounds(as_of).items():
+        conditions = []
+        if earliest is not None:
+            conditions.append("o.due_date >= %s")
+            params.append(earliest)
+        if latest is not None:
+            conditions.append("o.due_date <= %s")
+            params.append(latest)
+        columns.append(f"ROUND(SUM(CASE WHEN {' AND '.join(conditions)} THEN o.balance ELSE 0 END), 2) AS b_{name}")
+
+    if as_of >= timezone.localdate():
+        balances = f"""
+            SELECT i.customer_id, i.due_date, i.balance_due AS balance
+            FROM {invoice} i
+            WHERE i.issue_date <= %s AND i.status IN ('unpaid', 'partially_paid')"""
+        params.append(as_of)
+    else:
+        cutoff = timezone.make_aware(datetime.combine(as_of + timedelta(days=1), time.min))
+        balances = f"""
+            SELECT i.customer_id, i.due_date, ROUND(i.total_amount - COALESCE(p.amount, 0), 2) AS balance
+            FROM {invoice} i
+            LEFT JOIN (
+                SELECT invoice_id, SUM(amount) AS amount FROM {payment}
+                WHERE created_at < %s GROUP BY invoice_id
+            ) p ON p.invoice_id = i.id
+            WHERE i.issue_date <= %s"""
+        params += [cutoff, as_of]
+
+    if customer is not None:
+        balances += " AND i.customer_id = %s"
+        params.append(customer)
+
+    sql = f"""
+        SELECT o.customer_id, c.name, {", ".join(columns)},
+               ROUND(SUM(o.balance), 2) AS total, COUNT(*) AS invoices
+        FROM ({balances}) o
+        JOIN {customer_table} c ON c.id = o.customer_id
+        WHERE o.balance > 0
+        GROUP BY o.customer_id, c.name
+        ORDER BY total DESC, o.customer_id"""
+    return sql, params
+
+
+def aging_report(as_of=None, customer=None):
+    """
+    Accounts-receivable aging as of a date (default today): outstanding balance net
+    of payments in the BUCKETS by days past due, per customer (largest balance first)
+    and in total. Paid invoices are left out.
+    """
+    as_of = as_of or timezone.localdate()
+    names = [name for name, _, _ in BUCKETS]
+    totals = dict.fromkeys(names + ["total"], Decimal("0.00"))
+    totals["invoices"] = 0
+
+    sql, params = aging_sql(as_of, customer)
+    customers = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for customer_id, name, *amounts, invoices in cursor.fetchall():
+            # SQLite sums decimals as floats; the SQL rounds, this makes them exact again
+            row = {"customer_id": customer_id, "customer_name": name}
+            for key, amount in zip(names + ["total"], amounts):
+                row[key] = Decimal(str(amount or 0)).quantize(CENT)
+                totals[key] += row[key]
+            row["invoices"] = invoices
+            totals["invoices"] += invoices
+            customers.append(row)
+
+    totals["customers"] = len(customers)
+    return {"as_of": as_of, "buckets": names, "totals": totals, "customers": customers}
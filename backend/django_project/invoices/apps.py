@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class InvoicesConfig(AppConfig):
     name = 'invoices'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+
+        # Optional in-process overdue sweep; use `manage.py sweep_overdue` from cron instead if preferred
+        interval = getattr(settings, "OVERDUE_SWEEP_INTERVAL", None)
+        if interval:
+            from .scheduler import start_overdue_sweeper
+            start_overdue_sweeper(interval)
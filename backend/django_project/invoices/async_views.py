@@ -0,0 +1,40 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView with `async def` handlers, so Django runs it as an async view: under
+    ASGI a request waiting on the database doesn't hold a worker thread.
+
+    DRF's request checks (authentication, which looks the user up, permissions,
+    throttling) and any sync handler such as OPTIONS run through sync_to_async.
+    Write handlers should hand their transactional work to sync_to_async as well,
+    since transaction.atomic() can't span awaits.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        # APIView.dispatch with the checks and the handler awaited
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            if not iscoroutinefunction(handler):
+                handler = sync_to_async(handler)
+
+            response = await handler(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
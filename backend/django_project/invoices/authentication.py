@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+USER_CACHE_KEY = "auth:user"
+USER_VERSION_KEY = "auth:user-version"
+
+# The receivers in signals.py bump the user's version when the user or profile is
+# saved, but with the per-process LocMemCache only in the process that saved it:
+# other workers can keep accepting a deactivated user for this long. A password
+# change does reach them sooner, for tokens issued after it (see user_cache_key).
+USER_CACHE_TIMEOUT = 60
+
+
+def user_cache_key(user_id, token_version=""):
+    # Keyed by the user's version, so a bump orphans every entry at once, and by the
+    # token's password-hash claim, so a token issued after a password change never
+    # reads a user cached before it
+    version = cache.get(f"{USER_VERSION_KEY}:{user_id}", 0)
+    return f"{USER_CACHE_KEY}:{user_id}:{version}:{token_version}"
+
+
+def invalidate_user(user_id):
+    key = f"{USER_VERSION_KEY}:{user_id}"
+    cache.add(key, 0, None)
+    cache.incr(key)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the user, with its profile, in the cache instead
+    of loading it on every request. The active and password-changed checks
+    (CHECK_REVOKE_TOKEN) run on every request, against the cached row.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        key = user_cache_key(user_id, validated_token.get(api_settings.REVOKE_TOKEN_CLAIM, ""))
+        user = cache.get(key)
+        if user is None:
+            user_model = get_user_model()
+            try:
+                user = user_model.objects.select_related("profile").get(**{api_settings.USER_ID_FIELD: user_id})
+            except user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            cache.set(key, user, USER_CACHE_TIMEOUT)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Tokens issued before CHECK_REVOKE_TOKEN was turned on have no claim, so they are
+            # let through instead of logging everyone out. New tokens always carry it and
+            # refresh tokens aren't rotated, so only a refresh token from back then can mint
+            # one: they are gone one REFRESH_TOKEN_LIFETIME after the deploy.
+            claim = validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+            if claim is not None and claim != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class QueryParamJWTAuthentication(CachedJWTAuthentication):
+    """
+    Reads the access token from ?token= for EventSource, which can't send an
+    Authorization header. URLs end up in access logs, so only the dashboard
+    stream accepts it.
+    """
+
+    def authenticate(self, request):
+        raw_token = request.query_params.get("token")
+        if not raw_token:
+            return None
+        validated_token = self.get_validated_token(raw_token.encode())
+        return self.get_user(validated_token), validated_token
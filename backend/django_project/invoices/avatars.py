@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .authentication import invalidate_user
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+AVATAR_DIR = "avatars"
+# Square thumbnails generated for every upload, in pixels
+VARIANT_SIZES = (32, 64, 256)
+VARIANT_QUALITY = 80
+
+_executor = None
+
+
+def original_name(upload):
+    """
+    The storage name of an uploaded image: the SHA-256 of its content, so identical
+    files are stored once and shared. The upload is read in chunks (Django has
+    already spooled large ones to a temporary file).
+    """
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+
+    image_format = upload.image.format.lower()  # set by ImageField validation
+    extension = {"jpeg": "jpg"}.get(image_format, image_format)
+    return posixpath.join(AVATAR_DIR, f"{digest.hexdigest()}.{extension}")
+
+
+def store_original(upload, name):
+    """
+    Save the upload as `name` unless that file is already there. Call it after the
+    profile pointing at `name` is saved, in the same transaction: the row write holds
+    SQLite's write lock, so a delete_if_unused that got the lock first has finished
+    and the file is saved again, and one that comes later sees the reference.
+    """
+    if not default_storage.exists(name):
+        upload.seek(0)
+        default_storage.save(name, upload)
+    return name
+
+
+def variant_name(name, size):
+    stem = posixpath.splitext(name)[0]
+    return f"{stem}-{size}.webp"
+
+
+def generate_variants(name):
+    # Resize the stored original to every VARIANT_SIZES square; returns {size: storage name}
+    with default_storage.open(name) as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+    variants = {}
+    for size in VARIANT_SIZES:
+        target = variant_name(name, size)
+        if not default_storage.exists(target):
+            output = BytesIO()
+            ImageOps.fit(image, (size, size), Image.LANCZOS).save(output, "WEBP", quality=VARIANT_QUALITY)
+            default_storage.save(target, ContentFile(output.getvalue()))
+        variants[str(size)] = target
+    return variants
+
+
+def process_avatar(name):
+    # Generate the variants and record them on every profile using this original
+    variants = generate_variants(name)
+    profiles = Profile.objects.filter(avatar=name)
+    user_ids = list(profiles.values_list("user_id", flat=True))
+    profiles.update(avatar_variants=variants)
+
+    # update() sends no post_save: drop the cached users ourselves
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    return variants
+
+
+def _process_in_worker(name):
+    try:
+        return process_avatar(name)
+    except Exception:
+        logger.exception("Generating avatar variants for %s failed", name)
+        raise
+    finally:
+        # Pool threads outlive requests; don't leave their connection open
+        connection.close()
+
+
+def schedule_variants(name):
+    """
+    Generate variants for `name` once the current transaction commits: on the
+    AVATAR_VARIANT_WORKERS thread pool so the upload doesn't wait for them, or
+    inline when that setting is 0.
+    """
+    global _executor
+
+    workers = getattr(settings, "AVATAR_VARIANT_WORKERS", 0)
+    if not workers:
+        transaction.on_commit(lambda: process_avatar(name))
+        return
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="avatar-variants")
+    transaction.on_commit(lambda: _executor.submit(_process_in_worker, name))
+
+
+def delete_if_unused(name):
+    """
+    Remove an original and its variants once no profile points at them. Run it on
+    commit of the change that dropped the reference. The no-op UPDATE takes the write
+    lock before the check, so an upload saving a profile with this name concurrently
+    has either committed (and is counted) or waits and stores the file again.
+    """
+    if not name:
+        return False
+    with transaction.atomic():
+        if Profile.objects.filter(avatar=name).update(avatar=name):
+            return False
+        for target in [name] + [variant_name(name, size) for size in VARIANT_SIZES]:
+            default_storage.delete(target)
+    return True
+
+
+def variant_urls(profile):
+    return {size: default_storage.url(target) for size, target in (profile.avatar_variants or {}).items()}
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core import checks
+
+
+@checks.register()
+def check_overdue_sweep(app_configs, **kwargs):
+    # The dashboard and the overdue list read Invoice.is_overdue; without a sweep it goes stale
+    if getattr(settings, "OVERDUE_SWEEP_INTERVAL", None):
+        return []
+    return [
+        checks.Warning(
+            "OVERDUE_SWEEP_INTERVAL is not set, so nothing in this process flags invoices that fall past due.",
+            hint=(
+                "Set OVERDUE_SWEEP_INTERVAL (seconds), or run `manage.py sweep_overdue` daily from cron "
+                "and add 'invoices.W001' to SILENCED_SYSTEM_CHECKS."
+            ),
+            id="invoices.W001",
+        )
+    ]
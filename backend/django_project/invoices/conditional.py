@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import Customer
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5("|".join(str(part) for part in parts).encode("utf-8")).hexdigest())
+
+
+def latest(*timestamps):
+    # The newest of the given timestamps, as the int seconds Last-Modified works with
+    timestamps = [ts for ts in timestamps if ts is not None]
+    return int(max(timestamps).timestamp()) if timestamps else None
+
+
+async def ainvoice_list_validators(request, invoices):
+    """
+    (etag, last_modified) for a list of invoices, from two index-backed queries
+    (run concurrently) instead of serializing the list. Payment changes bump
+    Invoice.updated_at, and the newest Customer.updated_at covers the embedded
+    customer names. Count catches deletes; the query string keeps pages/filters apart.
+    """
+    stats, customers = await asyncio.gather(
+        invoices.order_by().aaggregate(count=Count("id"), last=Max("updated_at")),
+        Customer.objects.aaggregate(last=Max("updated_at")),
+    )
+    etag = make_etag(request.get_full_path(), stats["count"], stats["last"], customers["last"])
+    return etag, latest(stats["last"], customers["last"])
+
+
+async def ainvoice_page_validators(request, rows, has_next):
+    """
+    (etag, last_modified) for one keyset page of invoices, from the .values() rows already
+    fetched for it (they need id and updated_at). A page only depends on its own rows and
+    on whether another page follows, so a filtered or searched list over a large table
+    doesn't pay for an aggregate over every match.
+    """
+    customers_last = (await Customer.objects.aaggregate(last=Max("updated_at")))["last"]
+    stamps = [row["updated_at"] for row in rows]
+    etag = make_etag(
+        request.get_full_path(), has_next, *(f"{row['id']}:{row['updated_at']}" for row in rows), customers_last,
+    )
+    return etag, latest(*stamps, customers_last)
+
+
+async def acustomer_list_validators(request, customers):
+    stats = await customers.order_by().aaggregate(count=Count("id"), last=Max("updated_at"))
+    return make_etag(request.get_full_path(), stats["count"], stats["last"]), latest(stats["last"])
+
+
+def not_modified(request, validators):
+    # 304 for a matching conditional GET, 412 for a failed If-Match on writes, else None
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def with_validators(response, validators):
+    if validators is not None and 200 <= response.status_code < 300:
+        etag, last_modified = validators
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+class ConditionalObjectMixin:
+    """
+    ETag/Last-Modified for RetrieveUpdate generic views. GET answers 304 when the
+    client's copy is current; PUT/PATCH honour If-Match / If-Unmodified-Since so a
+    stale client gets 412 instead of silently overwriting someone else's change.
+    """
+
+    # updated_at columns that affect the representation, e.g. ("updated_at", "customer__updated_at")
+    validator_fields = ("updated_at",)
+
+    def get_validators(self):
+        lookup = {self.lookup_field: self.kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        row = self.get_queryset().model.objects.filter(**lookup).values_list(*self.validator_fields).first()
+        if row is None:
+            return None
+        return make_etag(*row), latest(*row)
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        return with_validators(super().retrieve(request, *args, **kwargs), validators)
+
+    def update(self, request, *args, **kwargs):
+        response = not_modified(request, self.get_validators())
+        if response is not None:
+            return response
+        response = super().update(request, *args, **kwargs)
+        return with_validators(response, self.get_validators())
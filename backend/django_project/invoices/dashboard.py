@@ -0,0 +1,112 @@
+import asyncio
+from datetime import date
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .events import CoalescingChannel
+from .models import Invoice, Payment
+from .renderers import ORJSONRenderer
+
+SUMMARY_CACHE_KEY = "dashboard:summary"
+
+# The overdue sweep runs UPDATEs that don't send signals, so even without
+# writes the cached summary is only trusted for a short while.
+SUMMARY_CACHE_TIMEOUT = 60
+
+# Seconds between comment lines on an idle event stream, so proxies don't close it
+STREAM_KEEPALIVE = 15
+
+
+async def acompute_summary():
+    # One conditional-aggregation pass over invoices plus one over payments, run concurrently.
+    # Overdue reads the is_overdue flag kept current by services.sweep_overdue.
+    paid = Q(status="paid")
+    unpaid = Q(status="unpaid")
+    overdue = Q(is_overdue=True)
+
+    invoices, payments = await asyncio.gather(
+        Invoice.objects.aaggregate(
+            total_invoices=Count("id"),
+            paid=Count("id", filter=paid),
+            unpaid=Count("id", filter=unpaid),
+            overdue=Count("id", filter=overdue),
+            overdue_total=Sum("total_amount", filter=overdue),
+            total_revenue=Sum("total_amount"),
+            unpaid_total=Sum("total_amount", filter=unpaid),
+        ),
+        Payment.objects.aaggregate(total=Sum("amount")),
+    )
+
+    return {
+        "total_invoices": invoices["total_invoices"],
+        "paid": invoices["paid"],
+        "unpaid": invoices["unpaid"],
+        "overdue": invoices["overdue"],
+        "overdue_total": invoices["overdue_total"] or 0,
+        "total_revenue": invoices["total_revenue"] or 0,
+        "unpaid_total": invoices["unpaid_total"] or 0,
+        "total_payments_collected": payments["total"] or 0,
+    }
+
+
+async def aget_summary():
+    # Keyed by date so the overdue figures roll over at midnight
+    key = f"{SUMMARY_CACHE_KEY}:{date.today().isoformat()}"
+    summary = await cache.aget(key)
+    if summary is None:
+        summary = await acompute_summary()
+        await cache.aset(key, summary, SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def refresh_summary():
+    # Recompute for the live stream (invoices.events), and put the result in the cache for pollers
+    summary = async_to_sync(acompute_summary)()
+    cache.set(f"{SUMMARY_CACHE_KEY}:{date.today().isoformat()}", summary, SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+# Subscribed to by GET /api/dashboard/stream/; a burst of writes inside `delay` costs one recompute
+summary_channel = CoalescingChannel(refresh_summary, delay=0.5, refresh=SUMMARY_CACHE_TIMEOUT)
+
+
+def invalidate_summary():
+    # Once the write commits: dropped any earlier, a summary request in between would
+    # cache the pre-commit figures again for SUMMARY_CACHE_TIMEOUT
+    transaction.on_commit(drop_summary)
+
+
+def drop_summary():
+    cache.delete(f"{SUMMARY_CACHE_KEY}:{date.today().isoformat()}")
+    # Streamed dashboards recompute
+    summary_channel.notify()
+
+
+def sse(event, data):
+    # One Server-Sent Events message; the JSON is the same as the summary endpoint's
+    return b"event: " + event.encode() + b"\ndata: " + ORJSONRenderer().render(data) + b"\n\n"
+
+
+async def summary_events():
+    """
+    The dashboard stream: the full summary first, then only the figures that changed,
+    whenever a committed write (or the periodic refresh) changes them.
+    """
+    # Subscribe before reading the snapshot so no change falls in between
+    subscription = summary_channel.subscribe()
+    try:
+        # Thousands of open dashboards share the channel's value instead of querying on connect
+        snapshot = summary_channel.current or summary_channel.seed(await aget_summary())
+        yield b"retry: 5000\n" + sse("summary", snapshot)
+        while True:
+            try:
+                delta = await asyncio.wait_for(subscription.get(), STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield sse("summary", delta)
+    finally:
+        subscription.close()
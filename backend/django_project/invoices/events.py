@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import threading
+import time
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    One listener on a CoalescingChannel, read from its event loop with `await get()`.
+    Deltas that arrive before the listener reads them are merged, so a slow client
+    gets one up-to-date delta instead of a backlog.
+    """
+
+    def __init__(self, channel, loop):
+        self.channel = channel
+        self.loop = loop
+        self.pending = {}
+        self._ready = asyncio.Event()
+
+    def deliver(self, delta):
+        # Called from the channel's thread
+        self.loop.call_soon_threadsafe(self._merge, delta)
+
+    def _merge(self, delta):
+        self.pending.update(delta)
+        self._ready.set()
+
+    async def get(self):
+        await self._ready.wait()
+        self._ready.clear()
+        delta, self.pending = self.pending, {}
+        return delta
+
+    def close(self):
+        self.channel.unsubscribe(self)
+
+
+class CoalescingChannel:
+    """
+    In-process pub/sub for a value computed by `compute()` (a dict). `notify()` says
+    the value may have changed; notifications arriving within `delay` seconds of each
+    other lead to one compute, and subscribers get only the keys that changed. While
+    anyone is subscribed it is also recomputed every `refresh` seconds, to pick up
+    changes made by other processes. The cost is one compute per burst per process,
+    however many subscribers there are; with none, notify() does nothing.
+    """
+
+    def __init__(self, compute, delay=0.5, refresh=30):
+        self.compute = compute
+        self.delay = delay
+        self.refresh = refresh
+        self.current = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def subscribe(self):
+        # From a coroutine: the subscription delivers on the running loop
+        subscription = Subscription(self, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="channel-publisher", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+        if not self._subscribers:
+            self._wake.set()  # let the publisher thread notice and exit
+
+    def notify(self):
+        self._wake.set()
+
+    def seed(self, value):
+        # Baseline for the first delta when a subscriber fetched the value itself; returns the current value
+        with self._lock:
+            if self.current is None:
+                self.current = value
+            return self.current
+
+    def publish(self, value):
+        # Send the keys of `value` that differ from the last published value
+        with self._lock:
+            previous, self.current = self.current or {}, value
+        delta = {key: item for key, item in value.items() if previous.get(key) != item}
+        if delta:
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for subscription in subscribers:
+                subscription.deliver(delta)
+        return delta
+
+    def _run(self):
+        while True:
+            if self._wake.wait(self.refresh):
+                time.sleep(self.delay)  # let the rest of the burst arrive
+            self._wake.clear()
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    self.current = None
+                    return
+            try:
+                self.publish(self.compute())
+            except Exception:
+                logger.exception("Recomputing a channel's value failed")
+            finally:
+                close_old_connections()
@@ -0,0 +1,82 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .filters import filter_invoices
+from .models import Invoice, Payment
+
+# Rows are read with .values() straight from the database; customer name and
+# balance due come from the join / the stored balance_due column, never per row.
+INVOICE_EXPORT_FIELDS = [
+    "id",
+    "invoice_number",
+    "customer_id",
+    "customer__name",
+    "issue_date",
+    "due_date",
+    "total_amount",
+    "amount_paid",
+    "balance_due",
+    "status",
+    "is_overdue",
+    "created_at",
+]
+
+PAYMENT_EXPORT_FIELDS = [
+    "id",
+    "invoice_id",
+    "invoice__invoice_number",
+    "invoice__customer_id",
+    "invoice__customer__name",
+    "amount",
+    "note",
+    "created_at",
+]
+
+EXPORT_FORMATS = ("csv", "ndjson")
+CHUNK_SIZE = 2000
+
+
+def invoice_export_queryset(filters):
+    # `filters` from filters.parse_invoice_filters, the same ones the invoice list takes
+    return filter_invoices(Invoice.objects.all(), filters).order_by("id").values(*INVOICE_EXPORT_FIELDS)
+
+
+def payment_export_queryset(filters):
+    # Date range applies to when the payment was received; status/customer to its invoice.
+    # The invoice-only filters (amounts, overdue, q) don't apply to payments.
+    queryset = Payment.objects.all()
+    if "from" in filters:
+        queryset = queryset.filter(created_at__date__gte=filters["from"])
+    if "to" in filters:
+        queryset = queryset.filter(created_at__date__lte=filters["to"])
+    if "status" in filters:
+        queryset = queryset.filter(invoice__status=filters["status"])
+    if "customer" in filters:
+        queryset = queryset.filter(invoice__customer_id=filters["customer"])
+    return queryset.order_by("id").values(*PAYMENT_EXPORT_FIELDS)
+
+
+class _Echo:
+    # csv.writer needs a file-like object; this one just hands back each line
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield writer.writerow([row[field] for field in fields])
+
+
+def stream_ndjson(queryset):
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def stream_export(queryset, fields, file_format):
+    if file_format == "csv":
+        return stream_csv(queryset, fields)
+    return stream_ndjson(queryset)
@@ -0,0 +1,137 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db.models.expressions import RawSQL
+from django.utils.dateparse import parse_date
+
+from .models import Invoice
+
+# FTS5 tables created by migration 0010 and kept in sync by SQLite triggers, so
+# bulk_create/update()/raw SQL writes are indexed too. rowid is the object's id.
+INVOICE_SEARCH_TABLE = "invoices_invoice_search"    # invoice_number, customer_name, customer_email
+CUSTOMER_SEARCH_TABLE = "invoices_customer_search"  # name, email
+
+# Longer queries are cut to their first few words
+MAX_SEARCH_TERMS = 8
+
+BOOLEAN_VALUES = {"true": True, "1": True, "false": False, "0": False}
+
+
+class FilterError(ValueError):
+    pass
+
+
+def search_expression(text):
+    # Every word must match, the last one as a prefix so results follow the user's typing
+    # ("acme 0012" finds Acme's INV-001234). Only the last word is a prefix query: FTS5 merges
+    # the posting lists of every token a prefix covers, which gets slow for short, common words.
+    # Words are quoted so user input can't use (or break) the FTS5 query syntax.
+    terms = [f'"{term}"' for term in re.findall(r"\w+", text or "")[:MAX_SEARCH_TERMS]]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_ids(table, text):
+    # Subquery of the ids matching `text`, for use as id__in=
+    return RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [search_expression(text)])
+
+
+def _parse_date(params, key):
+    value = params.get(key)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise FilterError(f"'{key}' must be a date in YYYY-MM-DD format.")
+    return parsed
+
+
+def _parse_amount(params, key):
+    value = params.get(key)
+    if not value:
+        return None
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite():
+        raise FilterError(f"'{key}' must be a number.")
+    return amount
+
+
+def parse_invoice_filters(params):
+    """
+    Validate the invoice filters shared by the list endpoints, the exports and the
+    export_invoices command:
+      ?status=  ?customer=<id>  ?from=&to= (issue date)  ?min_amount=&max_amount= (total)
+      ?overdue=true|false  ?q= (invoice number, customer name or email)
+    Raises FilterError with a message for the client.
+    """
+    filters = {}
+
+    for key in ("from", "to"):
+        parsed = _parse_date(params, key)
+        if parsed is not None:
+            filters[key] = parsed
+
+    for key in ("min_amount", "max_amount"):
+        amount = _parse_amount(params, key)
+        if amount is not None:
+            filters[key] = amount
+
+    status = params.get("status")
+    if status:
+        valid = {choice for choice, _ in Invoice.STATUS_CHOICES}
+        if status not in valid:
+            raise FilterError(f"'status' must be one of: {', '.join(sorted(valid))}.")
+        filters["status"] = status
+
+    customer = params.get("customer")
+    if customer:
+        try:
+            filters["customer"] = int(customer)
+        except (TypeError, ValueError):
+            raise FilterError("'customer' must be a customer id.")
+
+    overdue = params.get("overdue")
+    if overdue:
+        if str(overdue).lower() not in BOOLEAN_VALUES:
+            raise FilterError("'overdue' must be true or false.")
+        filters["overdue"] = BOOLEAN_VALUES[str(overdue).lower()]
+
+    if search_expression(params.get("q")):
+        filters["q"] = params.get("q")
+
+    return filters
+
+
+def filter_invoices(queryset, filters):
+    # Every structured filter is on an indexed column (see Invoice.Meta.indexes)
+    if "from" in filters:
+        queryset = queryset.filter(issue_date__gte=filters["from"])
+    if "to" in filters:
+        queryset = queryset.filter(issue_date__lte=filters["to"])
+    if "min_amount" in filters:
+        queryset = queryset.filter(total_amount__gte=filters["min_amount"])
+    if "max_amount" in filters:
+        queryset = queryset.filter(total_amount__lte=filters["max_amount"])
+    if "status" in filters:
+        queryset = queryset.filter(status=filters["status"])
+    if "customer" in filters:
+        queryset = queryset.filter(customer_id=filters["customer"])
+    if "overdue" in filters:
+        queryset = queryset.filter(is_overdue=filters["overdue"])
+    if "q" in filters:
+        queryset = queryset.filter(id__in=search_ids(INVOICE_SEARCH_TABLE, filters["q"]))
+    return queryset
+
+
+def filter_customers(queryset, params):
+    # ?q= over customer name and email
+    if search_expression(params.get("q")):
+        queryset = queryset.filter(id__in=search_ids(CUSTOMER_SEARCH_TABLE, params.get("q")))
+    return queryset
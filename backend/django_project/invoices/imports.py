@@ -0,0 +1,206 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .dashboard import invalidate_summary
+from .models import Invoice, Payment
+from .rollups import bump
+from .services import set_invoice_status
+
+IMPORT_FORMATS = ("csv", "ndjson")
+BATCH_SIZE = 1000
+
+# Only the first few problem lines are echoed back; the counts cover all of them
+MAX_REPORTED_ERRORS = 100
+
+
+# Stands in for a line that isn't text in the file's encoding
+UNDECODABLE = object()
+
+
+def decode_lines(lines, encoding, undecodable):
+    # Text lines from byte lines; a line that doesn't decode has its number added to
+    # `undecodable` and is passed on blank, which both parsers skip
+    for number, line in enumerate(lines, start=1):
+        try:
+            yield line.decode(encoding)
+        except UnicodeDecodeError:
+            undecodable.append(number)
+            yield "\n"
+
+
+def read_records(lines, file_format, encoding="utf-8"):
+    # Yield (line number, dict) from an iterable of byte lines without reading it all in.
+    # Lines that can't be parsed come through as (line number, None), lines that aren't
+    # text in `encoding` as (line number, UNDECODABLE).
+    undecodable = []
+    text = decode_lines(lines, encoding, undecodable)
+
+    if file_format == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            while undecodable:
+                yield undecodable.pop(0), UNDECODABLE
+            yield reader.line_num, record
+        while undecodable:
+            yield undecodable.pop(0), UNDECODABLE
+        return
+
+    for number, line in enumerate(text, start=1):
+        if undecodable:
+            yield undecodable.pop(), UNDECODABLE
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield number, record if isinstance(record, dict) else None
+
+
+def clean_record(record):
+    # Returns (invoice_number, amount, reference, note) or raises ValueError with a reason
+    if record is UNDECODABLE:
+        raise ValueError("line is not UTF-8 text")
+    if record is None:
+        raise ValueError("could not parse line")
+
+    invoice_number = str(record.get("invoice_number") or "").strip()
+    if not invoice_number:
+        raise ValueError("missing invoice_number")
+
+    try:
+        amount = Decimal(str(record.get("amount", "")).strip())
+    except InvalidOperation:
+        raise ValueError("amount is not a number")
+    if not amount.is_finite() or amount <= 0 or amount != amount.quantize(Decimal("0.01")):
+        raise ValueError("amount must be positive with at most 2 decimal places")
+
+    reference = str(record.get("reference") or "").strip() or None
+    note = str(record.get("note") or "").strip() or None
+    return invoice_number, amount, reference, note[:255] if note else None
+
+
+class PaymentImport:
+    """
+    Posts payments from a settlement file in batches: one invoice lookup, one
+    duplicate check and one bulk_create per batch, then the touched invoices get
+    amount_paid/status recomputed with a single grouped aggregate and bulk_update.
+
+    Each batch commits on its own, so re-running a partially imported file is
+    safe: lines whose reference was already posted are reported as duplicates.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.seen_references = set()
+        self.summary = {
+            "lines": 0,
+            "imported": 0,
+            "imported_amount": Decimal("0.00"),
+            "unmatched": 0,
+            "duplicates": 0,
+            "invalid": 0,
+            "errors": [],
+        }
+
+    def run(self, records):
+        batch = []
+        for number, record in records:
+            self.summary["lines"] += 1
+            try:
+                batch.append((number, *clean_record(record)))
+            except ValueError as exc:
+                self.reject("invalid", number, str(exc))
+                continue
+
+            if len(batch) >= self.batch_size:
+                self.post_batch(batch)
+                batch = []
+
+        if batch:
+            self.post_batch(batch)
+        if self.summary["imported"]:
+            invalidate_summary()
+        return self.summary
+
+    def reject(self, kind, number, reason):
+        self.summary[kind] += 1
+        if len(self.summary["errors"]) < MAX_REPORTED_ERRORS:
+            self.summary["errors"].append({"line": number, "error": reason})
+
+    def post_batch(self, batch):
+        invoice_ids = dict(
+            Invoice.objects.filter(invoice_number__in={line[1] for line in batch})
+            .values_list("invoice_number", "id")
+        )
+        posted = self.posted_references({line[3] for line in batch if line[3]})
+
+        lines = []  # (line number, Payment)
+        for number, invoice_number, amount, reference, note in batch:
+            if invoice_number not in invoice_ids:
+                self.reject("unmatched", number, f"no invoice {invoice_number}")
+                continue
+            if reference and (reference in posted or reference in self.seen_references):
+                self.reject("duplicates", number, f"reference {reference} already posted")
+                continue
+            if reference:
+                self.seen_references.add(reference)
+            payment = Payment(invoice_id=invoice_ids[invoice_number], amount=amount, reference=reference, note=note)
+            lines.append((number, payment))
+
+        while lines:
+            payments = [payment for _, payment in lines]
+            try:
+                with transaction.atomic():
+                    Payment.objects.bulk_create(payments)
+                    self.refresh_invoices({payment.invoice_id for payment in payments})
+
+                    total = sum(payment.amount for payment in payments)
+                    bump("payments", timezone.localdate(payments[0].created_at), total, len(payments))
+                break
+            except IntegrityError:
+                # Another import posted some of these references since the check above
+                posted = self.posted_references({payment.reference for payment in payments if payment.reference})
+                if not posted:
+                    raise
+                for number, payment in lines:
+                    if payment.reference in posted:
+                        self.reject("duplicates", number, f"reference {payment.reference} already posted")
+                lines = [(number, payment) for number, payment in lines if payment.reference not in posted]
+        else:
+            return
+
+        self.summary["imported"] += len(payments)
+        self.summary["imported_amount"] += total
+
+    def posted_references(self, references):
+        return set(Payment.objects.filter(reference__in=references).values_list("reference", flat=True))
+
+    def refresh_invoices(self, invoice_ids):
+        totals = dict(
+            Payment.objects.filter(invoice_id__in=invoice_ids)
+            .values("invoice_id")
+            .annotate(total=Sum("amount"))
+            .values_list("invoice_id", "total")
+        )
+        invoices = list(
+            Invoice.objects.filter(id__in=invoice_ids)
+            .only("id", "amount_paid", "total_amount", "due_date", "status", "is_overdue")
+        )
+        now = timezone.now()
+        for invoice in invoices:
+            invoice.amount_paid = totals.get(invoice.id, 0)
+            invoice.updated_at = now
+            set_invoice_status(invoice)
+        Invoice.objects.bulk_update(invoices, ["amount_paid", "status", "is_overdue", "updated_at"])
+
+
+def import_payments(lines, file_format, batch_size=BATCH_SIZE):
+    return PaymentImport(batch_size).run(read_records(lines, file_format))
@@ -0,0 +1,241 @@
+import logging
+import os
+import secrets
+import socket
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import OperationalError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .exports import (
+    INVOICE_EXPORT_FIELDS, PAYMENT_EXPORT_FIELDS, invoice_export_queryset, payment_export_queryset, stream_export,
+)
+from .filters import parse_invoice_filters
+from .models import Customer, Job
+from .services import repair_balance_drift, sweep_overdue
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a failed attempt is retried: RETRY_DELAY * 2 ** (attempts - 1)
+RETRY_DELAY = 30
+# A job still "running" after this long belonged to a worker that died; it is queued again
+STALE_AFTER = timedelta(hours=1)
+# Due jobs looked at per claim; another worker may take some of them first
+CLAIM_BATCH = 5
+# Tries at saving a job's outcome while the database is locked, this many seconds apart
+OUTCOME_SAVE_ATTEMPTS = 5
+LOCK_RETRY_DELAY = 0.1
+
+# kind -> function(payload) returning a JSON-serializable result
+HANDLERS = {}
+
+
+def job_files():
+    # Where handlers keep their output: private, served only by JobDownloadView
+    return FileSystemStorage(location=settings.JOB_FILES_ROOT)
+
+
+def job(kind):
+    # Register a handler: @job("export") def run_export(payload): ...
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+class UnknownJob(ValueError):
+    pass
+
+
+def enqueue(kind, payload=None, user=None, max_attempts=3):
+    """
+    Queue `kind` to run in a worker (`manage.py run_workers`) and return the Job.
+    The row is written in the caller's transaction, so workers only see it once
+    that commits.
+    """
+    if kind not in HANDLERS:
+        raise UnknownJob(f"Unknown job kind: {kind}")
+    return Job.objects.create(kind=kind, payload=payload or {}, created_by=user, max_attempts=max_attempts)
+
+
+def claim(worker):
+    # Take the oldest due job. The UPDATE only succeeds for one worker, without
+    # SELECT ... FOR UPDATE SKIP LOCKED, which SQLite doesn't have. It commits
+    # together with the read back, so an error in between can't strand the job
+    # as "running".
+    now = timezone.now()
+    due = (
+        Job.objects.filter(status="queued", run_after__lte=now)
+        .order_by("run_after", "id").values_list("id", flat=True)[:CLAIM_BATCH]
+    )
+    for job_id in due:
+        with transaction.atomic():
+            taken = Job.objects.filter(pk=job_id, status="queued").update(
+                status="running", worker=worker, started_at=now, attempts=F("attempts") + 1
+            )
+            if taken:
+                return Job.objects.get(pk=job_id)
+    return None
+
+
+def is_transient(exc):
+    # Lock contention with another writer ("database is locked" on SQLite), not a fault in the job
+    return isinstance(exc, OperationalError) and "lock" in str(exc).lower()
+
+
+def save_outcome(job, fields):
+    # The handler has already run: don't leave the job "running" over a moment of lock contention
+    for attempt in range(1, OUTCOME_SAVE_ATTEMPTS + 1):
+        try:
+            job.save(update_fields=fields)
+            return
+        except OperationalError as exc:
+            if not is_transient(exc) or attempt == OUTCOME_SAVE_ATTEMPTS:
+                raise
+            logger.warning("Saving %s hit a locked database; retrying", job)
+            time.sleep(LOCK_RETRY_DELAY)
+
+
+def run(job):
+    # Run a claimed job; a failure is retried with backoff until max_attempts
+    try:
+        result = HANDLERS[job.kind](job.payload)
+    except Exception as exc:
+        if is_transient(exc):
+            # Straight back in the queue, without spending an attempt
+            logger.warning("%s hit a locked database; requeued", job)
+            job.status = "queued"
+            job.attempts -= 1
+            job.run_after = timezone.now()
+            save_outcome(job, ["status", "attempts", "run_after"])
+            return job
+        logger.exception("%s failed (attempt %s of %s)", job, job.attempts, job.max_attempts)
+        job.error = f"{type(exc).__name__}: {exc}"
+        if job.attempts < job.max_attempts:
+            job.status = "queued"
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+        else:
+            job.status = "failed"
+            job.finished_at = timezone.now()
+        save_outcome(job, ["status", "error", "run_after", "finished_at"])
+        return job
+
+    job.status = "succeeded"
+    job.result = result
+    job.error = ""
+    job.finished_at = timezone.now()
+    save_outcome(job, ["status", "result", "error", "finished_at"])
+    return job
+
+
+def requeue_stale():
+    # Jobs left "running" by a worker that was killed mid-job
+    cutoff = timezone.now() - STALE_AFTER
+    return Job.objects.filter(status="running", started_at__lt=cutoff).update(status="queued", worker="")
+
+
+def work(worker, stop_event=None, poll_interval=1.0, burst=False):
+    """
+    Claim and run jobs until `stop_event` is set, sleeping `poll_interval` seconds
+    when the queue is empty; with `burst`, return as soon as it is. Returns the
+    number of jobs run.
+    """
+    stop_event = stop_event or threading.Event()
+    done = 0
+    while not stop_event.is_set():
+        try:
+            job = claim(worker)
+        except Exception as exc:
+            # Database trouble while claiming; back off and try again. Even with burst,
+            # since jobs may still be queued: only a claim that finds nothing ends it.
+            if is_transient(exc):
+                logger.warning("Job worker %s hit a locked database while claiming; retrying", worker)
+            else:
+                logger.exception("Job worker %s failed to claim a job", worker)
+            close_old_connections()
+            stop_event.wait(poll_interval)
+            continue
+
+        if job is None:
+            close_old_connections()
+            if burst:
+                break
+            stop_event.wait(poll_interval)
+            continue
+
+        try:
+            run(job)
+            done += 1
+        except Exception:
+            # Saving the outcome failed; requeue_stale() puts the job back
+            logger.exception("Job worker %s failed", worker)
+        finally:
+            close_old_connections()
+    return done
+
+
+def run_workers(threads, poll_interval=1.0, burst=False, stop_event=None):
+    # `threads` workers in this process until stop_event is set (or, with burst, the queue is empty)
+    stop_event = stop_event or threading.Event()
+    requeue_stale()
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    workers = [
+        threading.Thread(
+            target=work, args=(f"{name}:{i}", stop_event, poll_interval, burst), name=f"job-worker-{i}", daemon=True
+        )
+        for i in range(threads)
+    ]
+    for thread in workers:
+        thread.start()
+    try:
+        for thread in workers:
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        # Let running jobs finish
+        stop_event.set()
+        for thread in workers:
+            thread.join()
+
+
+# Job kinds
+
+@job("export")
+def run_export(payload):
+    # payload: {"model": "invoices"|"payments", "file_format": "csv"|"ndjson", "params": {query params}}
+    filters = parse_invoice_filters(payload.get("params", {}))
+    if payload["model"] == "payments":
+        queryset, fields = payment_export_queryset(filters), PAYMENT_EXPORT_FIELDS
+    else:
+        queryset, fields = invoice_export_queryset(filters), INVOICE_EXPORT_FIELDS
+
+    file_format = payload["file_format"]
+    # Stored under a random name; the download is offered under the readable one
+    name = f"exports/{secrets.token_urlsafe(16)}.{file_format}"
+    with tempfile.TemporaryFile("w+b") as output:
+        for chunk in stream_export(queryset, fields, file_format):
+            output.write(chunk.encode())
+        output.seek(0)
+        name = job_files().save(name, File(output, name=name))
+    return {"file": name, "filename": f"{payload['model']}-{timezone.now():%Y%m%d-%H%M%S}.{file_format}"}
+
+
+@job("delete_customer")
+def run_delete_customer(payload):
+    # Cascades to every invoice and payment, with their delete signals (rollups)
+    _, deleted = Customer.objects.filter(pk=payload["customer"]).delete()
+    return {"deleted": deleted}
+
+
+@job("recompute_status")
+def run_recompute_status(payload):
+    fixed = repair_balance_drift()
+    flagged, cleared = sweep_overdue()
+    return {"repaired": fixed, "overdue_flagged": flagged, "overdue_cleared": cleared}
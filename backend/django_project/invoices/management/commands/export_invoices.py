@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.exports import (
+    EXPORT_FORMATS, INVOICE_EXPORT_FIELDS, PAYMENT_EXPORT_FIELDS,
+    invoice_export_queryset, payment_export_queryset, stream_export,
+)
+from invoices.filters import FilterError, parse_invoice_filters
+
+
+class Command(BaseCommand):
+    help = "Stream invoices (or payments) to CSV or NDJSON without loading them into memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument("--from", dest="from", help="First issue date (payments: received date), YYYY-MM-DD.")
+        parser.add_argument("--to", dest="to", help="Last issue date (payments: received date), YYYY-MM-DD.")
+        parser.add_argument("--status", help="Invoice status.")
+        parser.add_argument("--customer", help="Customer id.")
+        parser.add_argument("--min-amount", dest="min_amount", help="Smallest invoice total.")
+        parser.add_argument("--max-amount", dest="max_amount", help="Largest invoice total.")
+        parser.add_argument("--search", dest="q", help="Invoice number, customer name or email.")
+        parser.add_argument("--payments", action="store_true", help="Export payments instead of invoices.")
+        parser.add_argument("--output", "-o", help="File to write to (default: stdout).")
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_invoice_filters(options)
+        except FilterError as exc:
+            raise CommandError(str(exc))
+
+        if options["payments"]:
+            queryset, fields = payment_export_queryset(filters), PAYMENT_EXPORT_FIELDS
+        else:
+            queryset, fields = invoice_export_queryset(filters), INVOICE_EXPORT_FIELDS
+
+        rows = stream_export(queryset, fields, options["format"])
+
+        if not options["output"]:
+            for chunk in rows:
+                self.stdout.write(chunk, ending="")
+            return
+
+        with open(options["output"], "w", newline="", encoding="utf-8") as output:
+            for chunk in rows:
+                output.write(chunk)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.imports import BATCH_SIZE, IMPORT_FORMATS, import_payments
+
+
+class Command(BaseCommand):
+    help = "Post payments from a bank/processor settlement file (CSV or NDJSON)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Settlement file with invoice_number, amount and optional reference/note.")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+
+        try:
+            with open(path, "rb") as lines:
+                summary = import_payments(lines, file_format, options["batch_size"])
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for error in summary["errors"]:
+            self.stdout.write(f"line {error['line']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['lines']} line(s): {summary['imported']} imported ({summary['imported_amount']}), "
+            f"{summary['unmatched']} unmatched, {summary['duplicates']} duplicate(s), {summary['invalid']} invalid."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from invoices.sync import prune_changes
+
+
+class Command(BaseCommand):
+    help = "Delete sync change-log entries older than SYNC_CHANGE_RETENTION_DAYS. Clients with older tokens must resync."
+
+    def handle(self, *args, **options):
+        pruned = prune_changes()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} change(s)."))
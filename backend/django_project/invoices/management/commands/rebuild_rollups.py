@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from invoices.rollups import SOURCES, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily revenue/payment rollups from the invoice and payment tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--metric", choices=sorted(SOURCES), help="Only rebuild one metric.")
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_rollups(options["metric"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} daily rollup row(s)."))
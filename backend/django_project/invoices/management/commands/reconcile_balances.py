@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from invoices.services import find_balance_drift, repair_balance_drift
+
+
+class Command(BaseCommand):
+    help = "Check Invoice.amount_paid against the sum of its payments and optionally repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Rewrite amount_paid and status for drifted invoices.")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--show", type=int, default=20, help="How many drifted invoices to list.")
+
+    def handle(self, *args, **options):
+        drifted = find_balance_drift()
+
+        for invoice in drifted[: options["show"]]:
+            self.stdout.write(
+                f"{invoice.invoice_number}: stored {invoice.amount_paid}, payments sum to {invoice.actual_paid}"
+            )
+
+        if not options["fix"]:
+            count = drifted.count()
+            if count:
+                self.stdout.write(self.style.WARNING(f"{count} invoice(s) drifted. Re-run with --fix to repair."))
+            else:
+                self.stdout.write(self.style.SUCCESS("All invoice balances match their payments."))
+            return
+
+        fixed = repair_balance_drift(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Repaired {fixed} invoice(s)."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from invoices.jobs import run_workers
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (exports, large deletes, status recomputation) until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=2, help="Worker threads in this process.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Running jobs with {options['threads']} thread(s); Ctrl-C to stop.")
+        run_workers(options["threads"], options["poll_interval"], burst=options["burst"])
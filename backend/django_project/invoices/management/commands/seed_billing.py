@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.seeding import seed_billing
+
+
+class Command(BaseCommand):
+    help = "Generate realistic customers, invoices and payments for load and scaling tests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=100)
+        parser.add_argument("--invoices", type=int, default=5000)
+        parser.add_argument("--payments-per-invoice", dest="payments_per_invoice", type=int, default=3,
+                            help="Installments on a fully paid invoice; partly paid ones get fewer.")
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=2000,
+                            help="Rows per bulk insert.")
+        parser.add_argument("--seed", type=int, help="Random seed, for repeatable data.")
+        parser.add_argument("--prefix", default="SEED", help="Invoice number prefix.")
+
+    def handle(self, *args, **options):
+        for name in ("customers", "invoices", "payments_per_invoice"):
+            if options[name] < 0:
+                raise CommandError(f"--{name.replace('_', '-')} can't be negative.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        try:
+            created = seed_billing(
+                options["customers"], options["invoices"], options["payments_per_invoice"],
+                batch_size=options["batch_size"], seed=options["seed"], prefix=options["prefix"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created['customers']} customer(s), {created['invoices']} invoice(s) "
+            f"and {created['payments']} payment(s)."
+        ))
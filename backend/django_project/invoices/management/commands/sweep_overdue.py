@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from invoices.services import sweep_overdue
+
+
+class Command(BaseCommand):
+    help = "Flag invoices that are past due (and clear the flag on ones that no longer are). Run daily."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Sweep as of this date (YYYY-MM-DD) instead of today.")
+
+    def handle(self, *args, **options):
+        today = None
+        if options["date"]:
+            today = parse_date(options["date"])
+            if today is None:
+                raise CommandError("--date must be in YYYY-MM-DD format.")
+
+        flagged, cleared = sweep_overdue(today)
+        self.stdout.write(self.style.SUCCESS(f"Flagged {flagged} overdue invoice(s), cleared {cleared}."))
@@ -0,0 +1,262 @@
+import heapq
+import json
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import ExitStack
+from time import perf_counter
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .authentication import CachedJWTAuthentication
+from .profiling import PROFILE_FORMATS, ProfileSession
+
+logger = logging.getLogger("invoices.metrics")
+
+# Statements kept per request (the slowest ones), and how much of each is logged
+SLOWEST_STATEMENTS = 3
+STATEMENT_LENGTH = 300
+# Query parameters that carry credentials (the dashboard stream's ?token=); masked in the log
+REDACTED_PARAMS = ("token",)
+
+
+class RequestMetrics:
+    """
+    What one request spent: every SQL statement run through the wrapped connections
+    (count, time, the slowest ones, the most repeated one), the view and the
+    rendering of the response.
+    """
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = []  # min-heap of (seconds, sql)
+        self.statements = Counter()
+        self.view_time = None
+        self.render_time = None
+        self._mark = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            self.statements[sql] += 1
+            if len(self.slowest) < SLOWEST_STATEMENTS:
+                heapq.heappush(self.slowest, (elapsed, sql))
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (elapsed, sql))
+
+    def view_started(self):
+        self._mark = perf_counter()
+
+    def view_finished(self):
+        if self._mark is not None:
+            self.view_time = perf_counter() - self._mark
+        self._mark = perf_counter()
+
+    def rendered(self, response):
+        if self._mark is not None:
+            self.render_time = perf_counter() - self._mark
+        return response
+
+    def timings(self):
+        # name -> (milliseconds, description) for the Server-Timing header
+        total = perf_counter() - self.started
+        timings = {"total": (total, None), "db": (self.db_time, f"{self.queries} queries")}
+        if self.view_time is not None:
+            # The view's own Python work (serializing, mostly), without its SQL
+            timings["app"] = (max(self.view_time - self.db_time, 0), "view code outside SQL")
+        if self.render_time is not None:
+            timings["render"] = (self.render_time, None)
+        return {name: (round(seconds * 1000, 1), desc) for name, (seconds, desc) in timings.items()}
+
+    def most_repeated(self):
+        sql, count = self.statements.most_common(1)[0] if self.statements else (None, 0)
+        return (sql, count) if count > 1 else (None, 0)
+
+
+def server_timing(timings):
+    parts = []
+    for name, (ms, desc) in timings.items():
+        parts.append(f'{name};dur={ms}' + (f';desc="{desc}"' if desc else ""))
+    return ", ".join(parts)
+
+
+def logged_path(request):
+    # The full path with credentials in the query string masked
+    if not any(name in request.GET for name in REDACTED_PARAMS):
+        return request.get_full_path()
+    query = request.GET.copy()
+    for name in REDACTED_PARAMS:
+        if name in query:
+            query.setlist(name, ["redacted"])
+    return f"{request.path}?{query.urlencode()}"
+
+
+class RequestMetricsMiddleware:
+    """
+    Opt-in (REQUEST_METRICS_ENABLED) per-request instrumentation: a Server-Timing
+    header with total, SQL, view and render time, and one JSON log line per request
+    on the "invoices.metrics" logger. Requests slower than REQUEST_METRICS_SLOW_MS
+    or running more than REQUEST_METRICS_MAX_QUERIES statements are logged as
+    warnings with their slowest and most repeated statement, which is where an
+    N+1 query shows up.
+
+    Streaming responses (the exports) run their queries while the body is sent,
+    after this middleware is done, so only their setup is counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_METRICS_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, "REQUEST_METRICS_SLOW_MS", None)
+        self.max_queries = getattr(settings, "REQUEST_METRICS_MAX_QUERIES", None)
+
+    def __call__(self, request):
+        metrics = request._metrics = RequestMetrics()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+
+        timings = metrics.timings()
+        response["Server-Timing"] = server_timing(timings)
+        self.log(request, response, metrics, timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics.view_started()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this hook; the callback marks when that's done
+        request._metrics.view_finished()
+        response.add_post_render_callback(request._metrics.rendered)
+        return response
+
+    def log(self, request, response, metrics, timings):
+        flags = []
+        if self.slow_ms is not None and timings["total"][0] > self.slow_ms:
+            flags.append("slow")
+        if self.max_queries is not None and metrics.queries > self.max_queries:
+            flags.append("queries")
+
+        record = {
+            "method": request.method,
+            "path": logged_path(request),
+            "status": response.status_code,
+            "queries": metrics.queries,
+            **{f"{name}_ms": ms for name, (ms, _) in timings.items()},
+        }
+        if flags:
+            record["flags"] = flags
+            record["slowest"] = [
+                {"ms": round(seconds * 1000, 1), "sql": sql[:STATEMENT_LENGTH]}
+                for seconds, sql in sorted(metrics.slowest, reverse=True)
+            ]
+            sql, count = metrics.most_repeated()
+            if sql is not None:
+                record["repeated"] = {"count": count, "sql": sql[:STATEMENT_LENGTH]}
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+
+
+def is_staff(request):
+    # Session users are resolved by AuthenticationMiddleware; API clients send a JWT
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    try:
+        authenticated = CachedJWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+class RequestProfilingMiddleware:
+    """
+    Opt-in (REQUEST_PROFILING_ENABLED) profiling of a single request: a staff user adds
+    ?profile=txt|prof|collapsed or an "X-Profile: <format>" header (formats in
+    invoices.profiling). The profile replaces the response as a download, or is
+    written to REQUEST_PROFILE_DIR when that is set and the normal response is sent
+    with an X-Profile-File header. Requests without the parameter or header pay one
+    dictionary lookup each; non-staff requests are served normally.
+
+    Under ASGI, async views share the event loop with other requests, so their
+    profile can include other requests' coroutines. Event streams and other async
+    streaming responses are sent unprofiled.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directory = getattr(settings, "REQUEST_PROFILE_DIR", None)
+
+    def __call__(self, request):
+        output_format = request.GET.get("profile") or request.headers.get("X-Profile")
+        if output_format is None or output_format not in PROFILE_FORMATS or not is_staff(request):
+            return self.get_response(request)
+
+        session = request._profile_session = ProfileSession(output_format)
+        with session:
+            response = self.get_response(request)
+            # The dashboard's event stream never ends, and an async stream can't be read here
+            endless = response.streaming and (
+                response.is_async or response.get("Content-Type", "").startswith("text/event-stream")
+            )
+            if response.streaming and not endless:
+                # Exports do their work while streaming; run that inside the profile too
+                body = b"".join(response.streaming_content)
+                response.streaming_content = [body]
+
+        if endless:
+            return response
+
+        content, content_type, extension = session.result()
+        name = "{}-{}-{}.{}".format(
+            timezone.now().strftime("%Y%m%d-%H%M%S"),
+            request.method.lower(),
+            re.sub(r"[^a-z0-9]+", "-", request.path.lower()).strip("-"),
+            extension,
+        )
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, name), "wb") as output:
+                output.write(content)
+            response["X-Profile-File"] = name
+            return response
+
+        download = HttpResponse(content, content_type=content_type)
+        download["Content-Disposition"] = f'attachment; filename="{name}"'
+        download["X-Profiled-Status"] = response.status_code
+        return download
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Async views run on an event loop thread the profiler in __call__ doesn't see:
+        # run them here, with that thread profiled as part of the request
+        session = getattr(request, "_profile_session", None)
+        if session is None or not iscoroutinefunction(view_func):
+            return None
+
+        async def profiled():
+            with session.section():
+                return await view_func(request, *view_args, **view_kwargs)
+
+        return async_to_sync(profiled)()
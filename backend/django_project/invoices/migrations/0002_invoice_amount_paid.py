@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:13
+
+import django.db.models.expressions
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+
+
+def backfill_amount_paid(apps, schema_editor):
+    Invoice = apps.get_model("invoices", "Invoice")
+    Payment = apps.get_model("invoices", "Payment")
+
+    paid = (
+        Payment.objects.filter(invoice=OuterRef("pk"))
+        .values("invoice")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    # One set-based UPDATE; invoices without payments keep the default of 0
+    Invoice.objects.filter(pk__in=Payment.objects.values("invoice")).update(amount_paid=Subquery(paid))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_amount_paid, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='invoice',
+            name='balance_due',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('total_amount'), '-', models.F('amount_paid')), output_field=models.DecimalField(decimal_places=2, max_digits=12)),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:17
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    DailyRollup = apps.get_model("invoices", "DailyRollup")
+    sources = [
+        ("revenue", apps.get_model("invoices", "Invoice"), "total_amount"),
+        ("payments", apps.get_model("invoices", "Payment"), "amount"),
+    ]
+    for metric, model, amount_field in sources:
+        days = (
+            model.objects.annotate(day=TruncDate("created_at"))
+            .values("day")
+            .annotate(total=Sum(amount_field), count=Count("id"))
+            .order_by("day")
+        )
+        DailyRollup.objects.bulk_create(
+            (DailyRollup(metric=metric, day=row["day"], total=row["total"], count=row["count"]) for row in days),
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('revenue', 'Invoiced revenue'), ('payments', 'Payments collected')], max_length=20)),
+                ('day', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('metric', 'day'), name='unique_rollup_metric_day')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:18
+
+from datetime import date
+
+from django.db import migrations, models
+
+
+def backfill_overdue(apps, schema_editor):
+    # The same set-based UPDATEs as services.sweep_overdue: reads now filter on the
+    # stored flag, which nothing kept current before
+    Invoice = apps.get_model("invoices", "Invoice")
+    today = date.today()
+    Invoice.objects.filter(
+        status__in=["unpaid", "partially_paid"], due_date__lt=today, is_overdue=False
+    ).update(is_overdue=True)
+    Invoice.objects.filter(is_overdue=True).filter(
+        models.Q(status="paid") | models.Q(due_date__gte=today)
+    ).update(is_overdue=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0004_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['status', 'due_date'], name='invoice_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('is_overdue', True)), fields=['due_date'], name='invoice_overdue_idx'),
+        ),
+        migrations.RunPython(backfill_overdue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:40
+
+from django.db import migrations, models
+
+# Full-text search tables (see invoices.filters). Plain FTS5 tables keyed by rowid = object id,
+# filled and kept current by triggers so every write path, bulk or not, is indexed.
+SEARCH_SQL = [
+    """
+    CREATE VIRTUAL TABLE invoices_invoice_search USING fts5(
+        invoice_number, customer_name, customer_email,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE invoices_customer_search USING fts5(
+        name, email,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    INSERT INTO invoices_invoice_search (rowid, invoice_number, customer_name, customer_email)
+    SELECT i.id, i.invoice_number, c.name, c.email
+    FROM invoices_invoice i JOIN invoices_customer c ON c.id = i.customer_id
+    """,
+    """
+    INSERT INTO invoices_customer_search (rowid, name, email)
+    SELECT id, name, email FROM invoices_customer
+    """,
+    """
+    CREATE TRIGGER invoices_invoice_search_insert AFTER INSERT ON invoices_invoice BEGIN
+        INSERT INTO invoices_invoice_search (rowid, invoice_number, customer_name, customer_email)
+        SELECT NEW.id, NEW.invoice_number, c.name, c.email FROM invoices_customer c WHERE c.id = NEW.customer_id;
+    END
+    """,
+    """
+    CREATE TRIGGER invoices_invoice_search_update AFTER UPDATE OF invoice_number, customer_id ON invoices_invoice
+    WHEN OLD.invoice_number IS NOT NEW.invoice_number OR OLD.customer_id IS NOT NEW.customer_id BEGIN
+        DELETE FROM invoices_invoice_search WHERE rowid = OLD.id;
+        INSERT INTO invoices_invoice_search (rowid, invoice_number, customer_name, customer_email)
+        SELECT NEW.id, NEW.invoice_number, c.name, c.email FROM invoices_customer c WHERE c.id = NEW.customer_id;
+    END
+    """,
+    """
+    CREATE TRIGGER invoices_invoice_search_delete AFTER DELETE ON invoices_invoice BEGIN
+        DELETE FROM invoices_invoice_search WHERE rowid = OLD.id;
+    END
+    """,
+    """
+    CREATE TRIGGER invoices_customer_search_insert AFTER INSERT ON invoices_customer BEGIN
+        INSERT INTO invoices_customer_search (rowid, name, email) VALUES (NEW.id, NEW.name, NEW.email);
+    END
+    """,
+    """
+    CREATE TRIGGER invoices_customer_search_update AFTER UPDATE OF name, email ON invoices_customer
+    WHEN OLD.name IS NOT NEW.name OR OLD.email IS NOT NEW.email BEGIN
+        DELETE FROM invoices_customer_search WHERE rowid = OLD.id;
+        INSERT INTO invoices_customer_search (rowid, name, email) VALUES (NEW.id, NEW.name, NEW.email);
+        UPDATE invoices_invoice_search SET customer_name = NEW.name, customer_email = NEW.email
+        WHERE rowid IN (SELECT id FROM invoices_invoice WHERE customer_id = NEW.id);
+    END
+    """,
+    """
+    CREATE TRIGGER invoices_customer_search_delete AFTER DELETE ON invoices_customer BEGIN
+        DELETE FROM invoices_customer_search WHERE rowid = OLD.id;
+    END
+    """,
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER invoices_customer_search_delete",
+    "DROP TRIGGER invoices_customer_search_update",
+    "DROP TRIGGER invoices_customer_search_insert",
+    "DROP TRIGGER invoices_invoice_search_delete",
+    "DROP TRIGGER invoices_invoice_search_update",
+    "DROP TRIGGER invoices_invoice_search_insert",
+    "DROP TABLE invoices_customer_search",
+    "DROP TABLE invoices_invoice_search",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0009_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['issue_date', 'id'], name='invoice_issue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['total_amount'], name='invoice_amount_idx'),
+        ),
+        migrations.RunSQL(SEARCH_SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:10
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+# The sync change log (see invoices.sync), written by triggers so every write path is
+# logged: bulk_create, bulk_update, QuerySet.update() and cascaded deletes included.
+TABLES = [("customer", "invoices_customer"), ("invoice", "invoices_invoice"), ("payment", "invoices_payment")]
+
+CHANGE_LOG_SQL = []
+REVERSE_SQL = []
+for model, table in TABLES:
+    for event, row, deleted in (("insert", "NEW", 0), ("update", "NEW", 0), ("delete", "OLD", 1)):
+        CHANGE_LOG_SQL.append(f"""
+            CREATE TRIGGER {table}_change_{event} AFTER {event.upper()} ON {table} BEGIN
+                INSERT INTO invoices_change (model, object_id, deleted) VALUES ('{model}', {row}.id, {deleted});
+            END
+        """)
+        REVERSE_SQL.append(f"DROP TRIGGER {table}_change_{event}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0012_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('customer', 'Customer'), ('invoice', 'Invoice'), ('payment', 'Payment')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), db_index=True)),
+            ],
+        ),
+        migrations.RunSQL(CHANGE_LOG_SQL, REVERSE_SQL),
+        migrations.DeleteModel(
+            name='Tombstone',
+        ),
+    ]
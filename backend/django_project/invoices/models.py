@@ -6,9 +6,9 @@
 #```python
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 from django.utils import timezone
+from django.db.models import F
+from django.db.models.functions import Now
 
 # invoices/models.py
 
@@ -20,6 +20,7 @@ class Customer(models.Model):
     phone = models.CharField(max_length=50, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -46,12 +47,42 @@ class Invoice(models.Model):
     # Total amount of the invoice
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
 
+    # Running sum of payments, kept up to date by invoices.services on every payment change
+    amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+
+    # Derived by the database from the two columns above
+    balance_due = models.GeneratedField(
+        expression=F("total_amount") - F("amount_paid"),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+    )
+
     # Status of the invoice: paid, unpaid, or overdue
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="unpaid")
 
     # Date the invoice was created (automatically set)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Bumped on every change, including payment changes (see invoices.services); drives ETags
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of a customer's invoices (-issue_date, -id)
+            models.Index(fields=["customer", "issue_date", "id"], name="invoice_customer_issue_idx"),
+            # Overdue sweep: open invoices past their due date
+            models.Index(fields=["status", "due_date"], name="invoice_status_due_idx"),
+            # Overdue list/dashboard read the flag; only the (few) flagged rows are indexed
+            models.Index(fields=["due_date"], condition=models.Q(is_overdue=True), name="invoice_overdue_idx"),
+            # Rollup rebuilds and exports by creation time
+            models.Index(fields=["created_at"], name="invoice_created_idx"),
+            # Covering index for the dashboard's conditional aggregate (no table rows read)
+            models.Index(fields=["status", "is_overdue", "total_amount"], name="invoice_summary_cover_idx"),
+            # List filters on issue date / amount range (see invoices.filters)
+            models.Index(fields=["issue_date", "id"], name="invoice_issue_idx"),
+            models.Index(fields=["total_amount"], name="invoice_amount_idx"),
+        ]
+
     def __str__(self):
         # Makes the invoice readable in Django admin and logs
         return f"Invoice #{self.id} - {self.customer_name}"
@@ -71,29 +102,125 @@ class Payment(models.Model):
     # Optional note (e.g., "Paid via credit card", "Insurance payment")
     note = models.CharField(max_length=255, blank=True, null=True)
 
+    # Bank / processor transaction id; lets settlement-file imports skip lines already posted
+    reference = models.CharField(max_length=100, unique=True, blank=True, null=True)
+
     # Timestamp of the payment
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of payments (-created_at, -id)
+            models.Index(fields=["created_at", "id"], name="payment_created_idx"),
+            # Covering index for SUM(amount) per invoice (balance repair, imports, totals)
+            models.Index(fields=["invoice", "amount"], name="payment_invoice_amount_idx"),
+        ]
 
     def __str__(self):
         return f"Payment of ${self.amount} for Invoice #{self.invoice.id}"
 
 
+class Change(models.Model):
+    # The sync change log: one row per insert, update or delete of a customer, invoice or
+    # payment, written by SQLite triggers (migration 0013) so every write path is logged,
+    # bulk or not. SQLite has one writer at a time and rolls the sequence back with the
+    # transaction, so ids are handed out in commit order; /api/sync/ uses them as tokens.
+    # Delete rows are the tombstones.
 
+    MODEL_CHOICES = [
+        ("customer", "Customer"),
+        ("invoice", "Invoice"),
+        ("payment", "Payment"),
+    ]
 
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(db_default=Now(), db_index=True)
+
+    def __str__(self):
+        action = "deleted" if self.deleted else "changed"
+        return f"{self.model} #{self.object_id} {action} at {self.changed_at}"
+
+
+class DailyRollup(models.Model):
+    # Pre-aggregated totals per day, maintained by invoices.rollups on every
+    # invoice/payment write so the dashboard charts never scan the big tables.
+
+    METRIC_CHOICES = [
+        ("revenue", "Invoiced revenue"),
+        ("payments", "Payments collected"),
+    ]
+
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    day = models.DateField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["metric", "day"], name="unique_rollup_metric_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.metric} on {self.day}: {self.total} ({self.count})"
+
+
+
+
+
+
+class Job(models.Model):
+    # Background work queued by the API and run by `manage.py run_workers` (see invoices.jobs)
+
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("succeeded", "Succeeded"),
+        ("failed", "Failed"),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # Not picked up before this time; pushed back after a failed attempt
+    run_after = models.DateTimeField(default=timezone.now)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="jobs")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest due job: WHERE status = 'queued' AND run_after <= now
+            models.Index(fields=["status", "run_after"], name="job_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job #{self.pk} ({self.status})"
 
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     avatar = models.ImageField(upload_to="avatars/", null=True, blank=True)
+    # Resized copies of the avatar, {size: storage name}, filled in by invoices.avatars
+    avatar_variants = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return self.user.username
-    
-
 
-@receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
-    if created:
-        Profile.objects.create(user=instance)
-    instance.profile.save()
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the stored avatar so has_changes() needs no query
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_avatar = instance.avatar.name if "avatar" in field_names else None
+        return instance
 
+    def has_changes(self):
+        return self._state.adding or self.avatar.name != getattr(self, "_loaded_avatar", None)
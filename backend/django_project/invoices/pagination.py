@@ -0,0 +1,177 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on the ordering columns instead of using OFFSET,
+    so every page costs the same no matter how deep it is, and rows inserted
+    while a client is paging never shift the following pages.
+
+    Pagination is opt-in: without ?cursor= or ?page_size= the view returns the
+    full list exactly as before.
+    """
+
+    # Must end with a unique column (normally the primary key) so the order is total
+    ordering = ("-id",)
+    page_size = 50
+    max_page_size = 1000
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate(queryset, request, lambda page, limit: list(page[:limit]))
+
+    def paginate_values(self, queryset, request, serializer, *extra):
+        """
+        paginate_queryset for lists rendered by a ValuesSerializer: takes the filtered
+        model queryset and returns the page as serializer.values() rows (plus `extra` columns).
+
+        The page is read in two steps: the keys of the filtered, ordered list first, which
+        SQLite can answer from an index while sorting only the keys, then just those rows by
+        primary key. Selecting full rows in one go reads every match before the sort, which
+        is what filtered lists over a large table used to pay. The second query starts from
+        a fresh queryset so the list's filters can't steer it onto a worse index.
+        """
+        return self.paginate(queryset, request, lambda page, limit: list(self.values_page(page, limit, serializer, extra)))
+
+    async def apaginate_values(self, queryset, request, serializer, *extra):
+        # paginate_values for async views; the page is the same single query, iterated asynchronously
+        page = self.page_queryset(queryset, request)
+        if page is None:
+            return None
+        return self.take([row async for row in self.values_page(page, self.page_size + 1, serializer, extra)])
+
+    def values_page(self, page, limit, serializer, extra):
+        columns = [field.lstrip("-") for field in self.ordering]
+        keys = page.values("pk")[:limit]
+        rows = page.model._default_manager.filter(pk__in=keys).order_by(*self.ordering)
+        return serializer.values(rows, *columns, *extra)
+
+    def paginate(self, queryset, request, fetch):
+        page = self.page_queryset(queryset, request)
+        if page is None:
+            return None
+        # Fetch one extra row to know whether there is a next page
+        return self.take(fetch(page, self.page_size + 1))
+
+    def page_queryset(self, queryset, request):
+        # The queryset ordered and seeked past the cursor, or None when the request isn't paginated
+        self.request = request
+        if self.cursor_query_param not in request.query_params and self.page_size_query_param not in request.query_params:
+            return None
+
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = self.decode_cursor(request, queryset.model)
+        if cursor is not None:
+            queryset = queryset.filter(self.seek_filter(cursor))
+        return queryset
+
+    def take(self, rows):
+        # Trims the extra row fetched past the page and remembers where the page ended
+        self.has_next = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        self.last_position = self.get_position(rows[-1]) if rows else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_position(self, row):
+        # Rows are model instances, or dicts when the view paginates a .values() queryset
+        if isinstance(row, dict):
+            return [str(row[field.lstrip("-")]) for field in self.ordering]
+        return [str(getattr(row, field.lstrip("-"))) for field in self.ordering]
+
+    def seek_filter(self, position):
+        # Rows strictly after `position` in the ordering, written as
+        #   a <= x AND (a < x OR (b <= y AND (b < y OR ...)))
+        # so the leading column is a plain range the index can seek on.
+        condition = None
+        for field, value in reversed(list(zip(self.ordering, position))):
+            name = field.lstrip("-")
+            op = "lt" if field.startswith("-") else "gt"
+            strict = Q(**{f"{name}__{op}": value})
+            if condition is None:
+                condition = strict
+            else:
+                condition = Q(**{f"{name}__{op}e": value}) & (strict | condition)
+        return condition
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # Each value as its column's type, so a tampered cursor is rejected here rather than by the query
+        try:
+            position = [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class InvoicePagination(KeysetPagination):
+    ordering = ("-id",)
+
+
+class CustomerPagination(KeysetPagination):
+    ordering = ("-id",)
+
+
+class PaymentPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+
+
+class CustomerInvoicePagination(KeysetPagination):
+    ordering = ("-issue_date", "-id")
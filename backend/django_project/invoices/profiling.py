@@ -0,0 +1,127 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+
+# ?profile=<format> / X-Profile: <format>
+#   txt        pstats report, sorted by cumulative time
+#   prof       binary pstats dump (snakeviz, `python -m pstats`, ...)
+#   collapsed  sampled stacks, one "frame;frame;frame count" line each (flamegraph.pl, speedscope)
+PROFILE_FORMATS = {
+    "txt": ("text/plain; charset=utf-8", "txt"),
+    "prof": ("application/octet-stream", "prof"),
+    "collapsed": ("text/plain; charset=utf-8", "collapsed.txt"),
+}
+
+# Seconds between stack samples; effectively bounded by the interpreter's switch interval
+SAMPLE_INTERVAL = 0.001
+REPORT_LINES = 80
+
+
+class StackSampler:
+    """
+    Samples the stacks of the registered threads from a background thread and counts
+    identical stacks. Unlike cProfile it can follow a request across threads (an async
+    view's event loop and the thread its ORM calls run on).
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.thread_ids = set()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def add_thread(self, ident=None):
+        self.thread_ids.add(threading.get_ident() if ident is None else ident)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in self.thread_ids:
+                frame = frames.get(ident)
+                if frame is None or ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileSession:
+    """
+    One profiled request. cProfile only sees the thread it's enabled on, so every
+    thread the request runs code on gets its own profiler (see `section`) and the
+    results are merged; the sampler follows all of them at once.
+    """
+
+    def __init__(self, output_format):
+        self.format = output_format
+        self.profiles = []
+        self.sampler = StackSampler() if output_format == "collapsed" else None
+
+    def __enter__(self):
+        if self.sampler is not None:
+            self.sampler.start()
+        self._main = self.section()
+        self._main.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._main.__exit__(*exc_info)
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def section(self):
+        # Context manager profiling the current thread as part of this request
+        return _Section(self)
+
+    def result(self):
+        # (bytes, content type, file extension)
+        content_type, extension = PROFILE_FORMATS[self.format]
+        if self.sampler is not None:
+            return self.sampler.collapsed().encode(), content_type, extension
+
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiles[0], stream=stream)
+        for profile in self.profiles[1:]:
+            stats.add(profile)
+        if self.format == "prof":
+            return marshal.dumps(stats.stats), content_type, extension
+        stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+        return stream.getvalue().encode(), content_type, extension
+
+
+class _Section:
+    def __init__(self, session):
+        self.session = session
+        self.profile = None
+
+    def __enter__(self):
+        if self.session.sampler is not None:
+            self.session.sampler.add_thread()
+        else:
+            self.profile = cProfile.Profile()
+            self.session.profiles.append(self.profile)
+            self.profile.enable()
+
+    def __exit__(self, *exc_info):
+        if self.profile is not None:
+            self.profile.disable()
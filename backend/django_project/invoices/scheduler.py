@@ -0,0 +1,48 @@
+import logging
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_sweeper = None
+
+
+def _run_sweeper(interval, stop_event):
+    from .services import sweep_overdue
+
+    while not stop_event.is_set():
+        try:
+            flagged, cleared = sweep_overdue()
+            if flagged or cleared:
+                logger.info("Overdue sweep flagged %s and cleared %s invoice(s)", flagged, cleared)
+        except Exception:
+            logger.exception("Overdue sweep failed")
+        finally:
+            close_old_connections()
+        stop_event.wait(interval)
+
+
+def start_overdue_sweeper(interval):
+    # Run sweep_overdue every `interval` seconds in a daemon thread (once per process)
+    global _sweeper
+    if _sweeper is not None:
+        return _sweeper
+
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=_run_sweeper, args=(interval, stop_event), name="overdue-sweeper", daemon=True
+    )
+    thread.start()
+    _sweeper = (thread, stop_event)
+    return _sweeper
+
+
+def stop_overdue_sweeper():
+    global _sweeper
+    if _sweeper is None:
+        return
+    thread, stop_event = _sweeper
+    stop_event.set()
+    thread.join()
+    _sweeper = None
@@ -0,0 +1,174 @@
+import math
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.db import transaction
+from django.utils import timezone
+
+from .dashboard import invalidate_summary
+from .models import Customer, Invoice, Payment
+from .rollups import rebuild_rollups
+from .services import set_invoice_status
+
+# Invoices are spread over this many days before today
+HISTORY_DAYS = 730
+PAYMENT_TERMS = [15, 30, 30, 30, 45, 60]
+PAYMENT_NOTES = ["Paid via card", "Bank transfer", "ACH", "Check", "Insurance payment", None]
+
+# (paid, partially paid) share of invoices; the rest stay unpaid
+SETTLED_PAST_DUE = (0.75, 0.15)
+SETTLED_NOT_DUE = (0.35, 0.25)
+
+COMPANY_WORDS = [
+    "Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Hooli", "Vandelay", "Soylent", "Cyberdyne",
+    "Northwind", "Contoso", "Fabrikam", "Tyrell", "Wonka", "Gringotts", "Oscorp", "Aperture", "Monarch", "Blue Sun",
+]
+COMPANY_KINDS = ["Logistics", "Dental", "Clinic", "Consulting", "Supplies", "Foods", "Labs", "Media", "Health", "Motors"]
+COMPANY_SUFFIXES = ["LLC", "Inc.", "Ltd", "Group", "& Co."]
+STREETS = ["Main St", "Oak Ave", "Market St", "2nd St", "Elm St", "Park Rd", "Lake Dr", "Hill St"]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    # bulk_create would overwrite created_at/updated_at with now(); let the generated values through
+    fields = [field for model in models for field in model._meta.fields if getattr(field, "auto_now_add", False)
+              or getattr(field, "auto_now", False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def invoice_amount(rng):
+    # Log-normal around ~$400: many small invoices, a long tail of large ones
+    amount = min(max(rng.lognormvariate(math.log(400), 0.9), 25), 50000)
+    return Decimal(f"{amount:.2f}")
+
+
+def split_amount(total, parts, rng):
+    # `parts` installments summing exactly to `total`
+    if parts == 1:
+        return [total]
+    weights = [rng.uniform(0.5, 1.5) for _ in range(parts)]
+    scale = total / Decimal(str(sum(weights)))
+    amounts = [(Decimal(str(weight)) * scale).quantize(Decimal("0.01")) for weight in weights[:-1]]
+    return amounts + [total - sum(amounts)]
+
+
+def moment(day, rng):
+    # An aware datetime during business hours on `day`
+    return timezone.make_aware(datetime.combine(day, time(rng.randint(8, 18), rng.randint(0, 59))))
+
+
+def make_customers(count, rng, offset):
+    for i in range(offset, offset + count):
+        name = f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_KINDS)} {rng.choice(COMPANY_SUFFIXES)}"
+        slug = "".join(ch for ch in name.lower() if ch.isalnum())[:20]
+        created = moment(timezone.localdate() - timedelta(days=rng.randint(HISTORY_DAYS, HISTORY_DAYS + 365)), rng)
+        yield Customer(
+            name=name,
+            email=f"billing{i}@{slug}.example",
+            phone=f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+            address=f"{rng.randint(1, 9999)} {rng.choice(STREETS)}",
+            created_at=created,
+            updated_at=created,
+        )
+
+
+def make_invoice(customer_id, number, payments_per_invoice, today, rng):
+    # An invoice plus the payments that settle (part of) it, with status and balances consistent
+    issue_date = today - timedelta(days=int(rng.triangular(0, HISTORY_DAYS, 0)))  # more recent invoices
+    due_date = issue_date + timedelta(days=rng.choice(PAYMENT_TERMS))
+    total = invoice_amount(rng)
+
+    paid_share, partial_share = SETTLED_PAST_DUE if due_date < today else SETTLED_NOT_DUE
+    roll = rng.random()
+    if payments_per_invoice and roll < paid_share:
+        amounts = split_amount(total, payments_per_invoice, rng)
+    elif payments_per_invoice and roll < paid_share + partial_share:
+        share = Decimal(str(round(rng.uniform(0.2, 0.8), 2)))
+        parts = rng.randint(1, max(1, payments_per_invoice - 1))
+        amounts = split_amount((total * share).quantize(Decimal("0.01")), parts, rng)
+    else:
+        amounts = []
+
+    created = moment(issue_date, rng)
+    invoice = Invoice(
+        customer_id=customer_id,
+        invoice_number=number,
+        issue_date=issue_date,
+        due_date=due_date,
+        total_amount=total,
+        amount_paid=sum(amounts, Decimal("0")),
+        created_at=created,
+    )
+    set_invoice_status(invoice)
+
+    # Payments arrive between the issue date and a little after the due date (never in the future)
+    last_day = min(due_date + timedelta(days=30), today)
+    payments = []
+    for amount in amounts:
+        paid_at = moment(issue_date + timedelta(days=rng.randint(0, max(0, (last_day - issue_date).days))), rng)
+        payments.append(Payment(amount=amount, note=rng.choice(PAYMENT_NOTES), created_at=paid_at, updated_at=paid_at))
+    invoice.updated_at = max([created] + [payment.created_at for payment in payments])
+    return invoice, payments
+
+
+def seed_billing(customers, invoices, payments_per_invoice, batch_size=2000, seed=None, prefix="SEED"):
+    """
+    Insert `customers` customers and `invoices` invoices with up to `payments_per_invoice`
+    payments each, in chunks of `batch_size` rows. Invoices are spread over two years
+    (more of them recent) and over customers with a long tail (a few customers get most
+    invoices); amounts are log-normal and older invoices are more likely paid. Balances,
+    status, the overdue flag, the search index and the daily rollups all come out as if
+    the rows had been created through the API. Returns the number of rows per model.
+    """
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    customer_offset = Customer.objects.count()
+    number_offset = Invoice.objects.filter(invoice_number__startswith=f"{prefix}-").count()
+    created = {"customers": 0, "invoices": 0, "payments": 0}
+
+    with explicit_timestamps(Customer, Invoice, Payment):
+        customer_ids = []
+        for start in range(0, customers, batch_size):
+            chunk = list(make_customers(min(batch_size, customers - start), rng, customer_offset + start))
+            customer_ids += [customer.pk for customer in Customer.objects.bulk_create(chunk)]
+        created["customers"] = len(customer_ids)
+        if not customer_ids:
+            customer_ids = list(Customer.objects.values_list("id", flat=True))
+        if not customer_ids and invoices:
+            raise ValueError("Invoices need at least one customer.")
+
+        # Pareto weights: invoice volume per customer is heavily skewed
+        weights = list(accumulate(rng.paretovariate(1.2) for _ in customer_ids))
+
+        for start in range(0, invoices, batch_size):
+            size = min(batch_size, invoices - start)
+            owners = rng.choices(customer_ids, cum_weights=weights, k=size)
+            generated = [
+                make_invoice(owner, f"{prefix}-{number_offset + start + i:07d}", payments_per_invoice, today, rng)
+                for i, owner in enumerate(owners)
+            ]
+            with transaction.atomic():
+                Invoice.objects.bulk_create([invoice for invoice, _ in generated])
+                payments = []
+                for invoice, invoice_payments in generated:
+                    for payment in invoice_payments:
+                        payment.invoice_id = invoice.pk
+                        payments.append(payment)
+                Payment.objects.bulk_create(payments)
+            created["invoices"] += size
+            created["payments"] += len(payments)
+
+    # bulk_create sends no signals: rebuild what the receivers would have kept current
+    rebuild_rollups()
+    invalidate_summary()
+    return created
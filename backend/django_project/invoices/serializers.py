@@ -1,7 +1,31 @@
 from rest_framework import serializers
-from django.db.models import Sum
 from django.contrib.auth.models import User
-from .models import Invoice,Payment,Profile,Customer
+from django.urls import reverse
+from .avatars import variant_urls
+from .models import Invoice,Payment,Profile,Customer,Job
+
+
+def parse_fieldset(params, serializer_class, expandable=()):
+    """
+    Read ?fields=a,b,c and ?expand=x from the query string.
+    Returns (fields, expand): fields is None when every field was asked for,
+    otherwise the requested names plus whatever was expanded.
+    """
+    known = set(serializer_class().fields)
+    expand = {name for name in params.get("expand", "").split(",") if name}
+    unknown = expand - set(expandable)
+    if unknown:
+        raise serializers.ValidationError({"expand": [f"Can't expand: {', '.join(sorted(unknown))}."]})
+
+    raw = params.get("fields")
+    if not raw:
+        return None, expand
+
+    fields = {name for name in raw.split(",") if name}
+    unknown = fields - known
+    if unknown:
+        raise serializers.ValidationError({"fields": [f"Unknown fields: {', '.join(sorted(unknown))}."]})
+    return fields | expand, expand
 
 
 class CustomerSerializer(serializers.ModelSerializer):
@@ -28,8 +52,17 @@ class InvoiceSerializer(serializers.ModelSerializer):
 
 
     def get_balance_due(self, obj):
-        total_paid = obj.payments.aggregate(total=Sum("amount"))["total"] or 0
-        return obj.total_amount - total_paid
+        # Stored column (total_amount - amount_paid), no per-row aggregate
+        return obj.balance_due
+
+    def update(self, instance, validated_data):
+        # Only write the submitted columns so a concurrent payment's amount_paid isn't overwritten
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, "updated_at"])
+        # balance_due is computed by the database, and amount_paid may have moved since the read
+        instance.refresh_from_db(fields=["amount_paid", "balance_due"])
+        return instance
 
 
 
@@ -44,21 +77,83 @@ class PaymentSerializer(serializers.ModelSerializer):
 
 
 
+class BatchListSerializer(serializers.ListSerializer):
+    # Validates every item and keeps the valid ones instead of failing the whole batch.
+    # validated_data holds None for invalid items; item_errors holds None for valid ones.
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({"non_field_errors": ["Expected a list of items."]})
+        if self.max_length is not None and len(data) > self.max_length:
+            raise serializers.ValidationError(
+                {"non_field_errors": [f"Ensure this batch has no more than {self.max_length} items."]}
+            )
+
+        self.item_errors = []
+        rows = []
+        for item in data:
+            try:
+                rows.append(self.child.run_validation(item))
+                self.item_errors.append(None)
+            except serializers.ValidationError as exc:
+                rows.append(None)
+                self.item_errors.append(exc.detail)
+        return rows
+
+
+class InvoiceBatchItemSerializer(serializers.Serializer):
+    # Plain fields on purpose: customers and invoice numbers are checked for the
+    # whole batch in one query each (services.create_invoice_batch), not per item.
+    customer = serializers.IntegerField(min_value=1)
+    invoice_number = serializers.CharField(max_length=50)
+    issue_date = serializers.DateField(required=False)
+    due_date = serializers.DateField()
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+
+    class Meta:
+        list_serializer_class = BatchListSerializer
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     avatar_url = serializers.SerializerMethodField()
+    avatar_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ["first_name", "last_name", "email", "avatar_url"]
+        fields = ["first_name", "last_name", "email", "avatar_url", "avatar_variants"]
 
     def get_avatar_url(self, obj):
         if hasattr(obj, "profile") and obj.profile.avatar:
             return obj.profile.avatar.url
         return None
 
+    def get_avatar_variants(self, obj):
+        # {"32": url, "64": url, "256": url}; empty until the variants have been generated
+        if hasattr(obj, "profile") and obj.profile.avatar:
+            return variant_urls(obj.profile)
+        return {}
+
 
 
 class AvatarUploadSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ["avatar"]
+
+
+class JobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            "id", "kind", "status", "attempts", "max_attempts", "run_after",
+            "result", "error", "created_at", "started_at", "finished_at", "download_url",
+        ]
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        # Jobs that wrote a file (exports)
+        if obj.status == "succeeded" and isinstance(obj.result, dict) and obj.result.get("file"):
+            return reverse("job-download", args=[obj.pk])
+        return None
@@ -0,0 +1,210 @@
+from datetime import date
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.db.models import F, OuterRef, Q, Subquery, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce, Round
+
+from .dashboard import invalidate_summary
+from .models import Customer, Invoice, Payment
+from .rollups import bump
+
+
+OPEN_STATUSES = ["unpaid", "partially_paid"]
+# The message Invoice's unique invoice_number gives in the single-create serializer
+NUMBER_TAKEN = "invoice with this invoice number already exists."
+
+
+def derive_status(amount_paid, total_amount):
+    # Paid status from the running total of payments
+    if amount_paid <= 0:
+        return "unpaid"
+    if amount_paid < total_amount:
+        return "partially_paid"
+    return "paid"
+
+
+def set_invoice_status(invoice):
+    # Recompute status/is_overdue in memory from the stored amount_paid
+    invoice.status = derive_status(invoice.amount_paid, invoice.total_amount)
+
+    # Overdue logic
+    invoice.is_overdue = bool(
+        invoice.due_date and invoice.due_date < date.today() and invoice.status != "paid"
+    )
+
+
+def update_invoice_status(invoice):
+    set_invoice_status(invoice)
+    invoice.save(update_fields=["status", "is_overdue", "updated_at"])
+
+
+def apply_payment_delta(invoice_id, delta):
+    # Add (or subtract) a payment amount to the invoice's running total.
+    # The increment happens in SQL so concurrent payments never overwrite each other.
+    with transaction.atomic():
+        Invoice.objects.filter(pk=invoice_id).update(
+            amount_paid=F("amount_paid") + delta, updated_at=timezone.now()
+        )
+        invoice = Invoice.objects.only(
+            "id", "amount_paid", "total_amount", "due_date", "status", "is_overdue"
+        ).get(pk=invoice_id)
+        update_invoice_status(invoice)
+    return invoice
+
+
+def record_payment_created(payment):
+    return apply_payment_delta(payment.invoice_id, payment.amount)
+
+
+def record_payment_changed(payment, old_invoice_id, old_amount):
+    # A patch can change the amount, the invoice, or both
+    with transaction.atomic():
+        if payment.invoice_id == old_invoice_id:
+            return apply_payment_delta(payment.invoice_id, payment.amount - old_amount)
+
+        apply_payment_delta(old_invoice_id, -old_amount)
+        return apply_payment_delta(payment.invoice_id, payment.amount)
+
+
+def record_payment_deleted(invoice_id, amount):
+    return apply_payment_delta(invoice_id, -amount)
+
+
+def payments_total_subquery():
+    # Sum of payments per invoice, for use in Invoice querysets
+    money = DecimalField(max_digits=12, decimal_places=2)
+    paid = (
+        Payment.objects.filter(invoice=OuterRef("pk"))
+        .values("invoice")
+        # SQLite sums decimals as floats; round so exact cents compare equal to amount_paid
+        .annotate(total=Round(Sum("amount"), 2))
+        .values("total")
+    )
+    return Coalesce(Subquery(paid, output_field=money), Value(0), output_field=money)
+
+
+def find_balance_drift(queryset=None):
+    # Invoices whose stored amount_paid no longer matches their payments
+    queryset = Invoice.objects.all() if queryset is None else queryset
+    return (
+        queryset.annotate(actual_paid=payments_total_subquery())
+        .exclude(amount_paid=F("actual_paid"))
+        .order_by("id")
+    )
+
+
+def repair_balance_drift(queryset=None, batch_size=500):
+    # Rewrite amount_paid (and status) for every drifted invoice; returns how many were fixed
+    fixed = 0
+    last_id = 0
+
+    while True:
+        batch = list(find_balance_drift(queryset).filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return fixed
+
+        now = timezone.now()
+        for invoice in batch:
+            invoice.amount_paid = invoice.actual_paid
+            invoice.updated_at = now
+            set_invoice_status(invoice)
+
+        with transaction.atomic():
+            Invoice.objects.bulk_update(batch, ["amount_paid", "status", "is_overdue", "updated_at"])
+
+        # bulk_update doesn't send post_save, so drop the cached dashboard ourselves
+        invalidate_summary()
+
+        fixed += len(batch)
+        last_id = batch[-1].id
+
+
+def sweep_overdue(today=None):
+    # Flip is_overdue for every invoice that crossed its due date (or stopped being overdue)
+    # with set-based UPDATEs instead of loading and saving rows one by one.
+    today = today or date.today()
+    now = timezone.now()
+
+    with transaction.atomic():
+        flagged = Invoice.objects.filter(
+            status__in=OPEN_STATUSES, due_date__lt=today, is_overdue=False
+        ).update(is_overdue=True, updated_at=now)
+        cleared = Invoice.objects.filter(is_overdue=True).filter(
+            Q(status="paid") | Q(due_date__gte=today)
+        ).update(is_overdue=False, updated_at=now)
+
+    if flagged or cleared:
+        invalidate_summary()
+    return flagged, cleared
+
+
+def taken_invoice_numbers(numbers):
+    return set(Invoice.objects.filter(invoice_number__in=numbers).values_list("invoice_number", flat=True))
+
+
+def create_invoice_batch(rows, errors, chunk_size=500):
+    # Insert the valid rows of a validated batch with bulk_create.
+    # `rows`/`errors` come from BatchListSerializer (None marks the other list's entries).
+    # Returns one result per input item, in order.
+    errors = list(errors)
+    valid = [i for i, row in enumerate(rows) if row is not None]
+
+    customers = Customer.objects.in_bulk({rows[i]["customer"] for i in valid})
+    taken = taken_invoice_numbers([rows[i]["invoice_number"] for i in valid])
+
+    today = timezone.localdate()
+    pending = []
+    for i in valid:
+        row = rows[i]
+        if row["customer"] not in customers:
+            errors[i] = {"customer": [f"Customer {row['customer']} does not exist."]}
+            continue
+        if row["invoice_number"] in taken:
+            errors[i] = {"invoice_number": [NUMBER_TAKEN]}
+            continue
+        taken.add(row["invoice_number"])
+
+        invoice = Invoice(
+            customer_id=row["customer"],
+            invoice_number=row["invoice_number"],
+            issue_date=row.get("issue_date") or today,
+            due_date=row["due_date"],
+            total_amount=row["total_amount"],
+        )
+        set_invoice_status(invoice)
+        pending.append((i, invoice))
+
+    while pending:
+        try:
+            with transaction.atomic():
+                for start in range(0, len(pending), chunk_size):
+                    Invoice.objects.bulk_create([invoice for _, invoice in pending[start:start + chunk_size]])
+
+                # bulk_create skips signals: keep the revenue rollup and dashboard cache in step ourselves
+                created_day = timezone.localdate(pending[0][1].created_at)
+                bump("revenue", created_day, sum(invoice.total_amount for _, invoice in pending), len(pending))
+            break
+        except IntegrityError:
+            # Another request took some of these numbers since the check above
+            collided = taken_invoice_numbers([invoice.invoice_number for _, invoice in pending])
+            if not collided:
+                raise
+            for i, invoice in pending:
+                if invoice.invoice_number in collided:
+                    errors[i] = {"invoice_number": [NUMBER_TAKEN]}
+            pending = [(i, invoice) for i, invoice in pending if invoice.invoice_number not in collided]
+            for _, invoice in pending:
+                invoice.pk = None  # handed out by a chunk that was rolled back
+    if pending:
+        invalidate_summary()
+
+    created = {i: invoice for i, invoice in pending}
+    results = []
+    for i in range(len(rows)):
+        if i in created:
+            invoice = created[i]
+            results.append({"index": i, "id": invoice.id, "invoice_number": invoice.invoice_number, "status": invoice.status})
+        else:
+            results.append({"index": i, "errors": errors[i]})
+    return results
@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user
+from .dashboard import invalidate_summary
+from .models import Customer, Invoice, Payment, Profile
+from .rollups import bump, rollup_day
+
+# Model -> (rollup metric, amount field)
+ROLLUP_SOURCES = {
+    Invoice: ("revenue", "total_amount"),
+    Payment: ("payments", "amount"),
+}
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    # Runs once per new connection; with CONN_MAX_AGE that's once per worker thread, not per request
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+@receiver(post_save, sender=User)
+def create_or_update_user_profile(sender, instance, created, raw=False, **kwargs):
+    # Password changes and last_login updates save the user too: only touch the
+    # profile when there's one to create or one that was changed through user.profile
+    if raw:
+        return
+    if created:
+        Profile.objects.create(user=instance)
+        return
+    profile = User.profile.related.get_cached_value(instance, None)
+    if profile is not None and profile.has_changes():
+        profile.save()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_dashboard(sender, **kwargs):
+    invalidate_summary()
+
+
+@receiver(pre_save, sender=Invoice)
+@receiver(pre_save, sender=Payment)
+def remember_rollup_amount(sender, instance, update_fields=None, **kwargs):
+    # Keep the stored amount so post_save can apply only the difference
+    _, field = ROLLUP_SOURCES[sender]
+    instance._rollup_old_amount = None
+    if instance._state.adding or (update_fields is not None and field not in update_fields):
+        return
+    instance._rollup_old_amount = (
+        sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Payment)
+def update_rollup_on_save(sender, instance, created, **kwargs):
+    metric, field = ROLLUP_SOURCES[sender]
+    amount = getattr(instance, field)
+    day = rollup_day(instance.created_at)
+
+    if created:
+        bump(metric, day, amount, 1)
+        return
+
+    old_amount = getattr(instance, "_rollup_old_amount", None)
+    if old_amount is not None and old_amount != amount:
+        bump(metric, day, amount - old_amount, 0)
+
+
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Payment)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    metric, field = ROLLUP_SOURCES[sender]
+    bump(metric, rollup_day(instance.created_at), -getattr(instance, field), -1)
@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Change, Customer, Invoice, Payment
+from .values_serializers import CustomerValuesSerializer, InvoiceValuesSerializer, PaymentValuesSerializer
+
+
+class SyncTokenError(ValueError):
+    pass
+
+
+class SyncTokenExpired(Exception):
+    # The change log entries needed to bring this client up to date have been pruned
+    pass
+
+
+def change_retention():
+    return timedelta(days=getattr(settings, "SYNC_CHANGE_RETENTION_DAYS", 30))
+
+
+def decode_token(token):
+    # Tokens are Change ids: the last change the client has seen
+    try:
+        since = int(token)
+    except ValueError:
+        since = None
+    if since is None or since < 0:
+        raise SyncTokenError("Invalid sync token.")
+    return since
+
+
+def changes_since(since=None):
+    """
+    The customers, invoices and payments created or updated after the change `since`,
+    plus the ids deleted; a full snapshot when since is None. The new token is read
+    before the rows, so a write committing meanwhile is either in the window or after
+    the token; rows are read as they are now, so one may arrive twice, which clients
+    upserting by id don't notice.
+    """
+    token = Change.objects.aggregate(last=Max("id"))["last"] or 0
+
+    customers = Customer.objects.order_by("id")
+    invoices = Invoice.objects.order_by("id")
+    payments = Payment.objects.order_by("id")
+    deleted = {"customers": [], "invoices": [], "payments": []}
+
+    if since is not None:
+        oldest = Change.objects.order_by("id").values_list("id", flat=True).first()
+        # Ids have no gaps (a rolled-back insert gives its id back), so a gap before the
+        # oldest entry means pruned changes; a token past the last one is from another log
+        if since > token or (oldest is not None and since < oldest - 1):
+            raise SyncTokenExpired()
+
+        window = Change.objects.filter(id__gt=since, id__lte=token)
+        changed = window.filter(deleted=False)
+        customers = customers.filter(id__in=changed.filter(model="customer").values("object_id"))
+        invoices = invoices.filter(id__in=changed.filter(model="invoice").values("object_id"))
+        payments = payments.filter(id__in=changed.filter(model="payment").values("object_id"))
+
+        for model, object_id in (
+            window.filter(deleted=True).order_by("id").values_list("model", "object_id")
+        ):
+            deleted[f"{model}s"].append(object_id)
+
+    return {
+        "token": str(token),
+        "customers": CustomerValuesSerializer().serialize_queryset(customers),
+        "invoices": InvoiceValuesSerializer().serialize_queryset(invoices),
+        "payments": PaymentValuesSerializer().serialize_queryset(payments),
+        "deleted": deleted,
+    }
+
+
+def prune_changes():
+    # Keeps the newest entry, so the log never looks empty to a client with an old token
+    cutoff = timezone.now() - change_retention()
+    latest = Change.objects.aggregate(last=Max("id"))["last"]
+    deleted, _ = Change.objects.filter(changed_at__lt=cutoff).exclude(id=latest).delete()
+    return deleted
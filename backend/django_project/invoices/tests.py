@@ -1,3 +1,1843 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import importlib
+import json
+import marshal
+import os
+import re
+import runpy
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from urllib.parse import quote
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Prefetch, Sum
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from django_project import settings as project_settings
+
+from .exports import INVOICE_EXPORT_FIELDS
+from . import jobs
+from .models import Change, Customer, DailyRollup, Invoice, Job, Payment, Profile
+from .filters import INVOICE_SEARCH_TABLE, search_ids
+from .aging import aging_report
+from .imports import PaymentImport, read_records
+from .dashboard import SUMMARY_CACHE_KEY, drop_summary
+from .events import CoalescingChannel
+from .middleware import RequestMetrics
+from .profiling import ProfileSession
+from .services import find_balance_drift, record_payment_created, set_invoice_status, sweep_overdue
+
+
+def make_invoices(customer, count, start=0):
+    # Bulk-create invoices with one partial payment each
+    invoices = Invoice.objects.bulk_create(
+        Invoice(
+            customer=customer,
+            invoice_number=f"INV-{start + i:06d}",
+            due_date=date.today() + timedelta(days=30),
+            total_amount=Decimal("100.00"),
+            amount_paid=Decimal("40.00"),
+            status="partially_paid",
+        )
+        for i in range(count)
+    )
+    Payment.objects.bulk_create(
+        Payment(invoice=invoice, amount=Decimal("40.00")) for invoice in invoices
+    )
+    return invoices
+
+
+class BillingTestCase(TestCase):
+    """
+    A user, the "Acme" customer and an API client authenticated as the user.
+    Subclasses add their own rows in setUpTestData, after calling super().
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("tester", password="secret")
+        cls.customer = Customer.objects.create(name="Acme", email="billing@acme.test")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class InvoiceListQueryCountTests(BillingTestCase):
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_invoice_list_query_count_is_flat(self):
+        make_invoices(self.customer, 10)
+        small, data = self.count_queries("/api/invoices/")
+        self.assertEqual(len(data), 10)
+
+        make_invoices(self.customer, 9990, start=10)
+        large, data = self.count_queries("/api/invoices/")
+        self.assertEqual(len(data), 10000)
+
+        self.assertEqual(small, large)
+
+    def test_customer_invoices_query_count_is_flat(self):
+        make_invoices(self.customer, 10)
+        small, _ = self.count_queries(f"/api/customers/{self.customer.pk}/invoices/")
+
+        make_invoices(self.customer, 190, start=10)
+        large, data = self.count_queries(f"/api/customers/{self.customer.pk}/invoices/")
+        self.assertEqual(len(data), 200)
+
+        self.assertEqual(small, large)
+
+    def test_balance_due_matches_payments(self):
+        invoice = make_invoices(self.customer, 1)[0]
+        self.client.post("/api/payments/", {"invoice": invoice.pk, "amount": "10.00"})
+
+        _, data = self.count_queries("/api/invoices/")
+
+        self.assertEqual(Decimal(str(data[0]["balance_due"])), Decimal("50.00"))
+        self.assertEqual(len(data[0]["payments"]), 2)
+        self.assertEqual(data[0]["customer_name"], "Acme")
+
+
+class PaymentBalanceTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.invoice = Invoice.objects.create(
+            customer=cls.customer,
+            invoice_number="INV-1",
+            due_date=date.today() + timedelta(days=30),
+            total_amount=Decimal("100.00"),
+        )
+
+    def assertBalance(self, amount_paid, balance_due, status):
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal(amount_paid))
+        self.assertEqual(self.invoice.balance_due, Decimal(balance_due))
+        self.assertEqual(self.invoice.status, status)
+
+    def test_create_patch_delete_keep_amount_paid_in_sync(self):
+        first = self.client.post("/api/payments/", {"invoice": self.invoice.pk, "amount": "30.00"}).json()
+        second = self.client.post("/api/payments/", {"invoice": self.invoice.pk, "amount": "20.00"}).json()
+        self.assertBalance("50.00", "50.00", "partially_paid")
+
+        self.client.patch(f"/api/payments/{second['id']}/", {"amount": "70.00"})
+        self.assertBalance("100.00", "0.00", "paid")
+
+        self.client.delete(f"/api/payments/{first['id']}/")
+        self.assertBalance("70.00", "30.00", "partially_paid")
+
+        self.client.delete(f"/api/payments/{second['id']}/")
+        self.assertBalance("0.00", "100.00", "unpaid")
+
+    def test_overlapping_deletes_take_the_payment_off_once(self):
+        from .services import record_payment_deleted
+        from .views import PaymentDetailView
+
+        payment = self.client.post("/api/payments/", {"invoice": self.invoice.pk, "amount": "30.00"}).json()
+        get_object = PaymentDetailView.get_object
+
+        def read_then_lose_the_race(view, pk):
+            # Another DELETE of the same payment commits right after this one read it
+            found = get_object(view, pk)
+            Payment.objects.filter(pk=pk).delete()
+            record_payment_deleted(found.invoice_id, found.amount)
+            return found
+
+        with mock.patch.object(PaymentDetailView, "get_object", read_then_lose_the_race):
+            response = self.client.delete(f"/api/payments/{payment['id']}/")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertBalance("0.00", "100.00", "unpaid")
+        self.assertEqual(self.client.delete(f"/api/payments/{payment['id']}/").status_code, 404)
+
+    def test_invoice_update_keeps_amount_paid(self):
+        self.client.post("/api/payments/", {"invoice": self.invoice.pk, "amount": "30.00"})
+
+        response = self.client.patch(f"/api/invoices/{self.invoice.pk}/", {"total_amount": "30.00"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertBalance("30.00", "0.00", "paid")
+
+    def test_invoice_update_returns_the_new_balance(self):
+        self.client.post("/api/payments/", {"invoice": self.invoice.pk, "amount": "30.00"})
+
+        response = self.client.patch(f"/api/invoices/{self.invoice.pk}/", {"total_amount": "200.00"})
+
+        self.assertEqual(response.json()["balance_due"], 170.0)
+        self.assertBalance("30.00", "170.00", "partially_paid")
+
+    def test_reconcile_repairs_drift(self):
+        Payment.objects.create(invoice=self.invoice, amount=Decimal("25.00"))
+        self.assertEqual(find_balance_drift().count(), 1)
+
+        call_command("reconcile_balances", "--fix", stdout=StringIO())
+
+        self.assertEqual(find_balance_drift().count(), 0)
+        self.assertBalance("25.00", "75.00", "partially_paid")
+
+
+class KeysetPaginationTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.invoices = make_invoices(cls.customer, 25)
+
+    def collect_pages(self, url):
+        ids, pages = [], 0
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                data = self.client.get(url).json()
+            self.assertFalse(any("OFFSET" in q["sql"] for q in ctx.captured_queries))
+            ids.extend(row["id"] for row in data["results"])
+            url, pages = data["next"], pages + 1
+        return ids, pages
+
+    def test_unpaginated_by_default(self):
+        self.assertEqual(len(self.client.get("/api/invoices/").json()), 25)
+
+    def test_invoice_pages_cover_every_row_once(self):
+        ids, pages = self.collect_pages("/api/invoices/?page_size=10")
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids, sorted((i.pk for i in self.invoices), reverse=True))
+
+    def test_payment_pages_break_ties_on_id(self):
+        # Every payment shares one created_at, so only the id tiebreak keeps pages apart
+        Payment.objects.update(created_at=Payment.objects.first().created_at)
+
+        ids, _ = self.collect_pages("/api/payments/?page_size=7")
+
+        self.assertEqual(ids, list(Payment.objects.order_by("-id").values_list("id", flat=True)))
+
+    def test_customer_invoice_pages_are_stable_under_inserts(self):
+        url = f"/api/customers/{self.customer.pk}/invoices/?page_size=10"
+        first = self.client.get(url).json()
+
+        make_invoices(self.customer, 5, start=100)
+        second = self.client.get(first["next"]).json()
+
+        self.assertEqual(len(second["results"]), 10)
+        seen = {row["id"] for row in first["results"]}
+        self.assertFalse(seen & {row["id"] for row in second["results"]})
+
+    def test_customer_list_pagination(self):
+        data = self.client.get("/api/customers/?page_size=1").json()
+
+        self.assertEqual([row["id"] for row in data["results"]], [self.customer.pk])
+        self.assertIsNone(data["next"])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get("/api/invoices/?cursor=bogus").status_code, 404)
+
+    def test_cursor_values_of_the_wrong_type(self):
+        for url in ("/api/payments/?page_size=2", f"/api/customers/{self.customer.pk}/invoices/?page_size=2"):
+            for position in (["abc", "x"], [None, None], ["2026-01-01", "zz"], [[1], {}]):
+                cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+                with self.subTest(url=url, position=position):
+                    self.assertEqual(self.client.get(f"{url}&cursor={cursor}").status_code, 404)
+
+
+class ExportTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other = Customer.objects.create(name="Globex", email="ap@globex.test")
+        make_invoices(cls.customer, 3)
+        make_invoices(other, 2, start=10)
+
+    def read(self, response):
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_invoice_csv_export(self):
+        response = self.client.get(f"/api/invoices/export/?customer={self.customer.pk}")
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = self.read(response).splitlines()
+        self.assertEqual(lines[0].split(","), INVOICE_EXPORT_FIELDS)
+        self.assertEqual(len(lines), 4)
+        self.assertIn("Acme", lines[1])
+        self.assertIn("60.00", lines[1])
+
+    def test_payment_ndjson_export(self):
+        response = self.client.get("/api/payments/export/?file_format=ndjson&status=partially_paid")
+
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row["invoice__customer__name"] for row in rows}, {"Acme", "Globex"})
+
+    def test_invalid_filters(self):
+        self.assertEqual(self.client.get("/api/invoices/export/?from=yesterday").status_code, 400)
+        self.assertEqual(self.client.get("/api/invoices/export/?to=2026-02-30").status_code, 400)
+        self.assertEqual(self.client.get("/api/invoices/export/?file_format=xml").status_code, 400)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command("export_invoices", "--format", "ndjson", "--status", "paid", stdout=out)
+        self.assertEqual(out.getvalue(), "")
+
+        call_command("export_invoices", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 6)
+
+
+class DashboardSummaryTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.invoices = make_invoices(cls.customer, 3)
+        Invoice.objects.filter(pk=cls.invoices[0].pk).update(due_date=date.today() - timedelta(days=5))
+        sweep_overdue()
+
+    def test_summary_values(self):
+        data = self.client.get("/api/dashboard/summary/").json()
+
+        self.assertEqual(data["total_invoices"], 3)
+        self.assertEqual(data["paid"], 0)
+        self.assertEqual(data["unpaid"], 0)
+        self.assertEqual(data["overdue"], 1)
+        self.assertEqual(data["overdue_total"], 100.0)
+        self.assertEqual(data["total_revenue"], 300.0)
+        self.assertEqual(data["total_payments_collected"], 120.0)
+
+    def test_summary_is_cached_until_a_write(self):
+        with CaptureQueriesContext(connection) as miss:
+            self.client.get("/api/dashboard/summary/")
+        with CaptureQueriesContext(connection) as hit:
+            self.client.get("/api/dashboard/summary/")
+        self.assertEqual(len(miss.captured_queries), 2)
+        self.assertEqual(len(hit.captured_queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/payments/", {"invoice": self.invoices[1].pk, "amount": "60.00"})
+
+        data = self.client.get("/api/dashboard/summary/").json()
+        self.assertEqual(data["paid"], 1)
+        self.assertEqual(data["total_payments_collected"], 180.0)
+
+    def test_summary_cached_before_the_write_commits_is_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Payment.objects.create(invoice=self.invoices[1], amount=Decimal("60.00"))
+                # A request from another connection, which can't see the payment yet
+                self.client.get("/api/dashboard/summary/")
+                self.assertIsNotNone(cache.get(f"{SUMMARY_CACHE_KEY}:{date.today().isoformat()}"))
+
+        self.assertIsNone(cache.get(f"{SUMMARY_CACHE_KEY}:{date.today().isoformat()}"))
+
+
+class RollupTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.invoice = Invoice.objects.create(
+            customer=cls.customer,
+            invoice_number="INV-1",
+            due_date=date.today() + timedelta(days=30),
+            total_amount=Decimal("100.00"),
+        )
+        Invoice.objects.create(
+            customer=cls.customer,
+            invoice_number="INV-2",
+            due_date=date.today() + timedelta(days=30),
+            total_amount=Decimal("50.00"),
+        )
+
+    def rollup(self, metric):
+        return DailyRollup.objects.get(metric=metric, day=timezone.localdate())
+
+    def test_rollups_follow_writes(self):
+        self.assertEqual(self.rollup("revenue").total, Decimal("150.00"))
+        self.assertEqual(self.rollup("revenue").count, 2)
+
+        payment = self.client.post("/api/payments/", {"invoice": self.invoice.pk, "amount": "30.00"}).json()
+        self.client.patch(f"/api/payments/{payment['id']}/", {"amount": "45.00"})
+        self.client.patch(f"/api/invoices/{self.invoice.pk}/", {"total_amount": "120.00"})
+
+        self.assertEqual(self.rollup("payments").total, Decimal("45.00"))
+        self.assertEqual(self.rollup("revenue").total, Decimal("170.00"))
+
+        self.client.delete(f"/api/invoices/{self.invoice.pk}/")
+
+        self.assertEqual(self.rollup("revenue").total, Decimal("50.00"))
+        self.assertEqual(self.rollup("revenue").count, 1)
+        self.assertEqual(self.rollup("payments").count, 0)
+
+    def test_monthly_views_read_rollups(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get("/api/dashboard/monthly-revenue/").json()
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn("invoices_dailyrollup", ctx.captured_queries[0]["sql"])
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]["total"], 150.0)
+
+        today = timezone.localdate().isoformat()
+        data = self.client.get(f"/api/dashboard/monthly-payments/?granularity=day&from={today}&to={today}").json()
+        self.assertEqual(data, [])
+
+        self.assertEqual(self.client.get("/api/dashboard/monthly-revenue/?granularity=year").status_code, 400)
+
+    def test_rebuild_matches_incremental(self):
+        expected = list(DailyRollup.objects.order_by("metric", "day").values_list("metric", "day", "total", "count"))
+        DailyRollup.objects.all().delete()
+
+        call_command("rebuild_rollups", stdout=StringIO())
+
+        rebuilt = list(DailyRollup.objects.order_by("metric", "day").values_list("metric", "day", "total", "count"))
+        self.assertEqual(rebuilt, expected)
+
+
+class OverdueSweepTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.invoices = make_invoices(cls.customer, 4)
+        past = date.today() - timedelta(days=1)
+        Invoice.objects.filter(pk__in=[i.pk for i in cls.invoices[:3]]).update(due_date=past)
+        Invoice.objects.filter(pk=cls.invoices[2].pk).update(status="paid")
+
+    def overdue_ids(self):
+        return [row["id"] for row in self.client.get("/api/dashboard/overdue/").json()]
+
+    def test_sweep_flags_crossing_invoices(self):
+        self.assertEqual(self.overdue_ids(), [])
+
+        call_command("sweep_overdue", stdout=StringIO())
+
+        self.assertEqual(sorted(self.overdue_ids()), [self.invoices[0].pk, self.invoices[1].pk])
+        self.assertEqual(self.client.get("/api/dashboard/summary/").json()["overdue"], 2)
+
+    def test_sweep_clears_paid_and_rescheduled_invoices(self):
+        sweep_overdue()
+        Invoice.objects.filter(pk=self.invoices[0].pk).update(status="paid")
+        Invoice.objects.filter(pk=self.invoices[1].pk).update(due_date=date.today() + timedelta(days=10))
+
+        self.assertEqual(sweep_overdue(), (0, 2))
+        self.assertEqual(self.overdue_ids(), [])
+
+    def test_migration_backfills_the_flag(self):
+        from django.apps import apps
+
+        backfill_overdue = importlib.import_module("invoices.migrations.0005_overdue_sweep_indexes").backfill_overdue
+        Invoice.objects.filter(pk=self.invoices[2].pk).update(is_overdue=True)
+
+        backfill_overdue(apps, None)
+        self.assertEqual(sorted(self.overdue_ids()), [self.invoices[0].pk, self.invoices[1].pk])
+
+    def test_unscheduled_sweep_is_reported(self):
+        from .checks import check_overdue_sweep
+
+        with override_settings(OVERDUE_SWEEP_INTERVAL=None):
+            self.assertEqual([warning.id for warning in check_overdue_sweep(None)], ["invoices.W001"])
+        with override_settings(OVERDUE_SWEEP_INTERVAL=3600):
+            self.assertEqual(check_overdue_sweep(None), [])
+
+    def test_sweep_is_set_based(self):
+        with CaptureQueriesContext(connection) as ctx:
+            sweep_overdue(date.today() + timedelta(days=60))
+
+        updates = [q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(Invoice.objects.filter(is_overdue=True).count(), 3)
+
+
+class InvoiceBatchTests(BillingTestCase):
+
+    def item(self, number, **overrides):
+        item = {
+            "customer": self.customer.pk,
+            "invoice_number": number,
+            "due_date": (date.today() + timedelta(days=30)).isoformat(),
+            "total_amount": "25.00",
+        }
+        item.update(overrides)
+        return item
+
+    def test_batch_reports_per_item_errors(self):
+        make_invoices(self.customer, 1)
+        items = [
+            self.item("B-1"),
+            self.item("INV-000000"),
+            self.item("B-2", customer=9999),
+            self.item("B-3", total_amount="oops"),
+            self.item("B-1"),
+            self.item("B-4", due_date=(date.today() - timedelta(days=1)).isoformat()),
+        ]
+
+        response = self.client.post("/api/invoices/batch/", items, format="json")
+
+        self.assertEqual(response.status_code, 207)
+        data = response.json()
+        self.assertEqual((data["created"], data["failed"]), (2, 4))
+        results = data["results"]
+        self.assertIn("id", results[0])
+        self.assertIn("invoice_number", results[1]["errors"])
+        self.assertIn("customer", results[2]["errors"])
+        self.assertIn("total_amount", results[3]["errors"])
+        self.assertIn("invoice_number", results[4]["errors"])
+        self.assertEqual(results[5]["status"], "unpaid")
+        self.assertTrue(Invoice.objects.get(invoice_number="B-4").is_overdue)
+        self.assertEqual(DailyRollup.objects.get(metric="revenue").total, Decimal("50.00"))
+
+    def test_number_taken_after_the_check_is_reported_per_item(self):
+        from . import services
+
+        taken_invoice_numbers = services.taken_invoice_numbers
+        calls = []
+
+        def checked_then_taken(numbers):
+            taken = taken_invoice_numbers(numbers)
+            calls.append(numbers)
+            if len(calls) == 1:
+                # Another request creates B-2 between the check and the insert
+                Invoice.objects.create(
+                    customer=self.customer, invoice_number="B-2", due_date=date.today(), total_amount=Decimal("5.00")
+                )
+            return taken
+
+        with mock.patch.object(services, "taken_invoice_numbers", checked_then_taken):
+            response = self.client.post("/api/invoices/batch/", [self.item("B-1"), self.item("B-2")], format="json")
+
+        self.assertEqual(response.status_code, 207)
+        results = response.json()["results"]
+        self.assertIn("id", results[0])
+        self.assertEqual(results[1]["errors"], {"invoice_number": ["invoice with this invoice number already exists."]})
+        self.assertEqual(Invoice.objects.get(pk=results[0]["id"]).invoice_number, "B-1")
+
+    def test_ndjson_batch_in_constant_queries(self):
+        def post(count, prefix):
+            body = "\n".join(json.dumps(self.item(f"{prefix}-{i}")) for i in range(count))
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(
+                    "/api/invoices/batch/", body, content_type="application/x-ndjson"
+                )
+            self.assertEqual(response.status_code, 201)
+            return len(ctx.captured_queries)
+
+        small = post(10, "S")
+        large = post(400, "L")
+
+        self.assertEqual(Invoice.objects.count(), 410)
+        # Only the number of bulk_create chunks may grow
+        self.assertLessEqual(large, small + 1)
+
+    def test_rejects_non_list_body(self):
+        response = self.client.post("/api/invoices/batch/", {"invoice_number": "X"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class PaymentImportTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.invoices = make_invoices(cls.customer, 2)
+        Payment.objects.create(invoice=cls.invoices[0], amount=Decimal("1.00"), reference="TX-OLD")
+
+    def test_csv_import_summary(self):
+        body = "\n".join([
+            "invoice_number,amount,reference,note",
+            "INV-000000,60.00,TX-1,card",
+            "INV-000001,10.00,TX-2,",
+            "INV-000001,5.00,TX-2,",
+            "INV-000000,5.00,TX-OLD,",
+            "INV-999999,5.00,TX-3,",
+            "INV-000001,abc,TX-4,",
+        ])
+
+        response = self.client.post("/api/payments/import/", body, content_type="text/csv")
+
+        summary = response.json()
+        self.assertEqual(summary["lines"], 6)
+        self.assertEqual(summary["imported"], 2)
+        self.assertEqual(summary["duplicates"], 2)
+        self.assertEqual(summary["unmatched"], 1)
+        self.assertEqual(summary["invalid"], 1)
+        self.assertEqual([e["line"] for e in summary["errors"]], [7, 4, 5, 6])
+
+        first, second = Invoice.objects.filter(pk__in=[i.pk for i in self.invoices]).order_by("id")
+        # amount_paid is recomputed from all payments (40 seeded + 1 untracked + 60 imported)
+        self.assertEqual((first.amount_paid, first.status), (Decimal("101.00"), "paid"))
+        self.assertEqual((second.amount_paid, second.status), (Decimal("50.00"), "partially_paid"))
+
+    def test_multipart_upload(self):
+        upload = SimpleUploadedFile("settlement.csv", b"invoice_number,amount\nINV-000000,2.50\n")
+
+        summary = self.client.post("/api/payments/import/", {"file": upload}, format="multipart").json()
+
+        self.assertEqual(summary["imported"], 1)
+
+    def test_ndjson_import_in_batches(self):
+        lines = [json.dumps({"invoice_number": "INV-000001", "amount": "1.00", "reference": f"N-{i}"}) for i in range(25)]
+        lines.insert(3, "not json")
+
+        with CaptureQueriesContext(connection) as ctx:
+            call_command("import_payments", self.write_file("\n".join(lines)), "--format", "ndjson", "--batch-size", "10", stdout=StringIO())
+
+        self.assertEqual(Payment.objects.filter(reference__startswith="N-").count(), 25)
+        self.assertEqual(Invoice.objects.get(pk=self.invoices[1].pk).amount_paid, Decimal("65.00"))
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "invoices_payment"')]
+        self.assertEqual(len(inserts), 3)
+
+    def test_undecodable_line_is_rejected(self):
+        body = "invoice_number,amount,note\nINV-000000,2.00,ok\n".encode() + b"INV-000001,3.00,caf\xe9\n"
+
+        response = self.client.post("/api/payments/import/", body, content_type="text/csv")
+
+        summary = response.json()
+        self.assertEqual((summary["imported"], summary["invalid"]), (1, 1))
+        self.assertEqual(summary["errors"], [{"line": 3, "error": "line is not UTF-8 text"}])
+
+    def test_reference_posted_concurrently_counts_as_duplicate(self):
+        class RacingImport(PaymentImport):
+            # The first duplicate check runs before another import commits TX-OLD
+            checks = 0
+
+            def posted_references(self, references):
+                self.checks += 1
+                return set() if self.checks == 1 else super().posted_references(references)
+
+        body = b"invoice_number,amount,reference\nINV-000000,2.00,TX-OLD\nINV-000000,3.00,TX-NEW\n"
+        summary = RacingImport().run(read_records(body.splitlines(keepends=True), "csv"))
+
+        self.assertEqual((summary["imported"], summary["duplicates"]), (1, 1))
+        self.assertEqual(summary["errors"], [{"line": 2, "error": "reference TX-OLD already posted"}])
+        self.assertTrue(Payment.objects.filter(reference="TX-NEW").exists())
+
+    def write_file(self, content):
+        handle = tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False)
+        with handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+
+# "SCAN invoices_invoice" with no "USING ... INDEX" means every row of the table is read
+FULL_SCAN = re.compile(r"\bSCAN (\w+)$")
+
+
+class QueryPlanTests(BillingTestCase):
+    """
+    Runs every read endpoint, then EXPLAIN QUERY PLANs each SQL statement it issued
+    and fails on a full table scan. A scan is only tolerated when the statement has a
+    LIMIT and needs no sort, i.e. it walks the table in order and stops after one page.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other = Customer.objects.create(name="Globex", email="ap@globex.test")
+        make_invoices(cls.customer, 30)
+        make_invoices(other, 30, start=100)
+        sweep_overdue()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertNoFullScans(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+
+        selects = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("SELECT")]
+        self.assertTrue(selects, url)
+        for sql in selects:
+            plan = self.explain(sql)
+            scans = [step for step in plan if FULL_SCAN.search(step)]
+            bounded = " LIMIT " in sql and not any("TEMP B-TREE" in step for step in plan)
+            if scans and not bounded:
+                self.fail(f"{url} does a full table scan:\n{sql}\n" + "\n".join(plan))
+
+    def next_page(self, url):
+        return self.client.get(url).json()["next"]
+
+    def test_paginated_lists(self):
+        for url in [
+            "/api/invoices/?page_size=5",
+            "/api/customers/?page_size=1",
+            "/api/payments/?page_size=5",
+            f"/api/customers/{self.customer.pk}/invoices/?page_size=5",
+        ]:
+            with self.subTest(url=url):
+                self.assertNoFullScans(url)
+                self.assertNoFullScans(self.next_page(url))
+
+    def test_filtered_lists(self):
+        for url in [
+            "/api/invoices/?page_size=5&status=paid",
+            "/api/invoices/?page_size=5&from=2026-01-01&to=2026-03-31",
+            "/api/invoices/?page_size=5&min_amount=50&max_amount=150",
+            "/api/invoices/?page_size=5&q=acme",
+            f"/api/customers/{self.customer.pk}/invoices/?page_size=5&q=inv",
+            "/api/customers/?page_size=5&q=glob",
+        ]:
+            with self.subTest(url=url):
+                self.assertNoFullScans(url)
+
+    def test_details(self):
+        invoice = Invoice.objects.first()
+        self.assertNoFullScans(f"/api/invoices/{invoice.pk}/")
+        self.assertNoFullScans(f"/api/customers/{self.customer.pk}/")
+
+    def test_dashboard(self):
+        for url in [
+            "/api/dashboard/summary/",
+            "/api/dashboard/monthly-revenue/",
+            "/api/dashboard/monthly-payments/?granularity=day&from=2026-01-01",
+            "/api/dashboard/overdue/",
+        ]:
+            with self.subTest(url=url):
+                self.assertNoFullScans(url)
+
+    def test_filtered_exports(self):
+        for url in [
+            "/api/invoices/export/?status=paid",
+            f"/api/invoices/export/?customer={self.customer.pk}&from=2026-01-01",
+            f"/api/payments/export/?customer={self.customer.pk}",
+        ]:
+            with self.subTest(url=url):
+                self.assertNoFullScans(url)
+
+    def test_unpaginated_list_is_reported(self):
+        # Guards the checker itself: the full, unpaginated invoice list must read the whole table
+        with self.assertRaises(AssertionError):
+            self.assertNoFullScans("/api/invoices/")
+
+
+class ConditionalRequestTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.invoice = make_invoices(cls.customer, 3)[0]
+
+    def test_unchanged_lists_return_304(self):
+        for url in ["/api/invoices/", f"/api/customers/{self.customer.pk}/invoices/", "/api/customers/"]:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertIn("ETag", first)
+                self.assertIn("Last-Modified", first)
+
+                with CaptureQueriesContext(connection) as ctx:
+                    second = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+                self.assertEqual(second.status_code, 304)
+                self.assertLessEqual(len(ctx.captured_queries), 2)
+
+    def test_page_etags_follow_the_page(self):
+        url = "/api/invoices/?page_size=2"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # A payment on the oldest invoice (page 2) leaves page 1 alone...
+        self.client.post("/api/payments/", {"invoice": self.invoice.pk, "amount": "5.00"})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # ...a new invoice at the top of the list doesn't
+        make_invoices(self.customer, 1, start=50)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_payment_changes_invoice_etags(self):
+        list_etag = self.client.get("/api/invoices/")["ETag"]
+        detail_etag = self.client.get(f"/api/invoices/{self.invoice.pk}/")["ETag"]
+
+        self.client.post("/api/payments/", {"invoice": self.invoice.pk, "amount": "5.00"})
+
+        self.assertEqual(self.client.get("/api/invoices/", HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+        response = self.client.get(f"/api/invoices/{self.invoice.pk}/", HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], detail_etag)
+
+    def test_customer_rename_changes_invoice_etag(self):
+        etag = self.client.get(f"/api/invoices/{self.invoice.pk}/")["ETag"]
+
+        self.client.patch(f"/api/customers/{self.customer.pk}/", {"name": "Acme Corp"})
+
+        response = self.client.get(f"/api/invoices/{self.invoice.pk}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["customer_name"], "Acme Corp")
+
+    def test_if_match_guards_against_lost_updates(self):
+        etag = self.client.get(f"/api/invoices/{self.invoice.pk}/")["ETag"]
+
+        first = self.client.patch(f"/api/invoices/{self.invoice.pk}/", {"total_amount": "90.00"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(first.status_code, 200)
+        self.assertNotEqual(first["ETag"], etag)
+
+        stale = self.client.patch(f"/api/invoices/{self.invoice.pk}/", {"total_amount": "80.00"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(stale.status_code, 412)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.total_amount, Decimal("90.00"))
+
+
+class SyncTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.invoices = make_invoices(cls.customer, 3)
+
+    def sync(self, token=None):
+        url = "/api/sync/" + (f"?since={quote(token)}" if token else "")
+        return self.client.get(url).json()
+
+    def test_full_snapshot_then_deltas(self):
+        snapshot = self.sync()
+        self.assertEqual(len(snapshot["invoices"]), 3)
+        self.assertEqual(len(snapshot["payments"]), 3)
+        token = snapshot["token"]
+
+        self.client.post("/api/payments/", {"invoice": self.invoices[0].pk, "amount": "5.00"})
+        self.client.delete(f"/api/invoices/{self.invoices[1].pk}/")
+
+        delta = self.sync(token)
+        self.assertEqual([row["id"] for row in delta["invoices"]], [self.invoices[0].pk])
+        self.assertEqual(len(delta["payments"]), 1)
+        self.assertEqual(delta["customers"], [])
+        self.assertEqual(delta["deleted"]["invoices"], [self.invoices[1].pk])
+        self.assertEqual(len(delta["deleted"]["payments"]), 1)
+
+        self.assertEqual(self.sync(delta["token"])["invoices"], [])
+
+    def test_writes_stamped_long_before_they_commit_are_seen(self):
+        # updated_at comes from the app's clock when the row is saved, not when it commits
+        token = self.sync()["token"]
+        Invoice.objects.filter(pk=self.invoices[2].pk).update(
+            total_amount=Decimal("500.00"), updated_at=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertEqual([row["id"] for row in self.sync(token)["invoices"]], [self.invoices[2].pk])
+
+    def test_bulk_writes_are_logged(self):
+        token = self.sync()["token"]
+        make_invoices(self.customer, 2, start=10)
+        sweep_overdue()
+
+        self.assertEqual(len(self.sync(token)["invoices"]), 2)
+
+    def test_customer_delete_cascade_is_reported(self):
+        token = self.sync()["token"]
+
+        self.client.delete(f"/api/customers/{self.customer.pk}/")
+
+        deleted = self.sync(token)["deleted"]
+        self.assertEqual(deleted["customers"], [self.customer.pk])
+        self.assertEqual(sorted(deleted["invoices"]), sorted(i.pk for i in self.invoices))
+
+    def test_bad_and_expired_tokens(self):
+        self.assertEqual(self.client.get("/api/sync/?since=yesterday").status_code, 400)
+
+        token = int(self.sync()["token"])
+        self.assertEqual(self.client.get(f"/api/sync/?since={token + 1}").status_code, 410)
+
+        Change.objects.update(changed_at=timezone.now() - timedelta(days=365))
+        self.client.post("/api/payments/", {"invoice": self.invoices[0].pk, "amount": "5.00"})
+        call_command("prune_changes", stdout=StringIO())
+        self.assertEqual(self.client.get(f"/api/sync/?since={token - 1}").status_code, 410)
+        self.assertEqual(self.client.get(f"/api/sync/?since={token}").status_code, 200)
+
+
+class SparseFieldsetTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        make_invoices(cls.customer, 5)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), [q["sql"] for q in ctx.captured_queries]
+
+    def test_default_shape_is_unchanged(self):
+        data, _ = self.get("/api/invoices/")
+        self.assertIn("payments", data[0])
+        self.assertIn("created_at", data[0])
+
+    def test_fields_limit_output_and_columns(self):
+        data, queries = self.get("/api/invoices/?fields=invoice_number,customer_name,status,balance_due")
+
+        self.assertEqual(set(data[0]), {"invoice_number", "customer_name", "status", "balance_due"})
+        self.assertEqual(data[0]["balance_due"], 60.0)
+        self.assertFalse(any("invoices_payment" in sql for sql in queries))
+        listing = queries[-1]
+        self.assertIn('"invoices_customer"."name"', listing)
+        self.assertNotIn('"invoices_customer"."email"', listing)
+        self.assertNotIn('"invoices_invoice"."created_at"', listing)
+
+    def test_expand_payments(self):
+        data, queries = self.get("/api/invoices/?fields=invoice_number&expand=payments")
+
+        self.assertEqual(set(data[0]), {"invoice_number", "payments"})
+        self.assertEqual(len(data[0]["payments"]), 1)
+        self.assertNotIn("invoices_customer", queries[-2])
+
+    def test_sparse_keyset_pages(self):
+        url = f"/api/customers/{self.customer.pk}/invoices/?fields=id&page_size=2"
+        pages = 0
+        while url:
+            data, queries = self.get(url)
+            self.assertTrue(all(set(row) == {"id"} for row in data["results"]))
+            url, pages = data["next"], pages + 1
+        self.assertEqual(pages, 3)
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get("/api/invoices/?fields=secret").status_code, 400)
+        self.assertEqual(self.client.get("/api/invoices/?expand=customer").status_code, 400)
+
+
+class ValuesSerializerTests(BillingTestCase):
+    # The .values() list path and ORJSONRenderer must produce the exact bytes of the ModelSerializer path
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.customer.name = 'Ünïcode "quoted"   \\ \x07 🧾'
+        cls.customer.address = "Line 1\nLine 2"
+        cls.customer.save()
+        Customer.objects.create(name="Globex", email="ap@globex.test", phone="555-0100")
+        invoices = make_invoices(cls.customer, 3)
+        make_invoices(Customer.objects.get(name="Globex"), 2, start=10)
+        Payment.objects.create(invoice=invoices[0], amount=Decimal("12.34"), note="Card  ", reference="ch_1")
+        Invoice.objects.filter(pk=invoices[1].pk).update(total_amount=Decimal("1234567.89"))
+
+    def expected(self, serializer_class, queryset, fields=None):
+        from rest_framework.renderers import JSONRenderer
+
+        data = serializer_class(queryset, many=True).data
+        if fields is not None:
+            data = [{name: value for name, value in row.items() if name in fields} for row in data]
+        return JSONRenderer().render(data)
+
+    def test_lists_match_model_serializers(self):
+        from .serializers import CustomerSerializer, InvoiceSerializer, PaymentSerializer
+
+        invoices = Invoice.objects.select_related("customer").prefetch_related(
+            Prefetch("payments", queryset=Payment.objects.order_by("id"))
+        )
+        cases = [
+            ("/api/invoices/", InvoiceSerializer, invoices.order_by("-id"), None),
+            (
+                f"/api/customers/{self.customer.pk}/invoices/",
+                InvoiceSerializer, invoices.filter(customer=self.customer).order_by("-issue_date", "-id"), None,
+            ),
+            (
+                "/api/invoices/?fields=invoice_number,customer_name,balance_due&expand=payments",
+                InvoiceSerializer, invoices.order_by("-id"),
+                {"invoice_number", "customer_name", "balance_due", "payments"},
+            ),
+            ("/api/customers/", CustomerSerializer, Customer.objects.order_by("-id"), None),
+            ("/api/payments/", PaymentSerializer, Payment.objects.order_by("-created_at", "-id"), None),
+        ]
+        for url, serializer_class, queryset, fields in cases:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, self.expected(serializer_class, queryset, fields))
+
+    def test_paginated_pages_match(self):
+        from .serializers import PaymentSerializer
+
+        response = self.client.get("/api/payments/?page_size=2")
+        page = Payment.objects.order_by("-created_at", "-id")[:2]
+        self.assertEqual(
+            json.dumps(response.json()["results"]).encode(),
+            json.dumps(json.loads(self.expected(PaymentSerializer, page))).encode(),
+        )
+        self.assertIsNotNone(response.json()["next"])
+
+    def test_list_queries(self):
+        # One query for the invoices and one for all of their payments
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/invoices/", HTTP_IF_NONE_MATCH='"stale"')
+        listing = [q["sql"] for q in ctx.captured_queries if "COUNT(" not in q["sql"] and "MAX(" not in q["sql"]]
+        self.assertEqual(len(listing), 2)
+
+    def test_renderer_matches_json_renderer(self):
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+
+        from .renderers import ORJSONRenderer
+
+        data = {
+            "text": "naïve     </script> \x00\x1f\x7f \t\n",
+            "amount": Decimal("60.10"),
+            "when": timezone.now(),
+            "day": date(2026, 2, 28),
+            "lazy": gettext_lazy("Invoice"),
+            "nested": [{"a": None, "b": True, "c": 1.5}, (1, 2)],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            ORJSONRenderer().render(data, "application/json; indent=2"),
+            JSONRenderer().render(data, "application/json; indent=2"),
+        )
+        # Falls back to json.dumps for what orjson can't encode
+        self.assertEqual(ORJSONRenderer().render({1: 2**70}), JSONRenderer().render({1: 2**70}))
+
+
+class SearchFilterTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.acme = cls.customer
+        cls.acme.name = "Acme Café"
+        cls.acme.save()
+        cls.globex = Customer.objects.create(name="Globex", email="ap@globex.test")
+        cls.acme_invoices = make_invoices(cls.acme, 3)
+        cls.globex_invoices = make_invoices(cls.globex, 2, start=1000)
+
+        Invoice.objects.filter(pk=cls.acme_invoices[0].pk).update(
+            total_amount=Decimal("500.00"), issue_date=date(2026, 1, 15), status="paid",
+        )
+        Invoice.objects.filter(pk=cls.globex_invoices[0].pk).update(is_overdue=True)
+
+    def numbers(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        rows = response.json()
+        if isinstance(rows, dict):
+            rows = rows["results"]
+        return sorted(row["invoice_number"] for row in rows)
+
+    def test_structured_filters(self):
+        self.assertEqual(self.numbers("/api/invoices/?status=paid"), ["INV-000000"])
+        self.assertEqual(self.numbers("/api/invoices/?min_amount=200"), ["INV-000000"])
+        self.assertEqual(len(self.numbers("/api/invoices/?max_amount=100")), 4)
+        self.assertEqual(self.numbers("/api/invoices/?from=2026-01-01&to=2026-01-31"), ["INV-000000"])
+        self.assertEqual(self.numbers(f"/api/invoices/?customer={self.globex.pk}"), ["INV-001000", "INV-001001"])
+        self.assertEqual(self.numbers("/api/invoices/?overdue=true"), ["INV-001000"])
+        self.assertEqual(
+            self.numbers(f"/api/customers/{self.acme.pk}/invoices/?status=partially_paid"),
+            ["INV-000001", "INV-000002"],
+        )
+
+    def test_search(self):
+        self.assertEqual(self.numbers("/api/invoices/?q=1001"), [])
+        self.assertEqual(self.numbers("/api/invoices/?q=001001"), ["INV-001001"])
+        self.assertEqual(self.numbers("/api/invoices/?q=glob"), ["INV-001000", "INV-001001"])
+        self.assertEqual(len(self.numbers("/api/invoices/?q=cafe")), 3)
+        self.assertEqual(self.numbers("/api/invoices/?q=acme 000002"), ["INV-000002"])
+        self.assertEqual(self.numbers("/api/invoices/?q=ap@globex&status=paid"), [])
+        self.assertEqual(len(self.numbers("/api/invoices/?q=acme&page_size=2")), 2)
+
+    def test_search_input_is_not_fts_syntax(self):
+        for query in ['"', "acme OR", "NEAR(", "*", "-acme", "billing:"]:
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f"/api/invoices/?q={quote(query)}").status_code, 200)
+
+    def test_index_follows_writes(self):
+        Customer.objects.filter(pk=self.globex.pk).update(name="Initech")
+        self.assertEqual(self.numbers("/api/invoices/?q=initech"), ["INV-001000", "INV-001001"])
+        self.assertEqual(self.numbers("/api/invoices/?q=globex"), ["INV-001000", "INV-001001"])  # still in the email
+
+        invoice = Invoice.objects.get(invoice_number="INV-001001")
+        invoice.invoice_number = "RENAMED-7"
+        invoice.save()
+        self.assertEqual(self.numbers("/api/invoices/?q=renamed"), ["RENAMED-7"])
+
+        invoice.delete()
+        self.assertEqual(self.numbers("/api/invoices/?q=renamed"), [])
+
+    def test_customer_search(self):
+        response = self.client.get("/api/customers/?q=acme")
+        self.assertEqual([row["name"] for row in response.json()], ["Acme Café"])
+        response = self.client.get("/api/customers/?q=globex.test")
+        self.assertEqual([row["name"] for row in response.json()], ["Globex"])
+
+    def test_invalid_filters(self):
+        for query in ["status=lost", "min_amount=lots", "from=2026-02-30", "customer=x", "overdue=maybe"]:
+            with self.subTest(query=query):
+                response = self.client.get(f"/api/invoices/?{query}")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+    def test_export_uses_the_same_filters(self):
+        response = self.client.get("/api/invoices/export/?file_format=ndjson&q=globex&max_amount=100")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["invoice_number"] for row in rows], ["INV-001000", "INV-001001"])
+
+
+class AsyncViewTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        make_invoices(cls.customer, 3)
+
+    async def test_views_run_on_the_event_loop(self):
+        # Served the ASGI way, with JWT authentication resolved outside the event loop
+        client = AsyncClient()
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+        for url in (
+            "/api/dashboard/summary/",
+            "/api/dashboard/monthly-revenue/",
+            "/api/invoices/",
+            "/api/invoices/?page_size=2",
+            "/api/customers/?q=acme",
+        ):
+            response = await client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200, url)
+            expected = await sync_to_async(self.client.get)(url)
+            self.assertEqual(response.content, expected.content, url)
+
+        response = await client.get("/api/dashboard/summary/")
+        self.assertEqual(response.status_code, 401)
+
+    def test_writes_on_async_views(self):
+        response = self.client.post("/api/customers/", {"name": "Globex", "email": "ap@globex.test"})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post("/api/invoices/", {
+            "customer": response.json()["id"], "invoice_number": "INV-900000",
+            "issue_date": "2026-10-01", "due_date": "2026-12-31", "total_amount": "50.00",
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()["status"], "unpaid")
+        self.assertEqual(self.client.options("/api/invoices/").status_code, 200)
+
+
+class SeedBillingTests(TestCase):
+
+    def test_seeded_data_is_consistent(self):
+        out = StringIO()
+        call_command("seed_billing", "--customers", "20", "--invoices", "300", "--payments-per-invoice", "3",
+                     "--batch-size", "64", "--seed", "7", stdout=out)
+        self.assertIn("20 customer(s), 300 invoice(s)", out.getvalue())
+        self.assertEqual(Invoice.objects.count(), 300)
+
+        # Balances, statuses and flags match what the API would have stored
+        self.assertFalse(find_balance_drift().exists())
+        for invoice in Invoice.objects.all():
+            expected = Invoice(total_amount=invoice.total_amount, amount_paid=invoice.amount_paid, due_date=invoice.due_date)
+            set_invoice_status(expected)
+            self.assertEqual((invoice.status, invoice.is_overdue), (expected.status, expected.is_overdue))
+            self.assertLessEqual(invoice.amount_paid, invoice.total_amount)
+        self.assertLessEqual(Payment.objects.filter(invoice__in=Invoice.objects.all()).count(), 900)
+        self.assertEqual({status for status, _ in Invoice.STATUS_CHOICES},
+                         set(Invoice.objects.values_list("status", flat=True)))
+
+        # Spread over time, with payments never before their invoice or in the future
+        self.assertGreater(Invoice.objects.values("issue_date").distinct().count(), 100)
+        self.assertFalse(Payment.objects.filter(created_at__date__lt=F("invoice__issue_date")).exists())
+        self.assertFalse(Payment.objects.filter(created_at__gt=timezone.now() + timedelta(days=1)).exists())
+
+        # Derived data is rebuilt: rollups and the search index
+        self.assertEqual(
+            DailyRollup.objects.filter(metric="payments").aggregate(total=Sum("count"))["total"], Payment.objects.count(),
+        )
+        name = Customer.objects.first().name.split()[0]
+        self.assertTrue(Invoice.objects.filter(id__in=search_ids(INVOICE_SEARCH_TABLE, name)).exists())
+
+        # A second run appends, numbering after the existing invoices
+        call_command("seed_billing", "--customers", "0", "--invoices", "10", "--seed", "7", stdout=StringIO())
+        self.assertEqual(Invoice.objects.count(), 310)
+
+
+class RequestMetricsTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.invoices = make_invoices(cls.customer, 3)
+
+    def client_for(self):
+        # Middleware is loaded with the client's first request, so build it after overriding settings
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client
+
+    def test_off_by_default(self):
+        self.assertNotIn("Server-Timing", self.client_for().get("/api/invoices/"))
+
+    @override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_MAX_QUERIES=None)
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs("invoices.metrics", "INFO") as logs, CaptureQueriesContext(connection) as queries:
+            response = self.client_for().get("/api/invoices/?page_size=2")
+
+        timing = response["Server-Timing"]
+        for name in ("total;dur=", "db;dur=", "app;dur=", "render;dur="):
+            self.assertIn(name, timing)
+        self.assertIn(f'desc="{len(queries.captured_queries)} queries"', timing)
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].levelname, "INFO")
+        self.assertEqual((record["path"], record["status"]), ("/api/invoices/?page_size=2", 200))
+        self.assertEqual(record["queries"], len(queries.captured_queries))
+        self.assertNotIn("flags", record)
+
+    @override_settings(REQUEST_METRICS_ENABLED=True)
+    def test_token_is_not_logged(self):
+        token = str(AccessToken.for_user(self.user))
+        with self.assertLogs("invoices.metrics", "INFO") as logs:
+            self.client_for().get(f"/api/invoices/?page_size=2&token={token}")
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], "/api/invoices/?page_size=2&token=redacted")
+        self.assertNotIn(token, logs.output[0])
+
+    @override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_MAX_QUERIES=1, REQUEST_METRICS_SLOW_MS=0)
+    def test_thresholds_flag_the_request(self):
+        with self.assertLogs("invoices.metrics", "WARNING") as logs:
+            self.client_for().get(f"/api/invoices/{self.invoices[0].pk}/")
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["flags"], ["slow", "queries"])
+        self.assertTrue(record["slowest"])
+        self.assertIn("SELECT", record["slowest"][0]["sql"])
+
+    def test_repeated_statements_point_at_n_plus_one(self):
+        metrics = RequestMetrics()
+        with connection.execute_wrapper(metrics):
+            for invoice in self.invoices:
+                Payment.objects.filter(invoice=invoice).count()
+
+        sql, count = metrics.most_repeated()
+        self.assertEqual(count, 3)
+        self.assertIn("invoices_payment", sql)
+        self.assertEqual(metrics.queries, 3)
+
+
+class RequestProfilingTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = User.objects.create_user("staff", password="secret", is_staff=True)
+        make_invoices(cls.customer, 3)
+
+    def get(self, url, user, **headers):
+        # JWT, like the frontend: the middleware authenticates before DRF does
+        return APIClient().get(url, HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}", **headers)
+
+    def test_off_by_default(self):
+        response = self.get("/api/invoices/?profile=txt", self.staff)
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    @override_settings(REQUEST_PROFILING_ENABLED=True)
+    def test_only_staff_can_profile(self):
+        response = self.get("/api/invoices/?profile=txt", self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Disposition", response)
+
+    @override_settings(REQUEST_PROFILING_ENABLED=True)
+    def test_text_report(self):
+        response = self.get("/api/invoices/", self.staff, HTTP_X_PROFILE="txt")
+
+        self.assertEqual(response["X-Profiled-Status"], "200")
+        self.assertRegex(response["Content-Disposition"], r'attachment; filename="\d{8}-\d{6}-get-api-invoices\.txt"')
+        self.assertIn(b"Ordered by: cumulative time", response.content)
+
+    @override_settings(REQUEST_PROFILING_ENABLED=True)
+    def test_async_view_is_profiled(self):
+        response = self.get("/api/dashboard/summary/?profile=prof", self.staff)
+
+        stats = marshal.loads(response.content)
+        functions = {name for _, _, name in stats}
+        self.assertIn("acompute_summary", functions)
+
+    @override_settings(REQUEST_PROFILING_ENABLED=True)
+    def test_collapsed_stacks(self):
+        response = self.get("/api/invoices/export/?profile=collapsed", self.staff)
+        self.assertTrue(response["Content-Disposition"].endswith('.collapsed.txt"'))
+
+        # A request this small can finish between two samples; sample something slower
+        def spin():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        with ProfileSession("collapsed") as session:
+            spin()
+        content, _, _ = session.result()
+        stack, samples = content.decode().splitlines()[0].rsplit(" ", 1)
+        self.assertIn(";spin (tests.py:", stack)
+        self.assertGreater(int(samples), 0)
+
+    @override_settings(REQUEST_PROFILING_ENABLED=True)
+    async def test_event_stream_is_sent_unprofiled(self):
+        token = AccessToken.for_user(self.staff)
+        response = await AsyncClient().get(
+            f"/api/dashboard/stream/?token={token}&profile=txt", headers={"Authorization": f"Bearer {token}"}
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        first = await asyncio.wait_for(anext(aiter(response.streaming_content)), 5)
+        await response.streaming_content.aclose()
+        self.assertIn(b"event: summary", first)
+
+    def test_saved_to_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILE_DIR=directory):
+                response = self.get("/api/invoices/export/?profile=prof", self.staff)
+
+            # The export itself still goes to the client
+            self.assertIn(b"invoice_number", b"".join(response.streaming_content))
+            self.assertTrue(os.path.exists(os.path.join(directory, response["X-Profile-File"])))
+
+
+class CachedAuthenticationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("tester", password="secret-a", first_name="Ada")
+
+    def setUp(self):
+        # Test transactions roll back without signals, so ids (and cache keys) get reused
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def test_repeat_requests_skip_the_user_and_profile_queries(self):
+        self.client.get("/api/user/profile/")
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/user/profile/")
+        self.assertEqual(response.data["first_name"], "Ada")
+
+    def test_profile_update_is_seen_by_the_next_request(self):
+        self.client.get("/api/user/profile/")
+        self.client.patch("/api/user/profile/", {"first_name": "Grace"})
+
+        self.assertEqual(self.client.get("/api/user/profile/").data["first_name"], "Grace")
+
+    def test_avatar_upload_is_seen_by_the_next_request(self):
+        self.client.get("/api/user/profile/")
+        png = BytesIO()
+        Image.new("RGB", (8, 8)).save(png, "PNG")
+        avatar = SimpleUploadedFile("a.png", png.getvalue(), content_type="image/png")
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            uploaded = self.client.patch("/api/user/avatar/", {"avatar": avatar}, format="multipart")
+            self.assertEqual(self.client.get("/api/user/profile/").data["avatar_url"], uploaded.data["avatar_url"])
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get("/api/user/profile/")
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get("/api/user/profile/").status_code, 401)
+
+    def test_password_change_revokes_cached_tokens(self):
+        self.client.get("/api/user/profile/")
+        response = self.client.post(
+            "/api/user/change-password/", {"old_password": "secret-a", "new_password": "secret-b"}
+        )
+
+        self.assertEqual(self.client.get("/api/user/profile/").status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get("/api/user/profile/").status_code, 200)
+
+    def test_tokens_from_before_the_revoke_claim_still_work(self):
+        token = AccessToken.for_user(self.user)
+        del token[api_settings.REVOKE_TOKEN_CLAIM]
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(self.client.get("/api/user/profile/").status_code, 200)
+
+    def test_new_token_skips_a_user_cached_before_the_password_changed(self):
+        # As in another worker, whose cache the change's receivers don't reach
+        self.client.get("/api/user/profile/")
+        User.objects.filter(pk=self.user.pk).update(password=make_password("secret-b"), first_name="Grace")
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(User.objects.get(pk=self.user.pk))}")
+        self.assertEqual(self.client.get("/api/user/profile/").data["first_name"], "Grace")
+
+    def test_password_change_does_not_write_the_profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/user/change-password/", {"old_password": "secret-a", "new_password": "secret-b"}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        writes = ('UPDATE "invoices_profile"', 'INSERT INTO "invoices_profile"')
+        self.assertFalse([q for q in queries.captured_queries if q["sql"].startswith(writes)])
+
+    def test_changed_profile_is_saved_with_the_user(self):
+        user = User.objects.select_related("profile").get(pk=self.user.pk)
+        user.profile.avatar = "avatars/new.png"
+        user.save()
+
+        self.assertEqual(Profile.objects.get(user=self.user).avatar.name, "avatars/new.png")
+
+
+def png_upload(color=(200, 40, 40), size=(400, 300), name="avatar.png"):
+    png = BytesIO()
+    Image.new("RGB", size, color).save(png, "PNG")
+    return SimpleUploadedFile(name, png.getvalue(), content_type="image/png")
+
+
+class AvatarPipelineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("tester", password="secret")
+        cls.other = User.objects.create_user("other", password="secret")
+
+    def setUp(self):
+        cache.clear()
+        self.media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media, AVATAR_VARIANT_WORKERS=0))
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client
+
+    def upload(self, user, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client_for(user).patch("/api/user/avatar/", {"avatar": upload}, format="multipart")
+
+    def delete(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client_for(user).delete("/api/user/avatar/delete/")
+
+    def files(self):
+        return sorted(os.listdir(os.path.join(self.media, "avatars")))
+
+    def test_upload_stores_the_original_by_hash_and_makes_variants(self):
+        upload = png_upload()
+        digest = hashlib.sha256(upload.read()).hexdigest()
+        upload.seek(0)
+
+        response = self.upload(self.user, upload)
+        self.assertEqual(response.data["avatar_url"], f"/media/avatars/{digest}.png")
+
+        variants = self.client_for(self.user).get("/api/user/profile/").data["avatar_variants"]
+        self.assertEqual(set(variants), {"32", "64", "256"})
+        for size, url in variants.items():
+            with Image.open(os.path.join(self.media, url.removeprefix("/media/"))) as image:
+                self.assertEqual((image.format, image.size), ("WEBP", (int(size), int(size))))
+
+    def test_variants_are_made_after_the_upload_returns(self):
+        with override_settings(AVATAR_VARIANT_WORKERS=2), self.captureOnCommitCallbacks() as callbacks:
+            response = self.client_for(self.user).patch("/api/user/avatar/", {"avatar": png_upload()}, format="multipart")
+
+        self.assertEqual(response.data["avatar_variants"], {})
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(self.files()), 1)  # only the original so far
+
+    def test_identical_uploads_share_files(self):
+        first = self.upload(self.user, png_upload(name="a.png"))
+        second = self.upload(self.other, png_upload(name="b.png"))
+
+        self.assertEqual(first.data["avatar_url"], second.data["avatar_url"])
+        self.assertEqual(len(self.files()), 1 + 3)
+
+    def test_delete_removes_variants_once_unused(self):
+        self.upload(self.user, png_upload())
+        self.upload(self.other, png_upload())
+
+        self.delete(self.user)
+        self.assertEqual(len(self.files()), 1 + 3)  # still used by the other profile
+
+        self.delete(self.other)
+        self.assertEqual(self.files(), [])
+
+    def test_files_are_deleted_after_the_commit(self):
+        name = self.upload(self.user, png_upload()).data["avatar_url"].removeprefix("/media/")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client_for(self.user).delete("/api/user/avatar/delete/")
+        self.assertEqual(len(self.files()), 1 + 3)
+
+        # By the time it runs another profile may have taken the same file
+        Profile.objects.filter(user=self.other).update(avatar=name)
+        callbacks[0]()
+        self.assertEqual(len(self.files()), 1 + 3)
+
+    def test_upload_stores_the_original_again_if_deleted_meanwhile(self):
+        from . import views
+
+        self.upload(self.user, png_upload())
+        store_original = views.store_original
+
+        def deleted_first(upload, name):
+            # The first user's delete got the write lock after this upload hashed the
+            # file but before it saved its profile, and removed the shared files
+            for file in self.files():
+                os.remove(os.path.join(self.media, "avatars", file))
+            return store_original(upload, name)
+
+        with mock.patch.object(views, "store_original", deleted_first):
+            response = self.upload(self.other, png_upload())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.files()), 1 + 3)
+        variants = self.client_for(self.other).get("/api/user/profile/").data["avatar_variants"]
+        self.assertEqual(set(variants), {"32", "64", "256"})
+
+    def test_replacing_an_avatar_removes_the_old_files(self):
+        self.upload(self.user, png_upload(color=(0, 0, 0)))
+        response = self.upload(self.user, png_upload(color=(255, 255, 255)))
+
+        name = response.data["avatar_url"].removeprefix("/media/avatars/")
+        self.assertEqual(len(self.files()), 1 + 3)
+        self.assertIn(name, self.files())
+
+
+class JobQueueTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        make_invoices(cls.customer, 3)
+
+    def run_jobs(self):
+        return jobs.work("test-worker", burst=True)
+
+    def test_background_export(self):
+        with tempfile.TemporaryDirectory() as files, override_settings(JOB_FILES_ROOT=files):
+            response = self.client.get("/api/invoices/export/?file_format=csv&background=true&status=partially_paid")
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response["Location"], f"/api/jobs/{response.data['id']}/")
+            self.assertEqual(response.data["status"], "queued")
+            self.assertIsNone(response.data["download_url"])
+
+            self.assertEqual(self.run_jobs(), 1)
+            job = self.client.get(response["Location"]).data
+            self.assertEqual(job["status"], "succeeded")
+            self.assertEqual(job["download_url"], f"/api/jobs/{job['id']}/download/")
+            self.assertTrue(os.path.exists(os.path.join(files, job["result"]["file"])))
+
+            download = self.client.get(job["download_url"])
+            self.assertEqual(download.status_code, 200)
+            self.assertIn(f'attachment; filename="{job["result"]["filename"]}"', download["Content-Disposition"])
+            self.assertEqual(len(b"".join(download.streaming_content).splitlines()), 1 + 3)
+
+            # Only for the user who queued it
+            other = APIClient()
+            other.force_authenticate(User.objects.create_user("other"))
+            self.assertEqual(other.get(job["download_url"]).status_code, 404)
+            self.assertEqual(APIClient().get(job["download_url"]).status_code, 401)
+
+    @override_settings(CUSTOMER_DELETE_JOB_THRESHOLD=2)
+    def test_large_customer_delete_is_queued(self):
+        response = self.client.delete(f"/api/customers/{self.customer.pk}/")
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(Customer.objects.filter(pk=self.customer.pk).exists())
+
+        self.run_jobs()
+        self.assertFalse(Customer.objects.filter(pk=self.customer.pk).exists())
+        self.assertEqual(Job.objects.get().result["deleted"]["invoices.Invoice"], 3)
+
+    def test_small_customer_delete_stays_synchronous(self):
+        self.assertEqual(self.client.delete(f"/api/customers/{self.customer.pk}/").status_code, 204)
+        self.assertFalse(Job.objects.exists())
+
+    def test_recompute_status(self):
+        Invoice.objects.filter(invoice_number="INV-000000").update(amount_paid=Decimal("0.00"))
+        job_id = self.client.post("/api/invoices/recompute-status/").data["id"]
+
+        self.run_jobs()
+        self.assertEqual(Job.objects.get(pk=job_id).result["repaired"], 1)
+        self.assertFalse(find_balance_drift().exists())
+
+    def test_failures_are_retried_then_marked_failed(self):
+        calls = []
+
+        def flaky(payload):
+            calls.append(payload)
+            raise RuntimeError("boom")
+
+        jobs.HANDLERS["flaky"] = flaky
+        self.addCleanup(jobs.HANDLERS.pop, "flaky")
+        job = jobs.enqueue("flaky", {"n": 1}, max_attempts=2)
+
+        with self.assertLogs("invoices.jobs", "ERROR"):
+            self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), ("queued", 1, "RuntimeError: boom"))
+        self.assertGreater(job.run_after, timezone.now())
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs("invoices.jobs", "ERROR"):
+            self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, len(calls)), ("failed", 2, 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_lock_errors_are_retried_without_spending_an_attempt(self):
+        calls = []
+
+        def contended(payload):
+            calls.append(payload)
+            if len(calls) == 1:
+                raise OperationalError("database is locked")
+            return "done"
+
+        jobs.HANDLERS["contended"] = contended
+        self.addCleanup(jobs.HANDLERS.pop, "contended")
+        job = jobs.enqueue("contended", max_attempts=1)
+
+        with self.assertLogs("invoices.jobs", "WARNING"):
+            self.assertEqual(self.run_jobs(), 2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result), ("succeeded", 1, "done"))
+
+    def test_lock_errors_while_claiming_dont_end_a_burst(self):
+        job = jobs.enqueue("recompute_status")
+        claim = jobs.claim
+        attempts = []
+
+        def contended(worker):
+            attempts.append(worker)
+            if len(attempts) == 1:
+                raise OperationalError("database table is locked: invoices_job")
+            return claim(worker)
+
+        with mock.patch.object(jobs, "claim", contended), self.assertLogs("invoices.jobs", "WARNING") as logs:
+            self.assertEqual(jobs.work("test-worker", poll_interval=0, burst=True), 1)
+
+        self.assertEqual(logs.records[0].levelname, "WARNING")
+        self.assertEqual(len(attempts), 3)  # the locked one, the job, the empty queue
+        self.assertEqual(Job.objects.get(pk=job.pk).status, "succeeded")
+
+    def test_job_is_claimed_once(self):
+        job = jobs.enqueue("recompute_status")
+        self.assertEqual(jobs.claim("a").pk, job.pk)
+        self.assertIsNone(jobs.claim("b"))
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = jobs.enqueue("recompute_status")
+        Job.objects.filter(pk=job.pk).update(status="running", started_at=timezone.now() - timedelta(hours=2))
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, "queued")
+
+    def test_jobs_are_private(self):
+        job = jobs.enqueue("recompute_status", user=User.objects.create_user("other"))
+
+        self.assertEqual(self.client.get(f"/api/jobs/{job.pk}/").status_code, 404)
+        self.assertEqual(self.client.get("/api/jobs/").data, [])
+
+
+class RunWorkersCommandTests(TransactionTestCase):
+    # Worker threads have their own database connections: the jobs have to be committed
+
+    def test_runs_queued_jobs(self):
+        # A handler that doesn't write, so the two workers only contend for the queue itself
+        jobs.HANDLERS["echo"] = lambda payload: payload
+        self.addCleanup(jobs.HANDLERS.pop, "echo")
+        queued = [jobs.enqueue("echo", {"n": n}) for n in range(3)]
+        call_command("run_workers", "--burst", "--threads", "2", stdout=StringIO())
+
+        self.assertEqual(
+            list(Job.objects.filter(pk__in=[job.pk for job in queued]).values_list("status", flat=True)),
+            ["succeeded"] * 3,
+        )
+
+
+class CoalescingChannelTests(TestCase):
+
+    def make_channel(self):
+        self.computed = 0
+
+        def compute():
+            self.computed += 1
+            return {"count": self.computed, "fixed": "same"}
+
+        return CoalescingChannel(compute, delay=0.05, refresh=60)
+
+    async def test_burst_of_notifications_is_one_compute(self):
+        channel = self.make_channel()
+        subscription = channel.subscribe()
+        channel.seed({"count": 0, "fixed": "same"})
+        try:
+            for _ in range(20):
+                channel.notify()
+            delta = await asyncio.wait_for(subscription.get(), 2)
+        finally:
+            subscription.close()
+
+        self.assertEqual(delta, {"count": 1})  # only what changed
+        self.assertEqual(self.computed, 1)
+
+    async def test_nothing_is_sent_when_nothing_changed(self):
+        channel = CoalescingChannel(lambda: {"fixed": "same"}, delay=0.01, refresh=60)
+        subscription = channel.subscribe()
+        channel.seed({"fixed": "same"})
+        try:
+            channel.notify()
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(subscription.get(), 0.3)
+        finally:
+            subscription.close()
+
+    def test_no_subscribers_no_compute(self):
+        channel = self.make_channel()
+        channel.notify()
+        time.sleep(0.1)
+        self.assertEqual(self.computed, 0)
+
+
+class DashboardStreamTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        make_invoices(cls.customer, 2)
+
+    async def test_stream_starts_with_the_summary(self):
+        response = await AsyncClient().get(f"/api/dashboard/stream/?token={AccessToken.for_user(self.user)}")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        first = await anext(aiter(response.streaming_content))
+        await response.streaming_content.aclose()
+        retry, event, data = first.decode().strip().split("\n")
+        self.assertEqual(event, "event: summary")
+        self.assertEqual(json.loads(data.removeprefix("data: "))["total_invoices"], 2)
+
+    async def test_requires_a_token(self):
+        response = await AsyncClient().get("/api/dashboard/stream/")
+        self.assertEqual(response.status_code, 401)
+
+    def test_refused_under_wsgi(self):
+        # The WSGI handler would buffer the endless stream instead of sending it
+        response = self.client.get(f"/api/dashboard/stream/?token={AccessToken.for_user(self.user)}")
+        self.assertEqual(response.status_code, 501)
+
+    def test_committed_writes_notify_the_stream(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Payment.objects.create(invoice=Invoice.objects.first(), amount=Decimal("5.00"))
+        self.assertIn(drop_summary, callbacks)
+
+
+class AgingReportTests(BillingTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.acme = cls.customer
+        cls.globex = Customer.objects.create(name="Globex", email="billing@globex.test")
+        today = date.today()
+
+        def invoice(customer, number, days_past_due, total, paid=None, issued_days_ago=120):
+            created = Invoice.objects.create(
+                customer=customer, invoice_number=number, issue_date=today - timedelta(days=issued_days_ago),
+                due_date=today - timedelta(days=days_past_due), total_amount=Decimal(total),
+            )
+            if paid:
+                record_payment_created(Payment.objects.create(invoice=created, amount=Decimal(paid)))
+            return created
+
+        invoice(cls.acme, "A-1", -10, "100.00")                 # current
+        invoice(cls.acme, "A-2", 0, "50.00", paid="20.00")      # due today: current, 30 open
+        invoice(cls.acme, "A-3", 1, "80.00")                    # 1-30
+        invoice(cls.acme, "A-4", 45, "200.00", paid="150.00")   # 31-60, partially paid
+        invoice(cls.acme, "A-5", 75, "60.00", paid="60.00")     # paid: left out
+        invoice(cls.globex, "G-1", 91, "300.00")                # 90+
+        cls.late = invoice(cls.globex, "G-2", 61, "40.00", issued_days_ago=5)  # 61-90
+
+    def test_buckets_per_customer_and_totals(self):
+        with self.assertNumQueries(1):
+            report = aging_report()
+
+        globex, acme = report["customers"]  # largest balance first
+        self.assertEqual((globex["customer_name"], globex["total"]), ("Globex", Decimal("340.00")))
+        self.assertEqual(
+            {key: acme[key] for key in report["buckets"] + ["total", "invoices"]},
+            {"current": Decimal("130.00"), "1_30": Decimal("80.00"), "31_60": Decimal("50.00"),
+             "61_90": Decimal("0.00"), "90_plus": Decimal("0.00"), "total": Decimal("260.00"), "invoices": 4},
+        )
+        self.assertEqual((globex["61_90"], globex["90_plus"]), (Decimal("40.00"), Decimal("300.00")))
+        self.assertEqual(report["totals"]["total"], Decimal("600.00"))
+        self.assertEqual((report["totals"]["invoices"], report["totals"]["customers"]), (6, 2))
+
+    def test_as_of_an_earlier_date(self):
+        # Ten days ago: G-2 wasn't issued yet, A-1 was still further from due, and the
+        # payments (made today) hadn't arrived, so A-4 and A-5 were open in full
+        as_of = date.today() - timedelta(days=10)
+        report = self.client.get(f"/api/reports/aging/?as_of={as_of}").data
+
+        self.assertEqual(report["as_of"], as_of)
+        totals = report["totals"]
+        self.assertEqual(totals["current"], Decimal("230.00"))  # A-1, A-2, A-3
+        self.assertEqual(totals["31_60"], Decimal("200.00"))    # A-4, 35 days past due
+        self.assertEqual(totals["61_90"], Decimal("360.00"))    # A-5 and G-1, 65 and 81 days past due
+        self.assertEqual(totals["90_plus"], Decimal("0.00"))
+        self.assertEqual(totals["invoices"], 6)
+
+    def test_one_customer(self):
+        report = self.client.get(f"/api/reports/aging/?customer={self.globex.pk}").data
+        self.assertEqual([row["customer_id"] for row in report["customers"]], [self.globex.pk])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get("/api/reports/aging/?as_of=yesterday").status_code, 400)
+        self.assertEqual(self.client.get("/api/reports/aging/?customer=acme").status_code, 400)
+
+
+class SQLiteSettingsTests(TestCase):
+
+    def load_settings(self, **environ):
+        # The settings module as it would load with these environment variables
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(project_settings.__file__)
+
+    def test_production_profile_is_opt_in(self):
+        defaults = self.load_settings(SQLITE_PRODUCTION="")
+        self.assertEqual(defaults["SQLITE_PRAGMAS"], {})
+        self.assertNotIn("OPTIONS", defaults["DATABASES"]["default"])
+
+        production = self.load_settings(SQLITE_PRODUCTION="1")
+        self.assertEqual(production["SQLITE_PRAGMAS"]["journal_mode"], "wal")
+        self.assertEqual(production["DATABASES"]["default"]["OPTIONS"], {"transaction_mode": "IMMEDIATE"})
+
+    def test_connection_age_comes_from_the_environment(self):
+        self.assertEqual(self.load_settings(SQLITE_PRODUCTION="1")["DATABASES"]["default"]["CONN_MAX_AGE"], 600)
+        self.assertEqual(self.load_settings(SQLITE_PRODUCTION="")["DATABASES"]["default"]["CONN_MAX_AGE"], 0)
+
+        with mock.patch.dict(os.environ, {"SQLITE_PRODUCTION": "1"}):
+            os.environ.pop("DJANGO_CONN_MAX_AGE", None)
+            runpy.run_path(Path(project_settings.__file__).with_name("asgi.py"))
+            # What the settings see when served by asgi.py
+            asgi = runpy.run_path(project_settings.__file__)
+        self.assertEqual(asgi["DATABASES"]["default"]["CONN_MAX_AGE"], 0)
+
+    def test_pragmas_are_applied_to_connections(self):
+        # The in-memory test database can't use WAL, but the other pragmas apply
+        with override_settings(SQLITE_PRAGMAS={"busy_timeout": 10000, "synchronous": "normal"}):
+            # A new connection: the test's own is inside a transaction, where synchronous can't change
+            other = connection.copy()
+            other.ensure_connection()
+        self.addCleanup(other.close)
+        with other.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 10000)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
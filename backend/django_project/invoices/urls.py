@@ -2,9 +2,11 @@ from django.urls import path
 from .views import (
     InvoiceListCreateView,
     PaymentListCreateView, PaymentDetailView,
-    DashboardSummaryView, MonthlyRevenueView, MonthlyPaymentsView, OverdueInvoicesView,
+    DashboardSummaryView, DashboardStreamView, MonthlyRevenueView, MonthlyPaymentsView, OverdueInvoicesView,
     UserProfileUpdateView, AvatarUploadView, AvatarDeleteView, ChangePasswordView,
-    CustomerListCreateView, CustomerRetrieveUpdateDeleteView, InvoiceRetrieveUpdateDeleteView, CustomerInvoiceListView
+    CustomerListCreateView, CustomerRetrieveUpdateDeleteView, InvoiceRetrieveUpdateDeleteView, CustomerInvoiceListView,
+    InvoiceExportView, PaymentExportView, InvoiceBatchCreateView, PaymentImportView, SyncView,
+    InvoiceStatusRecomputeView, JobListView, JobDetailView, JobDownloadView, AgingReportView,
 )
 
 urlpatterns = [
@@ -17,10 +19,15 @@ urlpatterns = [
     # Invoice endpoints
     path("invoices/", InvoiceListCreateView.as_view()),
     path("invoices/<int:pk>/", InvoiceRetrieveUpdateDeleteView.as_view(), name="invoice-detail"),
+    path("invoices/export/", InvoiceExportView.as_view(), name="invoice-export"),
+    path("invoices/batch/", InvoiceBatchCreateView.as_view(), name="invoice-batch"),
+    path("invoices/recompute-status/", InvoiceStatusRecomputeView.as_view(), name="invoice-recompute-status"),
 
     # Payment endpoints
     path("payments/", PaymentListCreateView.as_view()),
     path("payments/<int:pk>/", PaymentDetailView.as_view()),
+    path("payments/export/", PaymentExportView.as_view(), name="payment-export"),
+    path("payments/import/", PaymentImportView.as_view(), name="payment-import"),
 
     # Profile + Avatar
     path("user/profile/", UserProfileUpdateView.as_view()),
@@ -30,10 +37,22 @@ urlpatterns = [
 
 
 
+    # Background jobs (invoices.jobs)
+    path("jobs/", JobListView.as_view(), name="job-list"),
+    path("jobs/<int:pk>/", JobDetailView.as_view(), name="job-detail"),
+    path("jobs/<int:pk>/download/", JobDownloadView.as_view(), name="job-download"),
+
+    # Delta sync
+    path("sync/", SyncView.as_view(), name="sync"),
+
     # Dashboard endpoints
     path("dashboard/summary/", DashboardSummaryView.as_view()),
+    path("dashboard/stream/", DashboardStreamView.as_view(), name="dashboard-stream"),
     path("dashboard/monthly-revenue/", MonthlyRevenueView.as_view()),
     path("dashboard/monthly-payments/", MonthlyPaymentsView.as_view()),
     path("dashboard/overdue/", OverdueInvoicesView.as_view()),
+
+    # Reports
+    path("reports/aging/", AgingReportView.as_view(), name="aging-report"),
 ]
 
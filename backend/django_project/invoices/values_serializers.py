@@ -0,0 +1,203 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .serializers import CustomerSerializer, InvoiceSerializer, PaymentSerializer
+
+
+def _identity(value):
+    return value
+
+
+def _date(value):
+    return value.isoformat() if value else None
+
+
+def _float(value):
+    # What DRF's JSONEncoder does with a bare Decimal (e.g. from a SerializerMethodField)
+    return None if value is None else float(value)
+
+
+def _fallback(field):
+    # Serializer.to_representation never hands None to a field
+    def convert(value):
+        return None if value is None else field.to_representation(value)
+
+    return convert
+
+
+def _decimal(field):
+    coerce = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce or field.localize or field.normalize_output or field.decimal_places is None:
+        return _fallback(field)
+    quantum = Decimal(1).scaleb(-field.decimal_places)
+
+    def convert(value):
+        return None if value is None else format(value.quantize(quantum), "f")
+
+    return convert
+
+
+def _datetime(field):
+    # Returns a factory: the active timezone is looked up once per list, not once per value
+    if getattr(field, "format", api_settings.DATETIME_FORMAT) != ISO_8601:
+        return _constant(_fallback(field))
+
+    def bind():
+        field_timezone = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+        if field_timezone is None:
+            return _fallback(field)
+
+        def convert(value):
+            if not value:
+                return None
+            if value.tzinfo is None:
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+        return convert
+
+    return bind
+
+
+def _constant(convert):
+    return lambda: convert
+
+
+def converter(field):
+    # Factory for a per-value function reproducing field.to_representation for what the database hands back
+    if isinstance(field, serializers.DecimalField):
+        return _constant(_decimal(field))
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime(field)
+    if isinstance(field, serializers.DateField) and getattr(field, "format", ISO_8601) == ISO_8601:
+        return _constant(_date)
+    if isinstance(field, serializers.BigIntegerField) and getattr(
+        field, "coerce_to_string", api_settings.COERCE_BIGINT_TO_STRING
+    ):
+        return _constant(_fallback(field))
+    if isinstance(field, (serializers.CharField, serializers.ChoiceField, serializers.BooleanField,
+                          serializers.IntegerField, serializers.PrimaryKeyRelatedField)):
+        return _constant(_identity)
+    return _constant(_fallback(field))
+
+
+class ValuesSerializer:
+    """
+    Read-only twin of a ModelSerializer for list responses. Rows are read with
+    .values() and turned into dicts with one precomputed converter per field,
+    skipping model instances and DRF's field-by-field to_representation.
+    The output is identical to serializer_class(queryset, many=True).data; the
+    field order and formats are taken from serializer_class itself.
+    """
+
+    serializer_class = None
+    # Fields whose source isn't a column, e.g. SerializerMethodFields: name -> (values() lookup, converter)
+    overrides = {}
+    # Nested lists: field name -> (ValuesSerializer class, foreign key on the child pointing back)
+    nested = {}
+
+    _schema = None
+
+    def __init__(self, fields=None):
+        schema = self.schema()
+        self.fields = [name for name in schema if fields is None or name in fields]
+
+    @classmethod
+    def schema(cls):
+        # field name -> (values() lookup, converter factory), built once per class
+        if cls.__dict__.get("_schema") is None:
+            schema = {}
+            for name, field in cls.serializer_class().fields.items():
+                if name in cls.nested:
+                    schema[name] = (None, None)
+                elif name in cls.overrides:
+                    column, convert = cls.overrides[name]
+                    schema[name] = (column, _constant(convert))
+                else:
+                    schema[name] = (field.source.replace(".", "__"), converter(field))
+            cls._schema = schema
+        return cls._schema
+
+    def columns(self):
+        schema = self.schema()
+        return {schema[name][0] for name in self.fields if schema[name][0] is not None}
+
+    def values(self, queryset, *extra):
+        # The .values() queryset to paginate/serialize; `extra` keeps ordering columns for keyset paging
+        return queryset.values("id", *self.columns(), *extra)
+
+    def serialize_queryset(self, queryset):
+        return self.serialize(self.values(queryset))
+
+    async def aserialize_queryset(self, queryset):
+        return await self.aserialize([row async for row in self.values(queryset)])
+
+    def serialize(self, rows):
+        # `rows` come from self.values(), possibly paginated
+        rows = list(rows)
+        groups = {}
+        for name, (child_class, foreign_key) in self.nested.items():
+            if name in self.fields:
+                groups[name] = child_class().grouped_by(foreign_key, [row["id"] for row in rows])
+        return self.build(rows, groups)
+
+    async def aserialize(self, rows):
+        # serialize() for async views: the nested lists are read with async iteration
+        groups = {}
+        for name, (child_class, foreign_key) in self.nested.items():
+            if name in self.fields:
+                groups[name] = await child_class().agrouped_by(foreign_key, [row["id"] for row in rows])
+        return self.build(rows, groups)
+
+    def build(self, rows, groups):
+        # `groups`: nested field name -> {parent id: [serialized child, ...]}
+        schema = self.schema()
+
+        plan = []
+        for name in self.fields:
+            column, factory = schema[name]
+            convert = factory() if factory is not None else None
+            plan.append((name, column, convert, groups.get(name)))
+
+        return [
+            {
+                name: convert(row[column]) if group is None else group.get(row["id"], [])
+                for name, column, convert, group in plan
+            }
+            for row in rows
+        ]
+
+    def grouped_by(self, foreign_key, parent_ids):
+        # Children of the given parents in one query, as {parent id: [serialized child, ...]} in id order
+        return self.group(foreign_key, list(self.children(foreign_key, parent_ids)))
+
+    async def agrouped_by(self, foreign_key, parent_ids):
+        return self.group(foreign_key, [row async for row in self.children(foreign_key, parent_ids)])
+
+    def children(self, foreign_key, parent_ids):
+        model = self.serializer_class.Meta.model
+        return self.values(model.objects.filter(**{f"{foreign_key}__in": parent_ids}).order_by("id"), foreign_key)
+
+    def group(self, foreign_key, rows):
+        grouped = defaultdict(list)
+        for row, item in zip(rows, self.serialize(rows)):
+            grouped[row[foreign_key]].append(item)
+        return grouped
+
+
+class CustomerValuesSerializer(ValuesSerializer):
+    serializer_class = CustomerSerializer
+
+
+class PaymentValuesSerializer(ValuesSerializer):
+    serializer_class = PaymentSerializer
+
+
+class InvoiceValuesSerializer(ValuesSerializer):
+    serializer_class = InvoiceSerializer
+    overrides = {"balance_due": ("balance_due", _float)}
+    nested = {"payments": (PaymentValuesSerializer, "invoice_id")}
@@ -2,14 +2,45 @@ from rest_framework.views import APIView
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.db.models import Sum
-from django.db.models.functions import TruncMonth
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework import generics, permissions
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework import generics, mixins, permissions
+from rest_framework.exceptions import NotFound, ValidationError
 from datetime import datetime, timedelta
-from .models import Invoice, Payment, Customer
-from .serializers import InvoiceSerializer, PaymentSerializer, UserProfileSerializer, AvatarUploadSerializer, CustomerSerializer
+from .models import Invoice, Job, Payment, Customer
+from .serializers import InvoiceSerializer, PaymentSerializer, UserProfileSerializer, AvatarUploadSerializer, CustomerSerializer, InvoiceBatchItemSerializer, JobSerializer, parse_fieldset
+from .services import update_invoice_status, record_payment_created, record_payment_changed, record_payment_deleted, create_invoice_batch
+from .avatars import delete_if_unused, original_name, schedule_variants, store_original
+from .jobs import enqueue, job_files
+from .values_serializers import CustomerValuesSerializer, InvoiceValuesSerializer, PaymentValuesSerializer
+from .parsers import NDJSONParser
+from .pagination import InvoicePagination, CustomerPagination, PaymentPagination, CustomerInvoicePagination
+from .exports import (
+    EXPORT_FORMATS, INVOICE_EXPORT_FIELDS, PAYMENT_EXPORT_FIELDS,
+    invoice_export_queryset, payment_export_queryset, stream_export,
+)
+from .filters import FilterError, filter_customers, filter_invoices, parse_invoice_filters
+from .aging import aging_report
+from .dashboard import aget_summary, summary_events
+from .authentication import CachedJWTAuthentication, QueryParamJWTAuthentication
+from .sync import SyncTokenError, SyncTokenExpired, changes_since, decode_token
+from .conditional import (
+    ConditionalObjectMixin, acustomer_list_validators, ainvoice_list_validators, ainvoice_page_validators,
+    not_modified, with_validators,
+)
+from .imports import IMPORT_FORMATS, import_payments
+from .rollups import GRANULARITIES, aseries
+from .async_views import AsyncAPIView
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils.dateparse import parse_date
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
 from datetime import date
 
 
@@ -33,59 +64,109 @@ def update_status_if_paid(invoice):
     invoice.save()
 
 
-from datetime import date
+def invoice_listing(request):
+    # (serializer, queryset) for the invoice list endpoints. ?fields= and ?expand=payments pick
+    # the output; the filters and ?q= search from invoices.filters narrow the queryset.
+    # Lists are read with .values() (see values_serializers); the output matches InvoiceSerializer.
+    fields, _ = parse_fieldset(request.query_params, InvoiceSerializer, expandable=["payments"])
+    try:
+        filters = parse_invoice_filters(request.query_params)
+    except FilterError as exc:
+        raise ValidationError({"error": str(exc)})
+    return InvoiceValuesSerializer(fields=fields), filter_invoices(Invoice.objects.all(), filters)
 
-def update_invoice_status(invoice):
-    total_paid = invoice.payments.aggregate(total=Sum("amount"))["total"] or 0
 
-    # Determine paid status
-    if total_paid == 0:
-        invoice.status = "unpaid"
-    elif total_paid < invoice.total_amount:
-        invoice.status = "partially_paid"
-    else:
-        invoice.status = "paid"
+def job_accepted(job):
+    # 202 with the queued job; clients poll its Location (GET /api/jobs/<id>/) for the result
+    response = Response(JobSerializer(job).data, status=202)
+    response["Location"] = reverse("job-detail", args=[job.pk])
+    return response
 
-    # Overdue logic
-    if invoice.due_date and invoice.due_date < date.today() and invoice.status != "paid":
-        invoice.is_overdue = True
-    else:
-        invoice.is_overdue = False
 
-    invoice.save()
+async def invoice_list_response(request, rows, invoices, paginator):
+    # Shared GET of the invoice list endpoints, on the async ORM
+    # Opt-in keyset pagination (?page_size= / ?cursor=); a page's validators come from its own rows
+    page = await paginator.apaginate_values(invoices, request, rows, "updated_at")
+    if page is not None:
+        validators = await ainvoice_page_validators(request, page, paginator.has_next)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        return with_validators(paginator.get_paginated_response(await rows.aserialize(page)), validators)
+
+    # 304 Not Modified without serializing when the client's copy is current
+    validators = await ainvoice_list_validators(request, invoices)
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
 
+    return with_validators(Response(await rows.aserialize_queryset(invoices)), validators)
 
-class CustomerListCreateView(generics.ListCreateAPIView):
+
+class CustomerListCreateView(AsyncAPIView, mixins.CreateModelMixin, generics.GenericAPIView):
     queryset = Customer.objects.all().order_by("-id")
     serializer_class = CustomerSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CustomerPagination
+
+    def get_queryset(self):
+        # ?q= searches name and email
+        return filter_customers(super().get_queryset(), self.request.query_params)
+
+    async def get(self, request, *args, **kwargs):
+        # 304 Not Modified without serializing when the client's copy is current
+        validators = await acustomer_list_validators(request, self.get_queryset())
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
 
+        rows = CustomerValuesSerializer()
+        customers = self.filter_queryset(self.get_queryset())
+        page = await self.paginator.apaginate_values(customers, request, rows)
+        if page is not None:
+            return with_validators(self.get_paginated_response(await rows.aserialize(page)), validators)
+        return with_validators(Response(await rows.aserialize_queryset(customers)), validators)
 
-class CustomerRetrieveUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(self.create)(request, *args, **kwargs)
+
+
+class CustomerRetrieveUpdateDeleteView(ConditionalObjectMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def destroy(self, request, *args, **kwargs):
+        customer = self.get_object()
+        # Every cascaded invoice and payment delete runs its signals; big customers go to a worker
+        if customer.invoices.count() > settings.CUSTOMER_DELETE_JOB_THRESHOLD:
+            return job_accepted(enqueue("delete_customer", {"customer": customer.pk}, user=request.user))
+        self.perform_destroy(customer)
+        return Response(status=204)
 
-class CustomerInvoiceListView(APIView):
+
+class CustomerInvoiceListView(AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, pk):
-        invoices = Invoice.objects.filter(customer_id=pk).order_by("-issue_date")
-        serializer = InvoiceSerializer(invoices, many=True)
-        return Response(serializer.data)
+    async def get(self, request, pk):
+        rows, invoices = invoice_listing(request)
+        invoices = invoices.filter(customer_id=pk).order_by("-issue_date", "-id")
+        return await invoice_list_response(request, rows, invoices, CustomerInvoicePagination())
 
 
 
-class InvoiceListCreateView(APIView):
+class InvoiceListCreateView(AsyncAPIView):
     # GET: return all invoices
-    def get(self, request):
-        invoices = Invoice.objects.all().order_by('-id')
-        serializer = InvoiceSerializer(invoices, many=True)
-        return Response(serializer.data)
+    async def get(self, request):
+        rows, invoices = invoice_listing(request)
+        invoices = invoices.order_by('-id')
+        return await invoice_list_response(request, rows, invoices, InvoicePagination())
+
+    async def post(self, request):
+        return await sync_to_async(self.create)(request)
 
     # POST: create a new invoice
-    def post(self, request):
+    def create(self, request):
         serializer = InvoiceSerializer(data=request.data)
 
         # Validate incoming data
@@ -97,10 +178,35 @@ class InvoiceListCreateView(APIView):
         # If validation fails, return errors
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class InvoiceRetrieveUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
+class InvoiceBatchCreateView(APIView):
+    # POST a JSON array (or an application/x-ndjson body) of invoices.
+    # Valid items are inserted with bulk_create in one transaction; every item
+    # gets a result with either its new id or its validation errors.
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, NDJSONParser]
+    max_batch_size = 20000
+
+    def post(self, request):
+        serializer = InvoiceBatchItemSerializer(data=request.data, many=True, max_length=self.max_batch_size)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        results = create_invoice_batch(serializer.validated_data, serializer.item_errors)
+        created = sum(1 for result in results if "id" in result)
+
+        response_status = status.HTTP_201_CREATED if created == len(results) else status.HTTP_207_MULTI_STATUS
+        return Response(
+            {"created": created, "failed": len(results) - created, "results": results},
+            status=response_status,
+        )
+
+
+class InvoiceRetrieveUpdateDeleteView(ConditionalObjectMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # The representation embeds payments (they bump updated_at) and the customer's name
+    validator_fields = ("updated_at", "customer__updated_at")
 
     def perform_update(self, serializer):
         invoice = serializer.save()
@@ -154,19 +260,27 @@ class PaymentListCreateView(APIView):
 
     # GET: return all payments
     def get(self, request):
-        payments = Payment.objects.all().order_by('-created_at')
-        serializer = PaymentSerializer(payments, many=True)
-        return Response(serializer.data)
+        payments = Payment.objects.all().order_by('-created_at', '-id')
+        rows = PaymentValuesSerializer()
+
+        # Opt-in keyset pagination (?page_size= / ?cursor=)
+        paginator = PaymentPagination()
+        page = paginator.paginate_values(payments, request, rows)
+        if page is not None:
+            return paginator.get_paginated_response(rows.serialize(page))
+
+        return Response(rows.serialize_queryset(payments))
 
     # POST: create a new payment
     def post(self, request):
         serializer = PaymentSerializer(data=request.data)
 
         if serializer.is_valid():
-            payment = serializer.save()
+            with transaction.atomic():
+                payment = serializer.save()
 
-            # Optional: auto-update invoice status
-            update_invoice_status(payment.invoice)
+                # Add the payment to the invoice's running total and refresh its status
+                record_payment_created(payment)
 
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -177,120 +291,286 @@ class PaymentListCreateView(APIView):
 
 
 
+class PaymentImportView(APIView):
+    # Import a bank/processor settlement file. Send it as a multipart "file" upload or as
+    # the raw request body (text/csv or application/x-ndjson); ?file_format= overrides the guess.
+    # Lines are parsed as they are read, so large files never sit in memory.
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        if request.content_type.startswith("multipart/form-data"):
+            upload = request.FILES.get("file")
+            if upload is None:
+                return Response({"error": "Upload the settlement file in the 'file' field."}, status=400)
+            lines = upload
+            guessed = "ndjson" if upload.name.endswith((".ndjson", ".jsonl")) else "csv"
+        else:
+            stream = request.stream
+            lines = iter(stream.readline, b"") if stream is not None else []
+            guessed = "ndjson" if "ndjson" in request.content_type else "csv"
+
+        file_format = request.query_params.get("file_format", guessed)
+        if file_format not in IMPORT_FORMATS:
+            return Response({"error": f"file_format must be one of: {', '.join(IMPORT_FORMATS)}"}, status=400)
+
+        summary = import_payments(lines, file_format)
+        return Response(summary)
+
+
 class PaymentDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self, pk):
-        return Payment.objects.get(pk=pk)
+        # Called inside the transaction that changes the payment, so the balance delta is
+        # computed from the row being replaced, not from a copy another request has changed
+        return get_object_or_404(Payment.objects.select_for_update(), pk=pk)
 
     def patch(self, request, pk):
-        payment = self.get_object(pk)
-        serializer = PaymentSerializer(payment, data=request.data, partial=True)
+        with transaction.atomic():
+            payment = self.get_object(pk)
+            old_invoice_id, old_amount = payment.invoice_id, payment.amount
+            serializer = PaymentSerializer(payment, data=request.data, partial=True)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=400)
 
-        if serializer.is_valid():
             updated_payment = serializer.save()
 
             # update invoice status
-            update_invoice_status(updated_payment.invoice)
-
-            return Response(serializer.data)
+            record_payment_changed(updated_payment, old_invoice_id, old_amount)
 
-        return Response(serializer.errors, status=400)
+        return Response(serializer.data)
 
     def delete(self, request, pk):
-        payment = self.get_object(pk)
-        invoice = payment.invoice
-        payment.delete()
-
-        update_invoice_status(invoice)
+        with transaction.atomic():
+            payment = self.get_object(pk)
+            invoice_id, amount = payment.invoice_id, payment.amount
 
+            # Only the request that actually removed the row takes its amount off the invoice
+            deleted, _ = payment.delete()
+            if not deleted:
+                return Response({"error": "Payment not found."}, status=404)
+            record_payment_deleted(invoice_id, amount)
 
         return Response(status=204)
 
 
 
-class DashboardSummaryView(APIView):
+class ExportView(APIView):
+    # Streams rows straight from the database so memory stays flat for any export size.
+    # Use ?file_format=csv|ndjson (not ?format=, which DRF reserves for renderers).
     permission_classes = [IsAuthenticated]
+    filename = "export"
+    fields = []
+
+    def get_queryset(self, filters):
+        raise NotImplementedError
 
     def get(self, request):
-        total_invoices = Invoice.objects.count()
-        paid = Invoice.objects.filter(status="paid").count()
-        unpaid = Invoice.objects.filter(status="unpaid").count()
-
-        # ✅ Correct overdue logic
-        overdue_qs = Invoice.objects.filter(
-            due_date__lt=date.today(),
-            status__in=["unpaid", "partially_paid"]
+        file_format = request.query_params.get("file_format", "csv")
+        if file_format not in EXPORT_FORMATS:
+            return Response({"error": f"file_format must be one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+
+        try:
+            filters = parse_invoice_filters(request.query_params)
+        except FilterError as exc:
+            return Response({"error": str(exc)}, status=400)
+
+        # ?background=true: write the file in a worker and answer 202 with the job
+        if request.query_params.get("background") in ("1", "true"):
+            params = {key: value for key, value in request.query_params.items() if key not in ("background", "file_format")}
+            payload = {"model": self.filename, "file_format": file_format, "params": params}
+            return job_accepted(enqueue("export", payload, user=request.user))
+
+        content_type = "text/csv" if file_format == "csv" else "application/x-ndjson"
+        response = StreamingHttpResponse(
+            stream_export(self.get_queryset(filters), self.fields, file_format),
+            content_type=content_type,
         )
+        response["Content-Disposition"] = f'attachment; filename="{self.filename}.{file_format}"'
+        return response
 
-        overdue = overdue_qs.count()
-        overdue_total = overdue_qs.aggregate(Sum("total_amount"))["total_amount__sum"] or 0
 
-        total_revenue = Invoice.objects.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        unpaid_total = Invoice.objects.filter(status="unpaid").aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        total_payments = Payment.objects.aggregate(Sum('amount'))['amount__sum'] or 0
+class InvoiceExportView(ExportView):
+    filename = "invoices"
+    fields = INVOICE_EXPORT_FIELDS
+
+    def get_queryset(self, filters):
+        return invoice_export_queryset(filters)
 
-        return Response({
-            "total_invoices": total_invoices,
-            "paid": paid,
-            "unpaid": unpaid,
-            "overdue": overdue,
-            "overdue_total": overdue_total,
-            "total_revenue": total_revenue,
-            "unpaid_total": unpaid_total,
-            "total_payments_collected": total_payments,
-        })
 
+class PaymentExportView(ExportView):
+    filename = "payments"
+    fields = PAYMENT_EXPORT_FIELDS
 
+    def get_queryset(self, filters):
+        return payment_export_queryset(filters)
 
-class MonthlyRevenueView(APIView):
+
+class InvoiceStatusRecomputeView(APIView):
+    # Repair drifted balances and re-flag overdue invoices across the whole table, in a worker
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
-        data = (
-            Invoice.objects
-            .annotate(month=TruncMonth('created_at'))
-            .values('month')
-            .annotate(total=Sum('total_amount'))
-            .order_by('month')
-        )
-        return Response(data)
+    def post(self, request):
+        return job_accepted(enqueue("recompute_status", user=request.user))
+
+
+class JobListView(generics.ListAPIView):
+    # The current user's most recent jobs
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Job.objects.filter(created_by=self.request.user).order_by("-created_at", "-id")[:50]
+
+
+class JobDetailView(generics.RetrieveAPIView):
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Job.objects.filter(created_by=self.request.user)
 
 
-class MonthlyPaymentsView(APIView):
+class JobDownloadView(generics.RetrieveAPIView):
+    # The file a job wrote (background exports), for the user who queued it
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Job.objects.filter(created_by=self.request.user, status="succeeded")
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        name = job.result.get("file") if isinstance(job.result, dict) else None
+        storage = job_files()
+        if not name or not storage.exists(name):
+            raise NotFound("This job has no file.")
+        return FileResponse(storage.open(name), as_attachment=True, filename=job.result.get("filename", name))
+
+
+class SyncView(APIView):
+    # Delta sync: GET /api/sync/?since=<token> returns the customers, invoices and payments
+    # changed since the token plus the ids deleted, and a new token for the next call.
+    # Without ?since= it returns a full snapshot.
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        data = (
-            Payment.objects
-            .annotate(month=TruncMonth('created_at'))
-            .values('month')
-            .annotate(total=Sum('amount'))
-            .order_by('month')
-        )
+        since = None
+        token = request.query_params.get("since")
+        if token:
+            try:
+                since = decode_token(token)
+            except SyncTokenError as exc:
+                return Response({"error": str(exc)}, status=400)
+
+        try:
+            return Response(changes_since(since))
+        except SyncTokenExpired:
+            return Response(
+                {"error": "Sync token is too old; reload without ?since= to get a full snapshot."},
+                status=status.HTTP_410_GONE,
+            )
+
+
+class DashboardSummaryView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        # Two concurrent aggregate queries at most, and none on a cache hit
+        return Response(await aget_summary())
+
+
+
+class DashboardStreamView(AsyncAPIView):
+    # Server-Sent Events with live summary updates (see dashboard.summary_events), instead of polling
+    # /dashboard/summary/. ASGI only: the WSGI handler reads an async streaming response to the end
+    # before sending any of it, and this one never ends, so the client would get nothing while the
+    # request held its thread forever. Clients fall back to polling on the 501.
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedJWTAuthentication, QueryParamJWTAuthentication]
+
+    async def get(self, request):
+        if not isinstance(request._request, ASGIRequest):
+            return Response({"error": "The dashboard stream needs an ASGI server."}, status=501)
+        response = StreamingHttpResponse(summary_events(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # nginx: don't buffer the stream
+        return response
+
+
+class RollupSeriesView(AsyncAPIView):
+    # Reads the pre-aggregated daily rollups instead of grouping the whole table.
+    # Accepts ?from=YYYY-MM-DD&to=YYYY-MM-DD&granularity=day|week|month (default month).
+    permission_classes = [IsAuthenticated]
+    metric = None
+
+    async def get(self, request):
+        granularity = request.query_params.get("granularity", "month")
+        if granularity not in GRANULARITIES:
+            return Response({"error": f"granularity must be one of: {', '.join(GRANULARITIES)}"}, status=400)
+
+        bounds = {}
+        for key in ("from", "to"):
+            value = request.query_params.get(key)
+            if value:
+                try:
+                    bounds[key] = parse_date(value)
+                except ValueError:
+                    bounds[key] = None
+                if bounds[key] is None:
+                    return Response({"error": f"'{key}' must be a date in YYYY-MM-DD format."}, status=400)
+
+        data = await aseries(self.metric, granularity, bounds.get("from"), bounds.get("to"))
         return Response(data)
 
 
+class MonthlyRevenueView(RollupSeriesView):
+    metric = "revenue"
+
+
+class MonthlyPaymentsView(RollupSeriesView):
+    metric = "payments"
+
+
 class OverdueInvoicesView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        thirty_days_ago = datetime.now() - timedelta(days=30)
+        # Past due and not fully paid, as flagged by update_invoice_status / sweep_overdue
+        rows, overdue = invoice_listing(request)
+        overdue = overdue.filter(is_overdue=True).order_by("due_date", "id")
+        return Response(rows.serialize_queryset(overdue))
 
-        overdue = Invoice.objects.filter(
-            status="unpaid",
-            created_at__lte=thirty_days_ago
-        )
 
-        serializer = InvoiceSerializer(overdue, many=True)
-        return Response(serializer.data)
+class AgingReportView(APIView):
+    # Accounts-receivable aging (see invoices.aging): ?as_of=YYYY-MM-DD (default today), ?customer=<id>
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        as_of = None
+        value = request.query_params.get("as_of")
+        if value:
+            try:
+                as_of = parse_date(value)
+            except ValueError:
+                as_of = None
+            if as_of is None:
+                return Response({"error": "'as_of' must be a date in YYYY-MM-DD format."}, status=400)
+
+        customer = request.query_params.get("customer")
+        if customer:
+            try:
+                customer = int(customer)
+            except ValueError:
+                return Response({"error": "'customer' must be a customer id."}, status=400)
+
+        return Response(aging_report(as_of, customer or None))
 
 
 class UserProfileUpdateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        request.user.profile.refresh_from_db()
         serializer = UserProfileSerializer(request.user)
         return Response(serializer.data)
 
@@ -319,12 +599,27 @@ class AvatarUploadView(APIView):
         profile = request.user.profile
         serializer = AvatarUploadSerializer(profile, data=request.data, partial=True)
 
-        if serializer.is_valid():
-            serializer.save()
-            profile.refresh_from_db()
-            return Response({"avatar_url": profile.avatar.url})
-
-        return Response(serializer.errors, status=400)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        if not serializer.validated_data.get("avatar"):
+            return Response({"avatar": ["No file was submitted."]}, status=400)
+
+        # Store the original by content hash; the resized variants are made in the background.
+        # The row is saved before the file so a concurrent delete of the same file can't
+        # slip in between (see store_original).
+        upload = serializer.validated_data["avatar"]
+        previous = profile.avatar.name
+        name = original_name(upload)
+        with transaction.atomic():
+            profile.avatar = name
+            profile.avatar_variants = {}
+            profile.save(update_fields=["avatar", "avatar_variants"])
+            store_original(upload, name)
+            if previous and previous != name:
+                transaction.on_commit(lambda: delete_if_unused(previous))
+            schedule_variants(name)
+
+        return Response({"avatar_url": profile.avatar.url, "avatar_variants": {}})
 
 
 class AvatarDeleteView(APIView):
@@ -337,12 +632,14 @@ class AvatarDeleteView(APIView):
         if not profile.avatar:
             return Response({"avatar_url": None})
 
-        # Delete the file from storage
-        profile.avatar.delete(save=False)
-
-        # Clear the field
-        profile.avatar = None
-        profile.save()
+        # Clear the field, then once that commits remove the files (original and variants)
+        # unless another profile shares them
+        name = profile.avatar.name
+        with transaction.atomic():
+            profile.avatar = None
+            profile.avatar_variants = {}
+            profile.save(update_fields=["avatar", "avatar_variants"])
+            transaction.on_commit(lambda: delete_if_unused(name))
 
         return Response({"avatar_url": None})
 
@@ -360,4 +657,10 @@ class ChangePasswordView(APIView):
         user.set_password(new_password)
         user.save()
 
-        return Response({"success": "Password updated successfully"})
+        # Tokens carry the password hash (CHECK_REVOKE_TOKEN), so the old ones stop working
+        refresh = RefreshToken.for_user(user)
+        return Response({
+            "success": "Password updated successfully",
+            "access": str(refresh.access_token),
+            "refresh": str(refresh),
+        })
@@ -6,6 +6,9 @@ import OverdueList from "../components/dashboard/OverdueList";
 import { Container, Row, Col, Spinner } from "react-bootstrap";
 import { refreshToken } from "../utils/auth";
 
+// Milliseconds between summary refreshes when not streaming
+const SUMMARY_POLL_INTERVAL = 30000;
+
 export default function Dashboard() {
   const [summary, setSummary] = useState(null);
   const [revenue, setRevenue] = useState([]);
@@ -64,6 +67,44 @@ export default function Dashboard() {
     loadDashboard();
   }, []);
 
+  // Live KPI updates. The stream only works when the backend runs under ASGI
+  // (uvicorn/daphne), so it is opt-in with REACT_APP_DASHBOARD_STREAM=1; otherwise,
+  // or when the stream fails (runserver answers 501), the summary is polled.
+  useEffect(() => {
+    let source = null;
+    let timer = null;
+
+    function poll() {
+      if (timer) return;
+      timer = setInterval(async () => {
+        const summaryData = await authorizedFetch("http://127.0.0.1:8000/api/dashboard/summary/");
+        if (summaryData) setSummary(summaryData);
+      }, SUMMARY_POLL_INTERVAL);
+    }
+
+    const access = localStorage.getItem("access_token");
+    if (process.env.REACT_APP_DASHBOARD_STREAM === "1" && access) {
+      // The server pushes only the figures that changed.
+      // EventSource can't send headers, so the access token goes in the URL.
+      source = new EventSource(`http://127.0.0.1:8000/api/dashboard/stream/?token=${access}`);
+      source.addEventListener("summary", (event) => {
+        const delta = JSON.parse(event.data);
+        setSummary((prev) => ({ ...prev, ...delta }));
+      });
+      source.onerror = () => {
+        source.close();
+        poll();
+      };
+    } else {
+      poll();
+    }
+
+    return () => {
+      if (source) source.close();
+      if (timer) clearInterval(timer);
+    };
+  }, []);
+
   if (loading || !summary) {
   return (
     <Container className="mt-4 text-center">
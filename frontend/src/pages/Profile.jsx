@@ -184,6 +184,10 @@ try {
     return;
   }
 
+  // The old tokens were revoked with the old password
+  localStorage.setItem("access_token", data.access);
+  localStorage.setItem("refresh_token", data.refresh);
+
   toast.success("Password updated!", { id: "password" });
 
   setPasswordData({